@@ -19,8 +19,11 @@ from controllers.branch_controller import branch_controller
 from controllers.location_controller import location_controller
 
 # Import models
-from models import User, Customer, Product, Order, VendorSettings
+from models import User, Customer, Product, Order, VendorSettings, Location, PurchaseHistory, BranchDirectory
 from config import config
+from file_serving import send_upload
+import pricing_analytics
+import warehouse
 
 def create_app():
     """Create and configure Flask application"""
@@ -30,6 +33,9 @@ def create_app():
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
     app.config['UPLOAD_FOLDER'] = 'uploads'
+    # '', 'x-sendfile' (Apache/lighttpd) or 'x-accel-redirect' (nginx) for uploaded files
+    app.config['UPLOADS_SENDFILE_MODE'] = os.environ.get('UPLOADS_SENDFILE_MODE', '')
+    app.config['UPLOADS_ACCEL_PREFIX'] = os.environ.get('UPLOADS_ACCEL_PREFIX', '/protected-uploads/')
     
     # Enable CORS for API endpoints
     CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -367,30 +373,8 @@ def create_app():
             except (ValueError, TypeError):
                 return jsonify({'success': False, 'message': 'Invalid price format'})
             
-            # Save custom pricing
-            from config import config
-            from datetime import datetime
-            
-            db = config.get_db()
-            current_user = auth_controller.get_current_user()
-            
-            pricing_doc = {
-                'customer_id': customer_id,
-                'product_id': product_id,
-                'custom_price': custom_price,
-                'created_by': current_user.user_id,
-                'created_at': datetime.now(),
-                'updated_at': datetime.now()
-            }
-            
-            # Use combination of customer_id and product_id as document ID
-            doc_id = f"{customer_id}_{product_id}"
-            db.collection('customer_pricing').document(doc_id).set(pricing_doc)
-            
-            return jsonify({
-                'success': True,
-                'message': 'Customer pricing updated successfully'
-            })
+            # Save custom pricing (document ID is customer_id + product_id)
+            return jsonify(product_controller.set_customer_pricing(product_id, customer_id, custom_price, product))
             
         except Exception as e:
             print(f"Set customer pricing error: {e}")
@@ -468,52 +452,12 @@ def create_app():
     def api_pricing_analytics(customer_id):
         """API: Get pricing analytics for a customer"""
         try:
-            from config import config
-            db = config.get_db()
-            
-            # Get all custom pricing for this customer
-            pricing_docs = db.collection('customer_pricing').where('customer_id', '==', customer_id).get()
-            
-            total_products_with_custom_pricing = len(list(pricing_docs))
-            total_savings = 0
-            products_with_savings = []
-            
-            # Re-query since docs iterator is consumed
-            pricing_docs = db.collection('customer_pricing').where('customer_id', '==', customer_id).get()
-            
-            for doc in pricing_docs:
-                pricing_data = doc.to_dict()
-                product = Product.get_by_id(pricing_data['product_id'])
-                
-                if product:
-                    savings = product.price - pricing_data['custom_price']
-                    total_savings += savings
-                    
-                    if savings > 0:
-                        products_with_savings.append({
-                            'product_name': product.product_name,
-                            'base_price': product.price,
-                            'custom_price': pricing_data['custom_price'],
-                            'savings': savings
-                        })
-            
-            # Get customer orders to calculate actual realized savings
-            orders = Order.get_by_customer_id(customer_id)
-            realized_savings = 0
-            
-            for order in orders:
-                if order.status == 'dispatched':  # Only completed orders
-                    order_summary = order_controller.get_order_pricing_summary(order)
-                    realized_savings += order_summary.get('total_savings', 0)
+            refresh = request.args.get('refresh') == '1'
+            analytics = pricing_analytics.get_pricing_analytics(customer_id, use_cache=not refresh)
             
             return jsonify({
                 'success': True,
-                'analytics': {
-                    'total_products_with_custom_pricing': total_products_with_custom_pricing,
-                    'potential_total_savings': total_savings,
-                    'realized_savings': realized_savings,
-                    'top_savings_products': sorted(products_with_savings, key=lambda x: x['savings'], reverse=True)[:10]
-                }
+                'analytics': analytics
             })
             
         except Exception as e:
@@ -524,79 +468,32 @@ def create_app():
     @login_required
     @role_required('vendor_superadmin', 'vendor_admin')
     def api_pricing_summary_report():
-        """API: Get overall pricing summary report - FIXED VERSION"""
+        """API: Get overall pricing summary report from the per-customer pricing summaries"""
         try:
             from config import config
-            from models import Customer, Product
+            from models import PricingSummary
             
             db = config.get_db()
             
-            # Initialize variables
-            customers_with_pricing = {}
-            report_data = []  # Initialize report_data here
+            # ?rebuild=1 recomputes the summaries from customer_pricing
+            summaries = PricingSummary.get_all(rebuild=bool(request.args.get('rebuild')))
+            summaries = [entry for entry in summaries if entry.get('total_custom_products', 0) > 0]
             
-            print("Starting pricing summary report generation...")
+            # Customer names in one batched read
+            refs = [db.collection('customers').document(entry['customer_id']) for entry in summaries]
+            customer_names = {doc.id: doc.to_dict().get('company_name') for doc in db.get_all(refs) if doc.exists} if refs else {}
             
-            # Get all customer pricing documents
-            pricing_docs = db.collection('customer_pricing').get()
-            pricing_docs_list = list(pricing_docs)  # Convert to list to avoid iterator issues
-            
-            print(f"Found {len(pricing_docs_list)} pricing documents")
-            
-            # Process each pricing document
-            for doc in pricing_docs_list:
-                try:
-                    pricing_data = doc.to_dict()
-                    customer_id = pricing_data.get('customer_id')
-                    product_id = pricing_data.get('product_id')
-                    custom_price = pricing_data.get('custom_price', 0)
-                    
-                    if not customer_id or not product_id:
-                        print(f"Skipping document with missing customer_id or product_id: {doc.id}")
-                        continue
-                    
-                    # Initialize customer data if not exists
-                    if customer_id not in customers_with_pricing:
-                        customers_with_pricing[customer_id] = {
-                            'total_custom_products': 0,
-                            'total_potential_savings': 0
-                        }
-                    
-                    customers_with_pricing[customer_id]['total_custom_products'] += 1
-                    
-                    # Calculate savings
-                    product = Product.get_by_id(product_id)
-                    if product and product.price > 0:
-                        savings = product.price - custom_price
-                        if savings > 0:  # Only count positive savings
-                            customers_with_pricing[customer_id]['total_potential_savings'] += savings
-                            print(f"Customer {customer_id}: Product {product_id}, Savings: {savings}")
-                    
-                except Exception as doc_error:
-                    print(f"Error processing document {doc.id}: {doc_error}")
+            report_data = []
+            for summary in summaries:
+                customer_id = summary['customer_id']
+                if customer_id not in customer_names:
                     continue
-            
-            print(f"Processed pricing data for {len(customers_with_pricing)} customers")
-            
-            # Build report data with customer names
-            for customer_id, data in customers_with_pricing.items():
-                try:
-                    customer = Customer.get_by_id(customer_id)
-                    if customer:
-                        report_data.append({
-                            'customer_id': customer_id,
-                            'customer_name': customer.company_name,
-                            'total_custom_products': data['total_custom_products'],
-                            'total_potential_savings': round(data['total_potential_savings'], 2)
-                        })
-                        print(f"Added customer {customer.company_name} to report")
-                    else:
-                        print(f"Customer {customer_id} not found, skipping")
-                except Exception as customer_error:
-                    print(f"Error processing customer {customer_id}: {customer_error}")
-                    continue
-            
-            print(f"Final report contains {len(report_data)} customers")
+                report_data.append({
+                    'customer_id': customer_id,
+                    'customer_name': customer_names[customer_id],
+                    'total_custom_products': summary['total_custom_products'],
+                    'total_potential_savings': round(summary.get('total_potential_savings', 0), 2)
+                })
             
             # Sort by total potential savings (highest first)
             report_data.sort(key=lambda x: x['total_potential_savings'], reverse=True)
@@ -679,54 +576,45 @@ def create_app():
             if not customer:
                 return jsonify({'success': False, 'message': 'Customer not found'})
             
-            # Get customer order history
-            orders = Order.get_by_customer_id(customer_id)
-            completed_orders = [o for o in orders if o.status == 'dispatched']
-            
-            # Analyze ordering patterns
-            product_frequency = {}
-            for order in completed_orders:
-                for item in order.items:
-                    product_id = item['product_id']
-                    if product_id not in product_frequency:
-                        product_frequency[product_id] = {
-                            'count': 0,
-                            'total_quantity': 0,
-                            'total_value': 0
-                        }
-                    product_frequency[product_id]['count'] += 1
-                    product_frequency[product_id]['total_quantity'] += item['quantity']
-                    product_frequency[product_id]['total_value'] += item['total']
-            
-            # Generate suggestions
-            suggestions = []
-            for product_id, stats in product_frequency.items():
-                if stats['count'] >= 3:  # Products ordered 3+ times
-                    product = Product.get_by_id(product_id)
-                    if product:
-                        avg_order_value = stats['total_value'] / stats['count']
-                        suggested_discount = min(0.15, stats['count'] * 0.02)  # Up to 15% discount
-                        suggested_price = product.price * (1 - suggested_discount)
-                        
-                        suggestions.append({
-                            'product_id': product_id,
-                            'product_name': product.product_name,
-                            'base_price': product.price,
-                            'suggested_price': suggested_price,
-                            'discount_percentage': suggested_discount * 100,
-                            'order_frequency': stats['count'],
-                            'avg_order_value': avg_order_value,
-                            'reason': f"Frequently ordered ({stats['count']} times)"
-                        })
+            # Purchase aggregates are maintained on dispatch and backfilled on first use
+            if request.args.get('rebuild') == '1':
+                PurchaseHistory.rebuild(customer_id)
+            totals = PurchaseHistory.get_totals(customer_id) or {}
+            frequent = PurchaseHistory.get_frequent_products(customer_id, min_count=3, limit=10)
             
-            # Sort by order frequency
-            suggestions.sort(key=lambda x: x['order_frequency'], reverse=True)
+            # Current prices of the frequent products in one batched read
+            from config import config
+            db = config.get_db()
+            refs = [db.collection('products').document(stats['product_id']) for stats in frequent]
+            products = {doc.id: Product.from_dict(doc.to_dict()) for doc in db.get_all(refs) if doc.exists} if refs else {}
+            
+            # Generate suggestions from products ordered 3+ times that are still sold
+            suggestions = []
+            for stats in frequent:
+                product = products.get(stats['product_id'])
+                if not product or not product.is_active or product.is_deleted:
+                    continue
+                
+                avg_order_value = stats['total_value'] / stats['order_count']
+                suggested_discount = min(0.15, stats['order_count'] * 0.02)  # Up to 15% discount
+                suggested_price = product.price * (1 - suggested_discount)
+                
+                suggestions.append({
+                    'product_id': stats['product_id'],
+                    'product_name': product.product_name,
+                    'base_price': product.price,
+                    'suggested_price': suggested_price,
+                    'discount_percentage': suggested_discount * 100,
+                    'order_frequency': stats['order_count'],
+                    'avg_order_value': avg_order_value,
+                    'reason': f"Frequently ordered ({stats['order_count']} times)"
+                })
             
             return jsonify({
                 'success': True,
-                'suggestions': suggestions[:10],  # Top 10 suggestions
+                'suggestions': suggestions,  # Top 10, most frequent first
                 'customer_name': customer.company_name,
-                'total_completed_orders': len(completed_orders)
+                'total_completed_orders': totals.get('dispatched_orders', 0)
             })
             
         except Exception as e:
@@ -739,6 +627,11 @@ def create_app():
     def api_pricing_comparison(product_id):
         """API: Compare pricing across all customers for a product"""
         try:
+            offset = request.args.get('offset', 0, type=int)
+            limit = request.args.get('limit', type=int)
+            if offset < 0 or (limit is not None and limit < 1):
+                return jsonify({'success': False, 'message': 'Limit must be positive and offset not negative'}), 400
+            
             product = Product.get_by_id(product_id)
             if not product:
                 return jsonify({'success': False, 'message': 'Product not found'})
@@ -748,49 +641,58 @@ def create_app():
             
             # Get all custom pricing for this product
             pricing_docs = db.collection('customer_pricing').where('product_id', '==', product_id).get()
+            pricing_list = [doc.to_dict() for doc in pricing_docs]
+            
+            # Resolve every customer name at once from the cached directory
+            customer_names = BranchDirectory.resolve_customer_names({p['customer_id'] for p in pricing_list})
             
+            # Build rows and statistics in a single pass
             pricing_comparison = []
-            for doc in pricing_docs:
-                pricing_data = doc.to_dict()
-                customer = Customer.get_by_id(pricing_data['customer_id'])
+            total_custom_price = total_discount = 0
+            min_custom_price = max_custom_price = None
+            for pricing_data in pricing_list:
+                customer_id = pricing_data['customer_id']
+                if customer_id not in customer_names:
+                    continue
                 
-                if customer:
-                    savings = product.price - pricing_data['custom_price']
-                    discount_percentage = (savings / product.price) * 100 if product.price > 0 else 0
-                    
-                    pricing_comparison.append({
-                        'customer_id': customer.customer_id,
-                        'customer_name': customer.company_name,
-                        'custom_price': pricing_data['custom_price'],
-                        'savings': savings,
-                        'discount_percentage': discount_percentage,
-                        'updated_at': pricing_data.get('updated_at')
-                    })
+                custom_price = pricing_data['custom_price']
+                savings = product.price - custom_price
+                discount_percentage = (savings / product.price) * 100 if product.price > 0 else 0
+                
+                pricing_comparison.append({
+                    'customer_id': customer_id,
+                    'customer_name': customer_names[customer_id],
+                    'custom_price': custom_price,
+                    'savings': savings,
+                    'discount_percentage': discount_percentage,
+                    'updated_at': pricing_data.get('updated_at')
+                })
+                
+                total_custom_price += custom_price
+                total_discount += discount_percentage
+                min_custom_price = custom_price if min_custom_price is None else min(min_custom_price, custom_price)
+                max_custom_price = custom_price if max_custom_price is None else max(max_custom_price, custom_price)
             
-            # Sort by discount percentage (highest first)
-            pricing_comparison.sort(key=lambda x: x['discount_percentage'], reverse=True)
+            count = len(pricing_comparison)
             
-            # Calculate statistics
-            if pricing_comparison:
-                custom_prices = [p['custom_price'] for p in pricing_comparison]
-                avg_custom_price = sum(custom_prices) / len(custom_prices)
-                min_custom_price = min(custom_prices)
-                max_custom_price = max(custom_prices)
-                avg_discount = sum(p['discount_percentage'] for p in pricing_comparison) / len(pricing_comparison)
-            else:
-                avg_custom_price = min_custom_price = max_custom_price = avg_discount = 0
+            # Sort by discount percentage (highest first unless ?order=asc), then page
+            pricing_comparison.sort(key=lambda x: x['discount_percentage'], reverse=request.args.get('order') != 'asc')
+            page = pricing_comparison[offset:offset + limit] if limit else pricing_comparison[offset:]
             
             return jsonify({
                 'success': True,
                 'product_name': product.product_name,
                 'base_price': product.price,
-                'pricing_comparison': pricing_comparison,
+                'pricing_comparison': page,
+                'total': count,
+                'offset': offset,
+                'limit': limit,
                 'statistics': {
-                    'total_customers_with_custom_pricing': len(pricing_comparison),
-                    'avg_custom_price': avg_custom_price,
-                    'min_custom_price': min_custom_price,
-                    'max_custom_price': max_custom_price,
-                    'avg_discount_percentage': avg_discount
+                    'total_customers_with_custom_pricing': count,
+                    'avg_custom_price': total_custom_price / count if count else 0,
+                    'min_custom_price': min_custom_price or 0,
+                    'max_custom_price': max_custom_price or 0,
+                    'avg_discount_percentage': total_discount / count if count else 0
                 }
             })
             
@@ -1059,22 +961,7 @@ def create_app():
     @role_required('vendor_superadmin', 'vendor_admin')
     def api_delete_customer_pricing(customer_id, product_id):
         """API: Delete customer-specific pricing (revert to base price)"""
-        try:
-            from config import config
-            db = config.get_db()
-            
-            # Delete the custom pricing document
-            doc_id = f"{customer_id}_{product_id}"
-            db.collection('customer_pricing').document(doc_id).delete()
-            
-            return jsonify({
-                'success': True,
-                'message': 'Customer pricing removed successfully'
-            })
-            
-        except Exception as e:
-            print(f"Delete customer pricing error: {e}")
-            return jsonify({'success': False, 'message': 'Failed to remove customer pricing'})
+        return jsonify(product_controller.delete_customer_pricing(product_id, customer_id))
     
     # ================== PRODUCT ROUTES ==================
     
@@ -1099,6 +986,16 @@ def create_app():
         """API: Create new product without base pricing (pricing set per customer)"""
         return jsonify(product_controller.create_product())
     
+    @app.route('/api/products/low-stock')
+    @login_required
+    @role_required('vendor_superadmin', 'vendor_admin', 'vendor_normal')
+    def api_low_stock_products():
+        """API: Get low-stock products, filterable by location_id and category"""
+        return jsonify(product_controller.get_low_stock_products(
+            request.args.get('location_id') or None,
+            request.args.get('category') or None
+        ))
+    
     @app.route('/api/products/<product_id>')
     @login_required
     def api_product_details(product_id):
@@ -1411,6 +1308,87 @@ def create_app():
         """API: Create new order with customer-specific pricing"""
         return jsonify(order_controller.create_order())
     
+    @app.route('/api/orders/pending-approvals')
+    @login_required
+    @role_required('customer_dept_head', 'customer_hr_admin')
+    def api_pending_approvals():
+        """API: Orders waiting for the current approver, with counts"""
+        return jsonify(order_controller.get_pending_approvals())
+    
+    @app.route('/api/orders/bulk-approval', methods=['PUT'])
+    @login_required
+    @role_required('customer_dept_head', 'customer_hr_admin')
+    def api_bulk_approval():
+        """API: Approve or reject several orders at once"""
+        return jsonify(order_controller.process_bulk_approval())
+    
+    @app.route('/api/orders/batch/pack', methods=['PUT'])
+    @login_required
+    @role_required('vendor_superadmin', 'vendor_admin', 'vendor_normal')
+    def api_batch_pack_orders():
+        """API: Mark several approved orders as fully packed"""
+        return jsonify(order_controller.batch_pack_orders())
+    
+    @app.route('/api/orders/batch/dispatch-approval', methods=['PUT'])
+    @login_required
+    @role_required('vendor_superadmin', 'vendor_admin')
+    def api_batch_dispatch_approval():
+        """API: Approve dispatch of several packed orders"""
+        return jsonify(order_controller.batch_approve_dispatch())
+    
+    @app.route('/api/orders/batch/dispatch', methods=['PUT'])
+    @login_required
+    @role_required('vendor_superadmin', 'vendor_admin', 'vendor_normal')
+    def api_batch_dispatch_orders():
+        """API: Mark several ready orders as dispatched"""
+        return jsonify(order_controller.batch_dispatch_orders())
+
+    @app.route('/api/warehouse/pick-list')
+    @login_required
+    @role_required('vendor_superadmin', 'vendor_admin', 'vendor_normal')
+    def api_pick_list():
+        """API: Consolidated pick list of approved orders per serving location (JSON or ?format=csv)"""
+        try:
+            import tempfile
+
+            pick_list = warehouse.build_pick_list(location_id=request.args.get('location_id') or None)
+
+            if request.args.get('format') != 'csv':
+                return jsonify({'success': True, **pick_list})
+
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False, newline='') as f:
+                warehouse.write_pick_list_csv(pick_list, f)
+                temp_path = f.name
+
+            return send_file(
+                temp_path,
+                as_attachment=True,
+                download_name=f"pick_list_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mimetype='text/csv'
+            )
+
+        except Exception as e:
+            print(f"Pick list error: {e}")
+            return jsonify({'success': False, 'message': 'Failed to generate pick list'}), 500
+
+    @app.route('/api/warehouse/dispatch-waves')
+    @login_required
+    @role_required('vendor_superadmin', 'vendor_admin', 'vendor_normal')
+    def api_dispatch_waves():
+        """API: Plan ready-for-dispatch orders into waves per serving location and pincode zone"""
+        try:
+            max_orders = request.args.get('max_orders', warehouse.WAVE_MAX_ORDERS, type=int)
+            max_units = request.args.get('max_units', warehouse.WAVE_MAX_UNITS, type=int)
+            if max_orders < 1 or max_units < 1:
+                return jsonify({'success': False, 'message': 'Wave limits must be positive numbers'}), 400
+
+            plan = warehouse.plan_dispatch_waves(max_orders=max_orders, max_units=max_units)
+            return jsonify({'success': True, **plan})
+
+        except Exception as e:
+            print(f"Dispatch wave planning error: {e}")
+            return jsonify({'success': False, 'message': 'Failed to plan dispatch waves'}), 500
+
     @app.route('/api/orders/<order_id>')
     @login_required
     def api_order_details(order_id):
@@ -1761,9 +1739,12 @@ def create_app():
     
     @app.route('/uploads/<path:filename>')
     def uploaded_file(filename):
-        """Serve uploaded files from local storage"""
+        """Serve uploaded files from local storage with caching headers"""
         try:
-            return send_file(os.path.join('uploads', filename))
+            response = send_upload(filename, app.config['UPLOAD_FOLDER'])
+            if response is None:
+                return jsonify({'success': False, 'message': 'File not found'}), 404
+            return response
         except FileNotFoundError:
             return jsonify({'success': False, 'message': 'File not found'}), 404
     
@@ -1796,17 +1777,10 @@ def create_app():
             storage_handler = config.get_storage()
             
             if config.use_local_storage:
-                # Local storage
-                file_path = f"{upload_path}/{filename}"
-                full_path = os.path.join('uploads', file_path)
-                
-                # Ensure directory exists
-                os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                
-                # Save file
-                file.save(full_path)
-                
-                file_url = f"/uploads/{file_path}"
+                # Local storage - content-addressed under the requested folder
+                folder = secure_filename(upload_path) or 'uploads'
+                file_url = storage_handler.upload_content_addressed(file.stream, folder, file_extension)
+                filename = file_url.rsplit('/', 1)[-1]
             else:
                 # Firebase Storage
                 blob = storage_handler.blob(f"{upload_path}/{filename}")
@@ -1868,6 +1842,67 @@ def create_app():
         """API: Get customers for dropdown"""
         return jsonify(vendor_controller.get_customer_dropdown_data())
     
+    @app.route('/api/vendor/analytics/revenue')
+    @login_required
+    @role_required('vendor_superadmin', 'vendor_admin')
+    def api_sales_analytics_revenue():
+        """API: Revenue by customer and month"""
+        return jsonify(vendor_controller.get_sales_analytics('revenue'))
+    
+    @app.route('/api/vendor/analytics/category-mix')
+    @login_required
+    @role_required('vendor_superadmin', 'vendor_admin')
+    def api_sales_analytics_category_mix():
+        """API: Quantity and revenue share per product category"""
+        return jsonify(vendor_controller.get_sales_analytics('category_mix'))
+    
+    @app.route('/api/vendor/analytics/department-spend')
+    @login_required
+    @role_required('vendor_superadmin', 'vendor_admin')
+    def api_sales_analytics_department_spend():
+        """API: Spend per customer department"""
+        return jsonify(vendor_controller.get_sales_analytics('department_spend'))
+    
+    @app.route('/api/vendor/reports/gst-summary')
+    @login_required
+    @role_required('vendor_superadmin', 'vendor_admin')
+    def api_gst_summary():
+        """API: Monthly GST summary by HSN code and rate (JSON or ?format=csv)"""
+        try:
+            import csv
+            import tempfile
+
+            result = vendor_controller.get_gst_summary()
+            if not result['success'] or request.args.get('format') != 'csv':
+                return jsonify(result)
+
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False, newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['Month', 'HSN Code', 'GST Rate (%)', 'Taxable Value', 'Tax Amount', 'Total Value', 'Orders'])
+                for row in result['rows']:
+                    writer.writerow([
+                        row['month'],
+                        row['hsn_code'] or '',
+                        f"{row['gst_rate']:g}",
+                        f"{row['taxable_value']:.2f}",
+                        f"{row['tax_amount']:.2f}",
+                        f"{row['total_value']:.2f}",
+                        row['order_count']
+                    ])
+                temp_path = f.name
+
+            period = '_'.join(filter(None, (result['start'], result['end']))) or 'all'
+            return send_file(
+                temp_path,
+                as_attachment=True,
+                download_name=f"gst_summary_{period}.csv",
+                mimetype='text/csv'
+            )
+
+        except Exception as e:
+            print(f"GST summary error: {e}")
+            return jsonify({'success': False, 'message': 'Failed to generate GST summary'}), 500
+    
     @app.route('/api/vendor/system-health')
     @login_required
     @role_required('vendor_superadmin')
@@ -2045,63 +2080,7 @@ def create_app():
     @role_required('vendor_superadmin', 'vendor_admin')
     def api_update_customer(customer_id):
         """API: Update customer with file upload support - FIXED VERSION"""
-        try:
-            current_user = auth_controller.get_current_user()
-            if not current_user or current_user.role not in ['vendor_superadmin', 'vendor_admin']:
-                return jsonify({'success': False, 'message': 'Insufficient permissions'})
-            
-            from models import Customer
-            customer = Customer.get_by_id(customer_id)
-            if not customer:
-                return jsonify({'success': False, 'message': 'Customer not found'})
-            
-            # Handle both form data and JSON
-            if request.content_type and request.content_type.startswith('multipart/form-data'):
-                data = request.form.to_dict()
-            else:
-                data = request.get_json()
-            
-            # Update basic fields
-            updateable_fields = [
-                'company_name', 'email', 'postal_address', 
-                'primary_phone', 'alternate_phone', 'is_active'
-            ]
-            
-            for field in updateable_fields:
-                if field in data:
-                    if field == 'is_active':
-                        setattr(customer, field, data[field] == 'true' or data[field] is True)
-                    else:
-                        setattr(customer, field, data[field])
-            
-            # Handle agreement file upload
-            if 'agreement_file' in request.files:
-                file = request.files['agreement_file']
-                if file and file.filename:
-                    # Remove old file logic could go here
-                    agreement_url = customer_controller.upload_agreement_file(file, customer.customer_id)
-                    if agreement_url:
-                        customer.agreement_file_url = agreement_url
-                    else:
-                        return jsonify({'success': False, 'message': 'Failed to upload agreement file'})
-            
-            # Handle file removal
-            if data.get('remove_current_file') == 'true':
-                customer.agreement_file_url = None
-            
-            if customer.save():
-                return jsonify({
-                    'success': True,
-                    'message': 'Customer updated successfully'
-                })
-            else:
-                return jsonify({'success': False, 'message': 'Failed to update customer'})
-                
-        except Exception as e:
-            print(f"Update customer error: {e}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'success': False, 'message': 'Failed to update customer'})
+        return jsonify(customer_controller.update_customer(customer_id))
 
     # ================== PRODUCT CATEGORIES ROUTES ==================
 
@@ -2316,16 +2295,17 @@ def create_app():
     @app.route('/api/branches-dropdown')
     @login_required
     def api_branches_dropdown():
-        """API: Get branches for dropdown filtering - FIXED VERSION"""
+        """API: Get branches for dropdown filtering (optional ?q= search)"""
         try:
             current_user = auth_controller.get_current_user()
+            search = request.args.get('q', '').strip()
             
             # Get branches based on user role
             branches = []
             
             if current_user.role.startswith('customer_'):
                 # Customer users can only see branches from their organization
-                from models import Branch
+                from models import Branch, filter_branch_entries
                 customer_branches = Branch.get_by_customer_id(current_user.customer_id)
                 for branch in customer_branches:
                     if branch.is_active:
@@ -2336,29 +2316,12 @@ def create_app():
                             'display_name': branch.name,
                             'customer_id': branch.customer_id
                         })
+                branches = filter_branch_entries(branches, search)
                         
             elif current_user.role.startswith('vendor_'):
-                # Vendor users can see branches from all customers
-                from models import Branch, Customer
-                
-                # Get all active customers
-                customers = Customer.get_all_active()
-                for customer in customers:
-                    customer_branches = Branch.get_by_customer_id(customer.customer_id)
-                    for branch in customer_branches:
-                        if branch.is_active:
-                            branches.append({
-                                'branch_id': branch.branch_id,
-                                'name': branch.name,
-                                'address': branch.address,
-                                'display_name': f"{branch.name} ({customer.company_name})",
-                                'customer_id': branch.customer_id,
-                                'customer_name': customer.company_name
-                            })
-            
-            print(f"DEBUG: Found {len(branches)} branches for user role {current_user.role}")
-            for branch in branches[:3]:  # Show first 3 for debugging
-                print(f"  - {branch['display_name']} (ID: {branch['branch_id']})")
+                # Vendor users see branches from all active customers - one cached directory
+                from models import BranchDirectory
+                branches = BranchDirectory.get_entries(search)
             
             return jsonify({
                 'success': True,
@@ -2438,16 +2401,7 @@ def create_app():
                 return jsonify({'success': False, 'message': 'Access denied'})
             
             # Indian states grouped by pincode zones
-            pincode_states = {
-                '1': ['Delhi NCR', 'Haryana', 'Himachal Pradesh', 'Punjab', 'UT/Chandigarh', 'UT/Jammu and Kashmir', 'UT/Ladakh'],
-                '2': ['Uttarakhand', 'Uttar Pradesh'],
-                '3': ['Gujarat', 'Rajasthan', 'UT/Dadra, Nagar Haveli, Daman & Diu'],
-                '4': ['Chhattisgarh', 'Goa', 'Madhya Pradesh', 'Maharashtra'],
-                '5': ['Andhra Pradesh', 'Karnataka', 'Telangana'],
-                '6': ['Kerala', 'Tamil Nadu', 'UT/Puducherry', 'UT/Lakshadweep'],
-                '7': ['Arunachal Pradesh', 'Assam', 'Manipur', 'Meghalaya', 'Mizoram', 'Nagaland', 'Odisha', 'Sikkim', 'Tripura', 'West Bengal', 'UT/Andaman and Nicobar Islands'],
-                '8': ['Bihar', 'Jharkhand']
-            }
+            pincode_states = Location.PINCODE_STATES
             
             # Get all states as a flat list for convenience
             all_states = []
@@ -0,0 +1,461 @@
+# Document Store - Firestore-compatible client API shared by the local backends
+import copy
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from google.api_core.exceptions import Aborted, FailedPrecondition
+from google.cloud.firestore_v1.transforms import (
+    ArrayRemove, ArrayUnion, DELETE_FIELD, Increment, SERVER_TIMESTAMP
+)
+
+
+class DocumentStore:
+    """Base class for database backends that stand in for the Firestore client.
+
+    Implements the client surface used by the models (collection, document,
+    get_all, batch, transaction, write_option) and the query/reference/snapshot
+    objects.
+    Subclasses only provide the storage primitives: _read, _write, _update,
+    _delete, _query, _stored_update_time and optionally _commit. Every write
+    stamps the document with a new update time, which snapshots expose and
+    write_option() preconditions compare against.
+
+    Every call that would be a network round-trip against Firestore is routed
+    through _rpc(), which counts it in ``stats`` and sleeps for ``latency_ms``.
+    """
+
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = float(latency_ms or 0)
+        self._lock = threading.RLock()
+        self._last_update_time = None
+        self.stats = {'rpcs': 0, 'reads': 0, 'writes': 0}
+
+    # ---- Client API ----
+
+    def collection(self, name):
+        """Get a collection reference"""
+        return CollectionReference(self, name)
+
+    def document(self, path):
+        """Get a document reference from a 'collection/doc_id' path"""
+        collection_name, doc_id = path.split('/', 1)
+        return self.collection(collection_name).document(doc_id)
+
+    def get_all(self, references):
+        """Fetch several documents in a single round-trip"""
+        self._rpc()
+        return iter([self._read(ref._collection, ref.id) for ref in references])
+
+    def batch(self):
+        """Create a write batch committed in a single round-trip"""
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts=5, read_only=False):
+        """Create a transaction for use with firestore.transactional"""
+        return Transaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def write_option(self, **kwargs):
+        """Precondition for update()/delete(): the document's update time must still match"""
+        if set(kwargs) != {'last_update_time'}:
+            raise TypeError("Only the last_update_time write option is supported")
+        return LastUpdateOption(kwargs['last_update_time'])
+
+    # ---- Stats ----
+
+    def reset_stats(self):
+        """Reset round-trip counters"""
+        with self._lock:
+            self.stats = {'rpcs': 0, 'reads': 0, 'writes': 0}
+
+    def snapshot_stats(self):
+        """Copy of the current counters"""
+        with self._lock:
+            return dict(self.stats)
+
+    def _rpc(self):
+        with self._lock:
+            self.stats['rpcs'] += 1
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000.0)
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _next_update_time(self):
+        """A write timestamp later than every one handed out before"""
+        with self._lock:
+            now = datetime.now()
+            if self._last_update_time is not None and now <= self._last_update_time:
+                now = self._last_update_time + timedelta(microseconds=1)
+            self._last_update_time = now
+            return now
+
+    def _check_preconditions(self, operations, stored_update_time, reads=()):
+        """Raise FailedPrecondition unless every write option still holds, or
+        Aborted if a document read by a transaction changed since"""
+        for ref, update_time in reads:
+            if stored_update_time(ref) != update_time:
+                raise Aborted(f"Transaction read of {ref.path} is stale")
+        for action, ref, data, merge, option in operations:
+            if option is not None and stored_update_time(ref) != option.last_update_time:
+                raise FailedPrecondition(f"Document {ref.path} was modified since it was read")
+
+    # ---- Storage primitives (implemented by subclasses) ----
+
+    def _read(self, collection_name, doc_id):
+        """Return a DocumentSnapshot"""
+        raise NotImplementedError
+
+    def _write(self, collection_name, doc_id, data, merge=False):
+        """Write the document; returns its new update time"""
+        raise NotImplementedError
+
+    def _update(self, collection_name, doc_id, data):
+        """Update the document; returns its new update time"""
+        raise NotImplementedError
+
+    def _delete(self, collection_name, doc_id):
+        raise NotImplementedError
+
+    def _stored_update_time(self, collection_name, doc_id):
+        """Update time of the stored document, or None if it does not exist"""
+        raise NotImplementedError
+
+    def _query(self, collection_name, filters, orders, limit_count, offset_count):
+        """Return a list of DocumentSnapshots"""
+        raise NotImplementedError
+
+    def _commit(self, operations, reads=()):
+        """Apply a list of (action, reference, data, merge, option) writes atomically.
+
+        ``reads`` are the (reference, update time) pairs a transaction read.
+        Returns the update time of each write. Preconditions are checked before
+        anything is written, so a failed one leaves every document untouched.
+        """
+        with self._lock:
+            self._check_preconditions(
+                operations, lambda ref: self._stored_update_time(ref._collection, ref.id), reads
+            )
+            update_times = []
+            for action, ref, data, merge, option in operations:
+                if action == 'set':
+                    update_times.append(self._write(ref._collection, ref.id, data, merge=merge))
+                elif action == 'update':
+                    update_times.append(self._update(ref._collection, ref.id, data))
+                else:
+                    self._delete(ref._collection, ref.id)
+                    update_times.append(self._next_update_time())
+            return update_times
+
+
+class Query:
+    """Immutable query over a collection"""
+
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
+    def __init__(self, client, collection_name, filters=None, orders=None,
+                 limit_count=None, offset_count=0):
+        self._client = client
+        self._collection = collection_name
+        self._filters = filters or []
+        self._orders = orders or []
+        self._limit = limit_count
+        self._offset = offset_count
+
+    def _copy(self, **changes):
+        params = {
+            'filters': list(self._filters),
+            'orders': list(self._orders),
+            'limit_count': self._limit,
+            'offset_count': self._offset
+        }
+        params.update(changes)
+        return Query(self._client, self._collection, **params)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        """Add a filter (positional or FieldFilter style)"""
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path, direction=ASCENDING):
+        """Order results by a field"""
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def limit(self, count):
+        """Limit number of results"""
+        return self._copy(limit_count=count)
+
+    def offset(self, count):
+        """Skip the first results"""
+        return self._copy(offset_count=count)
+
+    def get(self):
+        """Run the query in a single round-trip"""
+        self._client._rpc()
+        return self._client._query(self._collection, self._filters, self._orders, self._limit, self._offset)
+
+    def stream(self):
+        """Run the query and iterate over the results"""
+        return iter(self.get())
+
+
+class CollectionReference(Query):
+    """Collection reference - a query without filters"""
+
+    def __init__(self, client, name):
+        super().__init__(client, name)
+        self.id = name
+
+    def document(self, doc_id=None):
+        """Get a document reference, generating an ID if none is given"""
+        return DocumentReference(self._client, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data):
+        """Create a document with a generated ID"""
+        ref = self.document()
+        ref.set(data)
+        return datetime.now(), ref
+
+
+class DocumentReference:
+    """Reference to a single document"""
+
+    def __init__(self, client, collection_name, doc_id):
+        self._client = client
+        self._collection = collection_name
+        self.id = doc_id
+        self.path = f"{collection_name}/{doc_id}"
+
+    def get(self, field_paths=None, transaction=None):
+        """Fetch the document (recording the read when inside a transaction)"""
+        self._client._rpc()
+        snapshot = self._client._read(self._collection, self.id)
+        if transaction is not None:
+            transaction._record_read(snapshot)
+        return snapshot
+
+    def set(self, data, merge=False):
+        """Create or overwrite the document"""
+        self._client._rpc()
+        return WriteResult(self._client._write(self._collection, self.id, data, merge=merge))
+
+    def update(self, data, option=None):
+        """Update fields of an existing document"""
+        self._client._rpc()
+        if option is not None:
+            return WriteResult(self._client._commit([('update', self, data, False, option)])[0])
+        return WriteResult(self._client._update(self._collection, self.id, data))
+
+    def delete(self, option=None):
+        """Delete the document"""
+        self._client._rpc()
+        if option is not None:
+            return WriteResult(self._client._commit([('delete', self, None, False, option)])[0])
+        self._client._delete(self._collection, self.id)
+        return WriteResult(self._client._next_update_time())
+
+
+class DocumentSnapshot:
+    """Result of reading a document"""
+
+    def __init__(self, reference, data, update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self.update_time = update_time if data is not None else None
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        """Document data, or None if the document does not exist"""
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        """Get a single field value"""
+        return get_field(self._data or {}, field_path)
+
+
+class LastUpdateOption:
+    """Write precondition created by write_option(last_update_time=...)"""
+
+    def __init__(self, last_update_time):
+        self.last_update_time = last_update_time
+
+
+class WriteResult:
+    """Outcome of a single write"""
+
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class WriteBatch:
+    """Write batch - all operations are applied in one round-trip on commit.
+
+    If any write option fails the commit raises FailedPrecondition and no
+    write of the batch is applied, as in Firestore.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._operations = []
+
+    def set(self, reference, data, merge=False):
+        self._operations.append(('set', reference, data, merge, None))
+        return self
+
+    def update(self, reference, data, option=None):
+        self._operations.append(('update', reference, data, False, option))
+        return self
+
+    def delete(self, reference, option=None):
+        self._operations.append(('delete', reference, None, False, option))
+        return self
+
+    def __len__(self):
+        return len(self._operations)
+
+    def commit(self):
+        """Apply all queued writes; returns a WriteResult per write"""
+        self._client._rpc()
+        operations, self._operations = self._operations, []
+        return [WriteResult(update_time) for update_time in self._client._commit(operations)]
+
+
+class Transaction(WriteBatch):
+    """Read-write transaction driven by firestore.transactional.
+
+    Reads made with ``reference.get(transaction=...)`` remember the document's
+    update time. The commit applies the staged writes only if none of the
+    documents read has changed since; otherwise it raises Aborted and
+    firestore.transactional runs the function again (up to max_attempts).
+    """
+
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._reads = {}
+
+    def get(self, ref_or_query):
+        """Read documents inside the transaction"""
+        if isinstance(ref_or_query, DocumentReference):
+            return iter([ref_or_query.get(transaction=self)])
+        snapshots = ref_or_query.get()
+        for snapshot in snapshots:
+            self._record_read(snapshot)
+        return iter(snapshots)
+
+    def _record_read(self, snapshot):
+        self._reads.setdefault(snapshot.reference.path, (snapshot.reference, snapshot.update_time))
+
+    # ---- Hooks called by firestore.transactional ----
+
+    def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().bytes
+
+    def _clean_up(self):
+        self._operations = []
+        self._reads = {}
+        self._id = None
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        self._client._rpc()
+        operations, reads = self._operations, list(self._reads.values())
+        self._clean_up()
+        return [WriteResult(update_time) for update_time in self._client._commit(operations, reads)]
+
+
+# ---- Field helpers ----
+
+def get_field(data, field_path):
+    """Resolve a dotted field path"""
+    value = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def apply_field(data, parts, value):
+    """Set a field (with Firestore transforms) at the given path"""
+    target = data
+    for part in parts[:-1]:
+        if not isinstance(target.get(part), dict):
+            target[part] = {}
+        target = target[part]
+    key = parts[-1]
+
+    if value is DELETE_FIELD:
+        target.pop(key, None)
+    elif value is SERVER_TIMESTAMP:
+        target[key] = datetime.now()
+    elif isinstance(value, ArrayUnion):
+        current = list(target.get(key) or [])
+        for item in value.values:
+            if item not in current:
+                current.append(copy.deepcopy(item))
+        target[key] = current
+    elif isinstance(value, ArrayRemove):
+        target[key] = [item for item in (target.get(key) or []) if item not in value.values]
+    elif isinstance(value, Increment):
+        target[key] = (target.get(key) or 0) + value.value
+    elif isinstance(value, dict):
+        nested = {}
+        for nested_key, nested_value in value.items():
+            apply_field(nested, [nested_key], nested_value)
+        target[key] = nested
+    else:
+        target[key] = copy.deepcopy(value)
+
+
+def merge_fields(existing, data, merge=False, dotted=True):
+    """Return a new document with ``data`` applied to ``existing``"""
+    result = copy.deepcopy(existing) if (merge and existing) else {}
+    for key, value in data.items():
+        apply_field(result, key.split('.') if (merge and dotted) else [key], value)
+    return result
+
+
+def match_filter(data, field_path, op, expected):
+    """Evaluate a single query filter against a document"""
+    actual = get_field(data, field_path)
+    try:
+        if op == '==':
+            return actual == expected
+        if op == '!=':
+            return actual is not None and actual != expected
+        if op == 'in':
+            return actual in expected
+        if op == 'not-in':
+            return actual is not None and actual not in expected
+        if op == 'array_contains':
+            return isinstance(actual, list) and expected in actual
+        if op == 'array_contains_any':
+            return isinstance(actual, list) and any(v in actual for v in expected)
+        if actual is None:
+            return False
+        if op == '<':
+            return actual < expected
+        if op == '<=':
+            return actual <= expected
+        if op == '>':
+            return actual > expected
+        if op == '>=':
+            return actual >= expected
+    except TypeError:
+        # Firestore never matches values of different types
+        return False
+    raise ValueError(f"Unsupported query operator: {op}")
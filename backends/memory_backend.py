@@ -0,0 +1,108 @@
+# In-Memory Firestore Backend - Offline stand-in for the Firestore client
+import copy
+
+from backends.document_store import (
+    DocumentStore, DocumentReference, DocumentSnapshot, apply_field, get_field,
+    match_filter, merge_fields
+)
+
+
+class MemoryFirestore(DocumentStore):
+    """In-memory implementation of the Firestore client API used by the models.
+
+    Every call that would be a network round-trip against Firestore (document
+    get/set/update/delete, query get/stream, get_all, batch commit) sleeps for
+    ``latency_ms`` and is counted in ``stats`` so benchmarks can report both
+    wall time and round-trips per request.
+    """
+
+    def __init__(self, latency_ms=0.0):
+        super().__init__(latency_ms)
+        self._collections = {}
+        self._update_times = {}
+
+    def load(self, collection_name, doc_id, data):
+        """Insert a document directly, without latency or counting (for seeding)"""
+        with self._lock:
+            self._docs(collection_name)[doc_id] = copy.deepcopy(data)
+            self._update_times[(collection_name, doc_id)] = self._next_update_time()
+
+    def count(self, collection_name):
+        """Number of documents in a collection (not counted as an RPC)"""
+        with self._lock:
+            return len(self._docs(collection_name))
+
+    # ---- Storage primitives ----
+
+    def _docs(self, collection_name):
+        return self._collections.setdefault(collection_name, {})
+
+    def _read(self, collection_name, doc_id):
+        with self._lock:
+            data = self._docs(collection_name).get(doc_id)
+            self.stats['reads'] += 1
+            ref = DocumentReference(self, collection_name, doc_id)
+            return DocumentSnapshot(
+                ref, copy.deepcopy(data) if data is not None else None,
+                self._update_times.get((collection_name, doc_id))
+            )
+
+    def _write(self, collection_name, doc_id, data, merge=False):
+        with self._lock:
+            docs = self._docs(collection_name)
+            docs[doc_id] = merge_fields(docs.get(doc_id), data, merge=merge)
+            self.stats['writes'] += 1
+            return self._touch(collection_name, doc_id)
+
+    def _update(self, collection_name, doc_id, data):
+        with self._lock:
+            docs = self._docs(collection_name)
+            if doc_id not in docs:
+                raise KeyError(f"No document to update: {collection_name}/{doc_id}")
+            for key, value in data.items():
+                apply_field(docs[doc_id], key.split('.'), value)
+            self.stats['writes'] += 1
+            return self._touch(collection_name, doc_id)
+
+    def _delete(self, collection_name, doc_id):
+        with self._lock:
+            self._docs(collection_name).pop(doc_id, None)
+            self._update_times.pop((collection_name, doc_id), None)
+            self.stats['writes'] += 1
+
+    def _stored_update_time(self, collection_name, doc_id):
+        with self._lock:
+            return self._update_times.get((collection_name, doc_id))
+
+    def _touch(self, collection_name, doc_id):
+        update_time = self._next_update_time()
+        self._update_times[(collection_name, doc_id)] = update_time
+        return update_time
+
+    def _query(self, collection_name, filters, orders, limit_count, offset_count):
+        with self._lock:
+            results = [
+                (doc_id, data) for doc_id, data in sorted(self._docs(collection_name).items())
+                if all(match_filter(data, field, op, value) for field, op, value in filters)
+            ]
+
+            for field, direction in reversed(orders):
+                results = sorted(
+                    [r for r in results if get_field(r[1], field) is not None],
+                    key=lambda r: get_field(r[1], field),
+                    reverse=(direction == 'DESCENDING')
+                )
+
+            if offset_count:
+                results = results[offset_count:]
+            if limit_count is not None:
+                results = results[:limit_count]
+
+            self.stats['reads'] += max(len(results), 1)
+            return [
+                DocumentSnapshot(
+                    DocumentReference(self, collection_name, doc_id), copy.deepcopy(data),
+                    self._update_times.get((collection_name, doc_id))
+                )
+                for doc_id, data in results
+            ]
@@ -0,0 +1,345 @@
+# SQLite Backend - Single-node document storage behind the Firestore client API
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from backends.document_store import (
+    DocumentStore, DocumentReference, DocumentSnapshot, apply_field, merge_fields
+)
+
+# Fields promoted to generated columns with a B-tree index in every collection table
+INDEXED_FIELDS = ['customer_id', 'status', 'created_at', 'role', 'department_id', 'is_active']
+
+DATETIME_TAG = '__datetime__'
+
+
+class SQLiteFirestore(DocumentStore):
+    """SQLite implementation of the Firestore client API used by the models.
+
+    Each collection is a table of JSON documents (``id``, ``data``,
+    ``update_time``). Frequently
+    filtered fields are exposed as generated columns with real indexes, so
+    ``where('customer_id', '==', ...)`` and friends are index lookups instead of
+    full scans. Other fields are still queryable through ``json_extract``.
+    The database runs in WAL mode so readers never block the writer.
+    """
+
+    def __init__(self, path='office_supplies.db', latency_ms=0.0):
+        super().__init__(latency_ms)
+        self.path = path
+        self._local = threading.local()
+        self._tables = set()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall():
+            self._tables.add(row[0])
+            # Databases created before write preconditions lack the update time column
+            columns = {column[1] for column in conn.execute(f'PRAGMA table_info("{row[0]}")')}
+            if 'update_time' not in columns:
+                conn.execute(f'ALTER TABLE "{row[0]}" ADD COLUMN update_time TEXT')
+
+    def load(self, collection_name, doc_id, data):
+        """Insert a document directly, without counting it (for seeding and imports)"""
+        table = self._ensure_table(collection_name)
+        self._conn().execute(
+            f'INSERT INTO "{table}" (id, data, update_time) VALUES (?, ?, ?) '
+            f'ON CONFLICT(id) DO UPDATE SET data = excluded.data, update_time = excluded.update_time',
+            (doc_id, encode_document(merge_fields(None, data)), _format_datetime(self._next_update_time()))
+        )
+
+    def count(self, collection_name):
+        """Number of documents in a collection (not counted as an RPC)"""
+        table = self._ensure_table(collection_name)
+        return self._conn().execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---- Connection and schema ----
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=OFF')
+            self._local.conn = conn
+        return conn
+
+    def _ensure_table(self, collection_name):
+        table = table_name(collection_name)
+        if table in self._tables:
+            return table
+
+        with self._lock:
+            if table in self._tables:
+                return table
+            conn = self._conn()
+            columns = ',\n'.join(
+                f'    "{field}" GENERATED ALWAYS AS ({_generated_expression(field)}) VIRTUAL'
+                for field in INDEXED_FIELDS
+            )
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{table}" (\n'
+                f'    id TEXT PRIMARY KEY,\n'
+                f'    data TEXT NOT NULL,\n'
+                f'    update_time TEXT,\n'
+                f'{columns}\n'
+                f')'
+            )
+            for field in INDEXED_FIELDS:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{field}" ON "{table}" ("{field}")')
+            self._tables.add(table)
+        return table
+
+    # ---- Storage primitives ----
+
+    def _read(self, collection_name, doc_id):
+        table = self._ensure_table(collection_name)
+        row = self._conn().execute(
+            f'SELECT data, update_time FROM "{table}" WHERE id = ?', (doc_id,)
+        ).fetchone()
+        self._count('reads')
+        ref = DocumentReference(self, collection_name, doc_id)
+        if not row:
+            return DocumentSnapshot(ref, None)
+        return DocumentSnapshot(ref, decode_document(row[0]), _parse_datetime(row[1]))
+
+    def _write(self, collection_name, doc_id, data, merge=False):
+        with self._transaction() as conn:
+            return self._write_in(conn, collection_name, doc_id, data, merge)
+
+    def _update(self, collection_name, doc_id, data):
+        with self._transaction() as conn:
+            return self._update_in(conn, collection_name, doc_id, data)
+
+    def _delete(self, collection_name, doc_id):
+        table = self._ensure_table(collection_name)
+        self._conn().execute(f'DELETE FROM "{table}" WHERE id = ?', (doc_id,))
+        self._count('writes')
+
+    def _stored_update_time(self, collection_name, doc_id):
+        return self._stored_update_time_in(self._conn(), collection_name, doc_id)
+
+    def _commit(self, operations, reads=()):
+        with self._transaction() as conn:
+            # Checked inside BEGIN IMMEDIATE, so no other writer can slip in before the writes
+            self._check_preconditions(
+                operations, lambda ref: self._stored_update_time_in(conn, ref._collection, ref.id), reads
+            )
+            update_times = []
+            for action, ref, data, merge, option in operations:
+                if action == 'set':
+                    update_times.append(self._write_in(conn, ref._collection, ref.id, data, merge))
+                elif action == 'update':
+                    update_times.append(self._update_in(conn, ref._collection, ref.id, data))
+                else:
+                    table = self._ensure_table(ref._collection)
+                    conn.execute(f'DELETE FROM "{table}" WHERE id = ?', (ref.id,))
+                    self._count('writes')
+                    update_times.append(self._next_update_time())
+            return update_times
+
+    def _query(self, collection_name, filters, orders, limit_count, offset_count):
+        table = self._ensure_table(collection_name)
+        clauses = []
+        params = []
+
+        for field, op, value in filters:
+            clause, clause_params = _filter_sql(field, op, value)
+            clauses.append(clause)
+            params.extend(clause_params)
+
+        order_terms = []
+        for field, direction in orders:
+            expression = _field_expression(field)
+            clauses.append(f'{expression} IS NOT NULL')
+            order_terms.append(f"{expression} {'DESC' if direction == 'DESCENDING' else 'ASC'}")
+        order_terms.append('id ASC')
+
+        sql = f'SELECT id, data, update_time FROM "{table}"'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY ' + ', '.join(order_terms)
+        if limit_count is not None or offset_count:
+            sql += ' LIMIT ? OFFSET ?'
+            params.extend([limit_count if limit_count is not None else -1, offset_count or 0])
+
+        rows = self._conn().execute(sql, params).fetchall()
+        self._count('reads', max(len(rows), 1))
+        return [
+            DocumentSnapshot(
+                DocumentReference(self, collection_name, doc_id), decode_document(data),
+                _parse_datetime(update_time)
+            )
+            for doc_id, data, update_time in rows
+        ]
+
+    # ---- Helpers ----
+
+    def _transaction(self):
+        return _Transaction(self._conn(), self._lock)
+
+    def _write_in(self, conn, collection_name, doc_id, data, merge):
+        table = self._ensure_table(collection_name)
+        existing = None
+        if merge:
+            row = conn.execute(f'SELECT data FROM "{table}" WHERE id = ?', (doc_id,)).fetchone()
+            existing = decode_document(row[0]) if row else None
+        update_time = self._next_update_time()
+        conn.execute(
+            f'INSERT INTO "{table}" (id, data, update_time) VALUES (?, ?, ?) '
+            f'ON CONFLICT(id) DO UPDATE SET data = excluded.data, update_time = excluded.update_time',
+            (doc_id, encode_document(merge_fields(existing, data, merge=merge)), _format_datetime(update_time))
+        )
+        self._count('writes')
+        return update_time
+
+    def _update_in(self, conn, collection_name, doc_id, data):
+        table = self._ensure_table(collection_name)
+        row = conn.execute(f'SELECT data FROM "{table}" WHERE id = ?', (doc_id,)).fetchone()
+        if not row:
+            raise KeyError(f"No document to update: {collection_name}/{doc_id}")
+        document = decode_document(row[0])
+        for key, value in data.items():
+            apply_field(document, key.split('.'), value)
+        update_time = self._next_update_time()
+        conn.execute(
+            f'UPDATE "{table}" SET data = ?, update_time = ? WHERE id = ?',
+            (encode_document(document), _format_datetime(update_time), doc_id)
+        )
+        self._count('writes')
+        return update_time
+
+    def _stored_update_time_in(self, conn, collection_name, doc_id):
+        table = self._ensure_table(collection_name)
+        row = conn.execute(f'SELECT update_time FROM "{table}" WHERE id = ?', (doc_id,)).fetchone()
+        return _parse_datetime(row[0]) if row else None
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on error"""
+
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.lock.release()
+        return False
+
+
+# ---- Encoding ----
+
+def table_name(collection_name):
+    """Safe table name for a collection"""
+    return re.sub(r'[^A-Za-z0-9_]', '_', collection_name)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {DATETIME_TAG: _format_datetime(value)}
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"Cannot store value of type {type(value).__name__}")
+
+
+def _decode_object(obj):
+    if len(obj) == 1 and DATETIME_TAG in obj:
+        return datetime.fromisoformat(obj[DATETIME_TAG])
+    return obj
+
+
+def _format_datetime(value):
+    # Fixed-width ISO strings sort chronologically, so created_at can be range-indexed
+    return value.isoformat(timespec='microseconds')
+
+
+def _parse_datetime(text):
+    return datetime.fromisoformat(text) if text else None
+
+
+def encode_document(data):
+    return json.dumps(data, default=_encode_value, separators=(',', ':'))
+
+
+def decode_document(text):
+    return json.loads(text, object_hook=_decode_object)
+
+
+def _json_path(field_path):
+    return '$' + ''.join(f'."{part}"' for part in field_path.split('.'))
+
+
+def _generated_expression(field):
+    if field == 'created_at':
+        return f"json_extract(data, '{_json_path(field)}.\"{DATETIME_TAG}\"')"
+    return f"json_extract(data, '{_json_path(field)}')"
+
+
+def _field_expression(field, value=None):
+    """SQL expression for a field - the indexed column when there is one"""
+    if field in INDEXED_FIELDS:
+        return f'"{field}"'
+    if isinstance(value, datetime):
+        return f"json_extract(data, '{_json_path(field)}.\"{DATETIME_TAG}\"')"
+    return f"json_extract(data, '{_json_path(field)}')"
+
+
+def _sql_value(value):
+    if isinstance(value, datetime):
+        return _format_datetime(value)
+    if isinstance(value, bool):
+        return 1 if value else 0
+    return value
+
+
+def _filter_sql(field, op, value):
+    """Translate a Firestore filter into a SQL clause and parameters"""
+    if op in ('in', 'not-in', 'array_contains_any'):
+        values = list(value)
+        sample = values[0] if values else None
+        placeholders = ', '.join('?' for _ in values) or 'NULL'
+        params = [_sql_value(v) for v in values]
+        if op == 'array_contains_any':
+            return (f"EXISTS (SELECT 1 FROM json_each(data, '{_json_path(field)}') "
+                    f"WHERE json_each.value IN ({placeholders}))"), params
+        expression = _field_expression(field, sample)
+        if op == 'in':
+            return f'{expression} IN ({placeholders})', params
+        return f'{expression} IS NOT NULL AND {expression} NOT IN ({placeholders})', params
+
+    if op == 'array_contains':
+        return (f"EXISTS (SELECT 1 FROM json_each(data, '{_json_path(field)}') "
+                f"WHERE json_each.value = ?)"), [_sql_value(value)]
+
+    expression = _field_expression(field, value)
+    if value is None:
+        if op == '==':
+            return f'{expression} IS NULL', []
+        if op == '!=':
+            return f'{expression} IS NOT NULL', []
+
+    sql_ops = {'==': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+    if op not in sql_ops:
+        raise ValueError(f"Unsupported query operator: {op}")
+    return f'{expression} {sql_ops[op]} ?', [_sql_value(value)]
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Backfill the monthly GST summary
+Recomputes the HSN-wise and rate-wise totals in gst_monthly_summary from the
+dispatched orders. New dispatches keep the summary current on their own; run
+this once after deploying, or for a month whose orders were corrected.
+Safe to re-run: the recomputed documents replace the existing ones.
+
+Usage:
+    python backfill_gst_summary.py                   # all months
+    python backfill_gst_summary.py --month 2024-03   # one month
+"""
+
+import argparse
+
+from config import config
+from models import GSTSummary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Backfill the monthly GST summary from dispatched orders')
+    parser.add_argument('--month', help='Only rebuild this month (YYYY-MM)')
+    args = parser.parse_args()
+
+    config.init_app(None)
+    count = GSTSummary.rebuild(month=args.month)
+    if count is None:
+        print("❌ GST summary backfill failed")
+    else:
+        print(f"Wrote {count} summary rows for {args.month or 'all months'}")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+One-time backfill of product snapshots on order items
+Orders created before snapshots were captured only store product_id, quantity,
+price and total per item. This job copies the current product details onto every
+item that has no snapshot yet, so order reads never need the products collection.
+Safe to re-run: items that already have a snapshot are left untouched.
+
+Usage:
+    python backfill_order_snapshots.py            # write changes
+    python backfill_order_snapshots.py --dry-run  # only report
+"""
+
+import argparse
+
+from config import config
+from models import Product
+
+# Firestore allows at most 500 writes per batch
+BATCH_SIZE = 400
+
+
+def backfill_order_snapshots(db=None, dry_run=False):
+    """Add product snapshots to order items that lack one; returns a stats dict"""
+    db = db or config.get_db()
+    stats = {'orders_scanned': 0, 'orders_updated': 0, 'items_updated': 0, 'missing_products': 0}
+
+    pending = []
+    for doc in db.collection('orders').stream():
+        stats['orders_scanned'] += 1
+        items = doc.to_dict().get('items') or []
+        if any('product_snapshot' not in item for item in items):
+            pending.append((doc.reference, items))
+
+    # Read each referenced product once
+    product_ids = sorted({
+        item['product_id'] for _, items in pending for item in items
+        if 'product_snapshot' not in item and item.get('product_id')
+    })
+    snapshots = {}
+    for start in range(0, len(product_ids), BATCH_SIZE):
+        refs = [db.collection('products').document(pid) for pid in product_ids[start:start + BATCH_SIZE]]
+        for product_doc in db.get_all(refs):
+            if product_doc.exists:
+                snapshots[product_doc.id] = Product.from_dict(product_doc.to_dict()).snapshot()
+
+    batch = db.batch()
+    batch_count = 0
+    for order_ref, items in pending:
+        updated = 0
+        for item in items:
+            if 'product_snapshot' in item:
+                continue
+            snapshot = snapshots.get(item.get('product_id'))
+            if snapshot is None:
+                stats['missing_products'] += 1
+                continue
+            item['product_snapshot'] = snapshot
+            updated += 1
+
+        if not updated:
+            continue
+        stats['orders_updated'] += 1
+        stats['items_updated'] += updated
+
+        if not dry_run:
+            batch.update(order_ref, {'items': items})
+            batch_count += 1
+            if batch_count >= BATCH_SIZE:
+                batch.commit()
+                batch = db.batch()
+                batch_count = 0
+
+    if batch_count:
+        batch.commit()
+
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Backfill product snapshots on order items')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+    args = parser.parse_args()
+
+    config.init_app(None)
+    result = backfill_order_snapshots(dry_run=args.dry_run)
+    print(f"Scanned {result['orders_scanned']} orders")
+    print(f"{'Would update' if args.dry_run else 'Updated'} {result['items_updated']} items "
+          f"in {result['orders_updated']} orders")
+    if result['missing_products']:
+        print(f"⚠️  {result['missing_products']} items reference products that no longer exist")
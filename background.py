@@ -0,0 +1,42 @@
+# Background Worker - Run queued calls on a daemon thread after the request has returned
+import queue
+import threading
+
+
+class BackgroundWorker:
+    """Single daemon thread that runs queued calls in order.
+
+    The thread is started on first use. Exceptions are printed and do not stop
+    the worker; wait() blocks until every queued call has run.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def enqueue(self, func, *args):
+        """Queue a call to ``func(*args)``"""
+        self.start()
+        self.jobs.put((func, args))
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+                self.thread.start()
+
+    def wait(self):
+        """Block until all queued calls have run"""
+        self.jobs.join()
+
+    def run(self):
+        while True:
+            func, args = self.jobs.get()
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"{self.name} error in {getattr(func, '__name__', func)}: {e}")
+            finally:
+                self.jobs.task_done()
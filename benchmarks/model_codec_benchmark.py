@@ -0,0 +1,156 @@
+# Model Codec Benchmark - Per-object memory and (de)serialization speed of the models
+#
+# Compares the schema-driven models (__slots__ plus generated from_document /
+# to_document) with the previous representation: a __dict__ instance built by
+# running __init__ and then setattr() for every stored key, and serialized by
+# copying __dict__. Documents come from the synthetic benchmark dataset.
+#
+# Usage:
+#   python -m benchmarks.model_codec_benchmark
+#   python -m benchmarks.model_codec_benchmark --scale large --repeat 7
+import argparse
+import contextlib
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.run_benchmarks import _NullWriter
+
+COLLECTIONS = [
+    ('products', 'Product'),
+    ('orders', 'Order'),
+    ('users', 'User'),
+    ('customers', 'Customer'),
+    ('locations', 'Location'),
+]
+
+
+class LegacyModel:
+    """The pre-schema BaseModel: __dict__ instances, setattr decoding"""
+
+    def to_dict(self):
+        result = {}
+        for key, value in self.__dict__.items():
+            result[key] = value
+        return result
+
+    @classmethod
+    def from_dict(cls, data):
+        instance = cls()
+        for key, value in data.items():
+            setattr(instance, key, value)
+        if not hasattr(instance, 'is_deleted'):
+            instance.is_deleted = False
+        if not hasattr(instance, 'deleted_at'):
+            instance.deleted_at = None
+        if not hasattr(instance, 'deleted_by'):
+            instance.deleted_by = None
+        return instance
+
+
+def legacy_class(model):
+    """A LegacyModel twin of ``model`` whose __init__ assigns every field, like the old models did"""
+    env = {'defaults': {}}
+    lines = ['def __init__(self):']
+    for field, default in model._schema.items():
+        if callable(default):
+            env['defaults'][field] = default
+            lines.append(f"    self.{field} = defaults[{field!r}]()")
+        else:
+            lines.append(f"    self.{field} = {default!r}")
+    if hasattr(model, 'PINCODE_STATES'):
+        # Each old Location built its own copy of the zone table
+        env['PINCODE_STATES'] = model.PINCODE_STATES
+        lines.append('    self.pincode_states = {zone: list(states) for zone, states in PINCODE_STATES.items()}')
+    exec('\n'.join(lines), env)
+    return type(f'Legacy{model.__name__}', (LegacyModel,), {'__init__': env['__init__']})
+
+
+def measure_memory(decode, documents):
+    """Bytes allocated per decoded object (documents themselves excluded)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [decode(document) for document in documents]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / len(documents)
+
+
+def best_time(func, documents, repeat):
+    """Best-of-``repeat`` microseconds per document"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for document in documents:
+            func(document)
+        best = min(best, time.perf_counter() - start)
+    return best / len(documents) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare model memory and codec speed against the legacy representation')
+    parser.add_argument('--scale', choices=['small', 'medium', 'large'], default='medium')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-docs', type=int, default=2000, help='Replicate documents up to this many per model')
+    args = parser.parse_args(argv)
+
+    os.environ['DB_BACKEND'] = 'memory'
+    os.environ['MEMORY_DB_LATENCY_MS'] = '0'
+
+    with contextlib.redirect_stdout(_NullWriter()):
+        import models
+        from backends.memory_backend import MemoryFirestore
+        from benchmarks.seed_data import SCALES, generate_dataset
+
+        db = MemoryFirestore()
+        generate_dataset(db, **SCALES[args.scale])
+
+    print(f"Model codec benchmark on the '{args.scale}' dataset (best of {args.repeat})")
+    header = (f"{'Model':<10}{'Docs':>7}{'Bytes/obj':>12}{'Legacy':>10}{'Decode us':>12}{'Legacy':>10}"
+              f"{'Encode us':>12}{'Legacy':>10}")
+    print()
+    print(header)
+    print('-' * len(header))
+
+    for collection_name, model_name in COLLECTIONS:
+        model = getattr(models, model_name)
+        legacy = legacy_class(model)
+
+        documents = [data for _, data in sorted(db._docs(collection_name).items())]
+        if not documents:
+            continue
+        while len(documents) < args.min_docs:
+            documents = documents + documents
+        documents = documents[:max(args.min_docs, len(documents))]
+
+        # Documents as the old models stored them, so both sides decode the same keys
+        instances = [model.from_dict(document) for document in documents]
+        legacy_instances = [legacy.from_dict(document) for document in documents]
+        for instance, legacy_instance in zip(instances[:50], legacy_instances[:50]):
+            assert instance.to_document() == {
+                key: value for key, value in legacy_instance.to_dict().items() if key in model._schema
+            }, f'{model_name} codec mismatch'
+
+        memory = measure_memory(model.from_dict, documents)
+        legacy_memory = measure_memory(legacy.from_dict, documents)
+        decode = best_time(model.from_dict, documents, args.repeat)
+        legacy_decode = best_time(legacy.from_dict, documents, args.repeat)
+        encode = best_time(model.to_document, instances, args.repeat)
+        legacy_encode = best_time(legacy.to_dict, legacy_instances, args.repeat)
+
+        print(f"{model_name:<10}{len(documents):>7}{memory:>12.0f}{legacy_memory:>10.0f}{decode:>12.2f}"
+              f"{legacy_decode:>10.2f}{encode:>12.2f}{legacy_encode:>10.2f}")
+
+    print()
+    print('Bytes/obj is memory retained per decoded model; Decode/Encode are microseconds per document.')
+    print(f"Generated at {datetime.now().isoformat(timespec='seconds')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+# Endpoint Benchmarks - Measure API latency and database round-trips offline
+#
+# Runs the Flask app against a local database backend (in-memory by default, or
+# SQLite with --backend sqlite), seeds it with synthetic data and times the main
+# API endpoints.
+#
+# Usage:
+#   python -m benchmarks.run_benchmarks
+#   python -m benchmarks.run_benchmarks --scale medium --latency-ms 2 --rounds 10
+#   python -m benchmarks.run_benchmarks --backend sqlite
+#   python -m benchmarks.run_benchmarks --save baseline.json
+#   python -m benchmarks.run_benchmarks --compare baseline.json
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+
+class _NullWriter(io.TextIOBase):
+    """Swallow the application's debug prints while timing"""
+
+    def write(self, text):
+        return len(text)
+
+
+class Scenario:
+    """A single benchmarked request"""
+
+    def __init__(self, name, actor, path, method='GET', payload=None, group=None):
+        self.name = name
+        self.actor = actor
+        self.path = path
+        self.method = method
+        self.payload = payload
+        self.group = group or name.split('[')[0]
+
+
+def build_scenarios(dataset):
+    """Scenarios covering orders, products, customers, dashboards and order creation"""
+    order_products = [p for p in dataset.products if p.quantity >= 1000][:5]
+    large_order_products = [p for p in dataset.products if p.quantity >= 1][:50]
+
+    def order_payload(products=order_products):
+        return {
+            'items': [{'product_id': p.product_id, 'quantity': 1} for p in products],
+            'comments': 'Benchmark order'
+        }
+
+    return [
+        Scenario('orders[vendor]', 'vendor', '/api/orders'),
+        Scenario('orders[hr_admin]', 'customer_hr_admin', '/api/orders'),
+        Scenario('orders[dept_head]', 'customer_dept_head', '/api/orders'),
+        Scenario('orders[employee]', 'customer_employee', '/api/orders'),
+        Scenario('pending_approvals[dept_head]', 'customer_dept_head', '/api/orders/pending-approvals'),
+        Scenario('pending_approvals[hr_admin]', 'customer_hr_admin', '/api/orders/pending-approvals'),
+        Scenario('products[vendor]', 'vendor', '/api/products'),
+        Scenario('products[employee]', 'customer_employee', '/api/products'),
+        Scenario('low_stock[vendor]', 'vendor', '/api/products/low-stock'),
+        Scenario('pick_list[vendor]', 'vendor', '/api/warehouse/pick-list'),
+        Scenario('dispatch_waves[vendor]', 'vendor', '/api/warehouse/dispatch-waves'),
+        Scenario('customers[vendor]', 'vendor', '/api/customers'),
+        Scenario('departments[hr_admin]', 'customer_hr_admin', '/api/departments'),
+        Scenario('branches_dropdown[vendor]', 'vendor', '/api/branches-dropdown'),
+        Scenario('pricing_summary_report[vendor]', 'vendor', '/api/pricing-summary-report'),
+        Scenario('pricing_analytics[vendor]', 'vendor',
+                 f'/api/pricing-analytics/{dataset.sample_customer().customer_id}?refresh=1'),
+        Scenario('pricing_suggestions[vendor]', 'vendor',
+                 f'/api/pricing-suggestions/{dataset.sample_customer().customer_id}'),
+        Scenario('pricing_comparison[vendor]', 'vendor',
+                 f'/api/pricing-comparison/{dataset.products[0].product_id}?limit=20'),
+        Scenario('sales_revenue[vendor]', 'vendor', '/api/vendor/analytics/revenue'),
+        Scenario('sales_category_mix[vendor]', 'vendor', '/api/vendor/analytics/category-mix'),
+        Scenario('sales_department_spend[vendor]', 'vendor', '/api/vendor/analytics/department-spend'),
+        Scenario('gst_summary[vendor]', 'vendor', '/api/vendor/reports/gst-summary'),
+        Scenario('dashboard[vendor]', 'vendor', '/api/dashboard/vendor'),
+        Scenario('dashboard[hr_admin]', 'customer_hr_admin', '/api/dashboard/customer'),
+        Scenario('dashboard[employee]', 'customer_employee', '/api/dashboard/employee'),
+        Scenario('create_order[employee]', 'customer_employee', '/api/orders', method='POST',
+                 payload=order_payload),
+        Scenario('create_order_large[employee]', 'customer_employee', '/api/orders', method='POST',
+                 payload=lambda: order_payload(large_order_products)),
+    ]
+
+
+def login_client(app, user):
+    """Create a test client with an authenticated session for ``user``"""
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.user_id
+        sess['username'] = user.username
+        sess['role'] = user.role
+        sess['login_time'] = datetime.now().isoformat()
+    return client
+
+
+def run_scenario(client, db, scenario, rounds, warmup):
+    """Time ``rounds`` calls and collect per-call round-trip counts"""
+    timings = []
+    rpcs = []
+    reads = []
+    writes = []
+    failures = 0
+
+    for i in range(warmup + rounds):
+        payload = scenario.payload() if callable(scenario.payload) else scenario.payload
+        before = db.snapshot_stats()
+        with contextlib.redirect_stdout(_NullWriter()):
+            start = time.perf_counter()
+            if scenario.method == 'POST':
+                response = client.post(scenario.path, json=payload)
+            else:
+                response = client.get(scenario.path)
+            elapsed = time.perf_counter() - start
+        after = db.snapshot_stats()
+
+        body = response.get_json(silent=True) or {}
+        if response.status_code != 200 or body.get('success') is False:
+            failures += 1
+
+        if i < warmup:
+            continue
+        timings.append(elapsed * 1000)
+        rpcs.append(after['rpcs'] - before['rpcs'])
+        reads.append(after['reads'] - before['reads'])
+        writes.append(after['writes'] - before['writes'])
+
+    timings.sort()
+    p95_index = min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))
+    return {
+        'rounds': rounds,
+        'min_ms': timings[0],
+        'mean_ms': statistics.mean(timings),
+        'median_ms': statistics.median(timings),
+        'p95_ms': timings[p95_index],
+        'max_ms': timings[-1],
+        'rpcs_per_call': statistics.mean(rpcs),
+        'reads_per_call': statistics.mean(reads),
+        'writes_per_call': statistics.mean(writes),
+        'failures': failures
+    }
+
+
+def print_report(results, baseline=None, threshold=0.25):
+    """Print a pytest-benchmark style table; returns the list of regressions"""
+    header = f"{'Name':<32}{'Min':>10}{'Mean':>10}{'Median':>10}{'P95':>10}{'RPCs':>8}{'Reads':>9}{'Writes':>8}{'Fail':>6}"
+    print()
+    print(header)
+    print('-' * len(header))
+
+    regressions = []
+    for name, r in results.items():
+        line = (f"{name:<32}{r['min_ms']:>10.2f}{r['mean_ms']:>10.2f}{r['median_ms']:>10.2f}"
+                f"{r['p95_ms']:>10.2f}{r['rpcs_per_call']:>8.1f}{r['reads_per_call']:>9.1f}"
+                f"{r['writes_per_call']:>8.1f}{r['failures']:>6}")
+
+        if baseline and name in baseline:
+            base = baseline[name]
+            notes = []
+            if r['rpcs_per_call'] > base['rpcs_per_call']:
+                notes.append(f"RPCs {base['rpcs_per_call']:.1f} -> {r['rpcs_per_call']:.1f}")
+            if base['median_ms'] > 0 and r['median_ms'] > base['median_ms'] * (1 + threshold):
+                notes.append(f"median {base['median_ms']:.2f} -> {r['median_ms']:.2f}ms")
+            if notes:
+                regressions.append((name, notes))
+                line += '  REGRESSION: ' + ', '.join(notes)
+        print(line)
+
+    print()
+    print('Times in milliseconds; RPCs/Reads/Writes are database round-trips and documents per call.')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark API endpoints against a local database backend')
+    parser.add_argument('--backend', choices=['memory', 'sqlite'], default='memory')
+    parser.add_argument('--scale', choices=['small', 'medium', 'large'], default='small')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Simulated latency per database RPC')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--filter', default='', help='Only run scenarios whose name contains this text')
+    parser.add_argument('--save', help='Write results to a JSON file')
+    parser.add_argument('--compare', help='Compare against results saved with --save')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed median slowdown before flagging')
+    args = parser.parse_args(argv)
+
+    # Must be set before the app module creates the Flask app
+    os.environ['DB_BACKEND'] = args.backend
+    os.environ['MEMORY_DB_LATENCY_MS'] = '0'
+    if args.backend == 'sqlite':
+        os.environ['SQLITE_DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='bench_'), 'bench.db')
+
+    with contextlib.redirect_stdout(_NullWriter()):
+        from app import app
+        from config import config
+        from benchmarks.seed_data import SCALES, generate_dataset
+
+        db = config.get_db()
+        dataset = generate_dataset(db, **SCALES[args.scale])
+
+    print(f"Seeded '{args.scale}' dataset on {args.backend} backend: {dataset.summary()}")
+    print(f"Simulated latency: {args.latency_ms}ms per RPC, {args.rounds} rounds (+{args.warmup} warmup)")
+
+    actors = {
+        'vendor': dataset.vendor_admin,
+        'customer_hr_admin': dataset.sample_user('customer_hr_admin'),
+        'customer_dept_head': dataset.sample_user('customer_dept_head'),
+        'customer_employee': dataset.sample_user('customer_employee'),
+    }
+    clients = {key: login_client(app, user) for key, user in actors.items()}
+
+    db.latency_ms = args.latency_ms
+    results = {}
+    for scenario in build_scenarios(dataset):
+        if args.filter and args.filter not in scenario.name:
+            continue
+        results[scenario.name] = run_scenario(clients[scenario.actor], db, scenario, args.rounds, args.warmup)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)['results']
+
+    regressions = print_report(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'backend': args.backend,
+                'scale': args.scale,
+                'latency_ms': args.latency_ms,
+                'created_at': datetime.now().isoformat(),
+                'results': results
+            }, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    if regressions:
+        print(f"{len(regressions)} scenario(s) regressed")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,315 @@
+# Synthetic Data Generator - Populate a database with realistic test data
+import random
+from datetime import datetime, timedelta
+
+from models import Customer, Branch, Department, User, Location, Product, Order
+
+# Dataset sizes used by the benchmark suite
+SCALES = {
+    'small': {
+        'customers': 5, 'users_per_customer': 12, 'departments_per_customer': 3,
+        'locations': 4, 'products': 100, 'pricing_per_customer': 15, 'orders_per_customer': 20
+    },
+    'medium': {
+        'customers': 20, 'users_per_customer': 25, 'departments_per_customer': 5,
+        'locations': 8, 'products': 500, 'pricing_per_customer': 50, 'orders_per_customer': 60
+    },
+    'large': {
+        'customers': 60, 'users_per_customer': 40, 'departments_per_customer': 8,
+        'locations': 12, 'products': 2000, 'pricing_per_customer': 150, 'orders_per_customer': 150
+    }
+}
+
+CATEGORIES = [
+    'Office Stationery', 'Computer Accessories', 'Furniture', 'Office Equipment',
+    'Printing Supplies', 'Storage & Organization', 'Cleaning Supplies', 'Safety Equipment'
+]
+
+MAKES = ['Classmate', 'Camlin', 'HP', 'Logitech', 'Godrej', 'Canon', 'Kores', '3M', 'Faber-Castell']
+
+# Branch pincodes per delivery zone (first digit of the pincode)
+ZONE_PINCODES = {
+    '1': ['110001', '122001', '160017'],
+    '2': ['201301', '226001', '248001'],
+    '3': ['380009', '302001', '395003'],
+    '4': ['400001', '411001', '452001'],
+    '5': ['500081', '560001', '530016'],
+    '6': ['600028', '682016', '641018'],
+    '7': ['700091', '781006', '751024'],
+    '8': ['800001', '834001', '826001']
+}
+
+ORDER_STATUSES = [
+    ('pending_dept_approval', 0.15), ('pending_hr_approval', 0.10), ('approved', 0.15),
+    ('packed', 0.08), ('ready_for_dispatch', 0.07), ('dispatched', 0.35),
+    ('rejected', 0.05), ('cancelled', 0.05)
+]
+
+DEFAULT_PASSWORD = 'password123'
+
+
+class SyntheticDataset:
+    """Handles to the generated records, grouped for benchmark scenarios"""
+
+    def __init__(self):
+        self.vendor_admin = None
+        self.customers = []
+        self.locations = []
+        self.products = []
+        # customer_id -> {'hr_admin': User, 'dept_heads': [User], 'employees': [User]}
+        self.customer_users = {}
+        self.orders = []
+
+    def sample_customer(self):
+        return self.customers[0]
+
+    def sample_user(self, role):
+        users = self.customer_users[self.sample_customer().customer_id]
+        if role == 'customer_hr_admin':
+            return users['hr_admin']
+        if role == 'customer_dept_head':
+            return users['dept_heads'][0]
+        return users['employees'][0]
+
+    def summary(self):
+        user_count = 1 + sum(
+            1 + len(u['dept_heads']) + len(u['employees']) for u in self.customer_users.values()
+        )
+        return {
+            'customers': len(self.customers),
+            'users': user_count,
+            'locations': len(self.locations),
+            'products': len(self.products),
+            'orders': len(self.orders)
+        }
+
+
+def generate_dataset(db, customers=10, users_per_customer=20, departments_per_customer=4,
+                     locations=8, products=300, pricing_per_customer=30, orders_per_customer=50,
+                     seed=42):
+    """Populate ``db`` with a synthetic organisation graph and return a SyntheticDataset.
+
+    Documents are written with the same shape the models produce via ``to_dict()``.
+    When ``db`` is a MemoryFirestore the writes bypass simulated latency and counters.
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    dataset = SyntheticDataset()
+    put = _writer(db)
+
+    # Vendor admin
+    vendor = User(
+        username='bench_vendor_admin',
+        email='vendor.admin@officesupplies.com',
+        password_hash=User.hash_password(DEFAULT_PASSWORD),
+        role='vendor_admin'
+    )
+    vendor.full_name = 'Benchmark Vendor Admin'
+    vendor.is_first_login = False
+    put('users', vendor.user_id, vendor.to_dict())
+    dataset.vendor_admin = vendor
+
+    # Warehouse locations, each serving a few delivery zones
+    zones = sorted(ZONE_PINCODES.keys())
+    for i in range(locations):
+        location = Location()
+        location.location_id = f"LOC{i:03d}"
+        location.name = f"Warehouse {i + 1}"
+        home_zone = zones[i % len(zones)]
+        location.pincode = ZONE_PINCODES[home_zone][0]
+        location.address = f"Plot {i + 10}, Industrial Area"
+        served_zones = {home_zone, zones[(i + 1) % len(zones)]}
+        location.serviceable_states = [
+            state for zone in sorted(served_zones) for state in location.pincode_states[zone]
+        ]
+        location.serviceable_pincodes = location.generate_pincodes_from_states(location.serviceable_states)
+        put('locations', location.location_id, location.to_dict())
+        dataset.locations.append(location)
+
+    # Product catalog
+    for i in range(products):
+        product = Product()
+        product.product_id = f"PRD{i:05d}"
+        product.item_no = f"ITM{i:05d}"
+        product.category = rng.choice(CATEGORIES)
+        product.product_make = rng.choice(MAKES)
+        product.product_model = f"M-{rng.randint(100, 999)}"
+        product.product_name = f"{product.product_make} {product.category} Item {i}"
+        product.description = f"Synthetic product {i} for benchmarking"
+        product.price = round(rng.uniform(10, 5000), 2)
+        product.quantity = rng.choice([rng.randint(0, 12), rng.randint(50, 100000)])
+        product.gst_rate = rng.choice([5.0, 12.0, 18.0, 28.0])
+        product.hsn_code = str(rng.randint(4800, 9999))
+        product.image_urls = [f"/uploads/products/{product.product_id}_main.jpg"]
+        if dataset.locations:
+            stocked_at = rng.sample(dataset.locations, k=min(len(dataset.locations), rng.randint(1, 3)))
+            product.location_ids = [loc.location_id for loc in stocked_at]
+        product.created_at = now - timedelta(days=rng.randint(30, 365))
+        product.updated_at = product.created_at
+        put('products', product.product_id, product.to_dict())
+        dataset.products.append(product)
+
+    # Customers with branches, departments, users, pricing and orders
+    for c in range(customers):
+        customer = Customer()
+        customer.customer_id = str(10000 + c)
+        customer.company_name = f"Benchmark Corp {c + 1}"
+        customer.email = f"hr@corp{c + 1}.example.com"
+        customer.postal_address = f"{c + 1} Corporate Park"
+        customer.primary_phone = f"+91-98{c:08d}"
+        customer.hr_admin_created = True
+        customer.created_at = now - timedelta(days=rng.randint(90, 720))
+        put('customers', customer.customer_id, customer.to_dict())
+        dataset.customers.append(customer)
+
+        zone = zones[c % len(zones)]
+        branches = []
+        for b in range(2):
+            branch = Branch()
+            branch.branch_id = f"BR{customer.customer_id}{b}"
+            branch.customer_id = customer.customer_id
+            branch.name = f"Branch {b + 1}"
+            branch.address = f"{b + 1} Main Road"
+            branch.pincode = ZONE_PINCODES[zone][b % len(ZONE_PINCODES[zone])]
+            put('branches', branch.branch_id, branch.to_dict())
+            branches.append(branch)
+
+        departments = []
+        for d in range(departments_per_customer):
+            department = Department()
+            department.department_id = f"DEP{customer.customer_id}{d:02d}"
+            department.customer_id = customer.customer_id
+            department.name = f"Department {d + 1}"
+            department.branch_id = branches[d % len(branches)].branch_id
+            departments.append(department)
+
+        users = {'hr_admin': None, 'dept_heads': [], 'employees': []}
+
+        hr_admin = _make_user(customer, 'customer_hr_admin', 'hr', branches[0], None)
+        users['hr_admin'] = hr_admin
+        put('users', hr_admin.user_id, hr_admin.to_dict())
+
+        for d, department in enumerate(departments):
+            head = _make_user(customer, 'customer_dept_head', f"head{d}", branches[d % len(branches)], department)
+            department.department_head_id = head.user_id
+            users['dept_heads'].append(head)
+            put('users', head.user_id, head.to_dict())
+            put('departments', department.department_id, department.to_dict())
+
+        employee_count = max(users_per_customer - 1 - len(departments), 1)
+        for e in range(employee_count):
+            department = departments[e % len(departments)] if departments else None
+            branch = branches[e % len(branches)]
+            employee = _make_user(customer, 'customer_employee', f"emp{e}", branch, department)
+            users['employees'].append(employee)
+            put('users', employee.user_id, employee.to_dict())
+
+        dataset.customer_users[customer.customer_id] = users
+
+        # Customer-specific pricing
+        priced = rng.sample(dataset.products, k=min(pricing_per_customer, len(dataset.products)))
+        for product in priced:
+            created = now - timedelta(days=rng.randint(1, 180))
+            put('customer_pricing', f"{customer.customer_id}_{product.product_id}", {
+                'customer_id': customer.customer_id,
+                'product_id': product.product_id,
+                'custom_price': round(product.price * rng.uniform(0.8, 0.98), 2),
+                'created_by': vendor.user_id,
+                'created_at': created,
+                'updated_at': created
+            })
+
+        # Orders across the whole workflow
+        requesters = users['employees'] + users['dept_heads']
+        for o in range(orders_per_customer):
+            requester = rng.choice(requesters)
+            order = _make_order(rng, now, customer, requester, vendor, dataset.products, o)
+            put('orders', order.order_id, order.to_dict())
+            dataset.orders.append(order)
+
+    return dataset
+
+
+def _writer(db):
+    """Return a put(collection, doc_id, data) function for the database"""
+    if hasattr(db, 'load'):
+        return db.load
+
+    def put(collection_name, doc_id, data):
+        db.collection(collection_name).document(doc_id).set(data)
+    return put
+
+
+def _make_user(customer, role, suffix, branch, department):
+    user = User(
+        username=f"{customer.customer_id}_{suffix}",
+        email=f"{suffix}@corp{customer.customer_id}.example.com",
+        password_hash=User.hash_password(DEFAULT_PASSWORD),
+        role=role
+    )
+    user.user_id = f"USR{customer.customer_id}{suffix}"
+    user.customer_id = customer.customer_id
+    user.first_name = suffix.capitalize()
+    user.last_name = f"Corp{customer.customer_id}"
+    user.full_name = f"{user.first_name} {user.last_name}"
+    user.branch_id = branch.branch_id if branch else None
+    user.department_id = department.department_id if department else None
+    user.is_first_login = False
+    return user
+
+
+def _pick_status(rng):
+    roll = rng.random()
+    cumulative = 0
+    for status, weight in ORDER_STATUSES:
+        cumulative += weight
+        if roll <= cumulative:
+            return status
+    return ORDER_STATUSES[-1][0]
+
+
+def _make_order(rng, now, customer, requester, vendor, products, index):
+    order = Order()
+    order.order_id = f"ORD{customer.customer_id}{index:06d}"
+    order.customer_id = customer.customer_id
+    order.user_id = requester.user_id
+    order.department_id = requester.department_id
+    order.status = _pick_status(rng)
+    order.created_at = now - timedelta(days=rng.randint(0, 120), minutes=rng.randint(0, 1440))
+    order.updated_at = order.created_at
+
+    subtotal = 0
+    total_gst = 0
+    for product in rng.sample(products, k=min(len(products), rng.randint(1, 8))):
+        quantity = rng.randint(1, 20)
+        item_total = quantity * product.price
+        order.items.append({
+            'product_id': product.product_id,
+            'quantity': quantity,
+            'price': product.price,
+            'total': item_total,
+            'product_snapshot': product.snapshot()
+        })
+        subtotal += item_total
+        total_gst += item_total * product.gst_rate / 100
+    order.total_gst = total_gst
+    order.total_amount = subtotal + total_gst
+
+    order.comments.append({
+        'user_id': requester.user_id,
+        'role': requester.role,
+        'action': 'order_created',
+        'message': 'Synthetic order',
+        'timestamp': order.created_at
+    })
+
+    if order.status in ['packed', 'ready_for_dispatch', 'dispatched']:
+        order.packed_items = {item['product_id']: True for item in order.items}
+    if order.status in ['ready_for_dispatch', 'dispatched']:
+        order.dispatch_approved_by = vendor.user_id
+    if order.status == 'dispatched':
+        order.dispatched_by = vendor.user_id
+        order.dispatch_date = order.created_at + timedelta(days=rng.randint(1, 7))
+        order.updated_at = order.dispatch_date
+
+    return order
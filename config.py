@@ -4,6 +4,8 @@ import firebase_admin
 from firebase_admin import credentials, firestore, storage
 import json
 import uuid
+import hashlib
+import tempfile
 from werkzeug.utils import secure_filename
 
 class Config:
@@ -17,6 +19,10 @@ class Config:
         self.initialized = False
         self.use_local_storage = True  # Set to False to use Firebase Storage
         self.upload_folder = 'uploads'
+        # Database backend: 'firestore' (default), 'sqlite' for single-node installs,
+        # or 'memory' for offline benchmarks
+        self.db_backend = os.environ.get('DB_BACKEND', 'firestore').lower()
+        self.sqlite_path = os.environ.get('SQLITE_DB_PATH', 'office_supplies.db')
     
     def init_app(self, app):
         """Initialize Firebase with Flask app"""
@@ -27,6 +33,11 @@ class Config:
             if self.use_local_storage:
                 self.setup_local_storage()
             
+            # Local database backends (no Firebase credentials needed)
+            if self.db_backend in ('memory', 'sqlite'):
+                self.init_local_db()
+                return
+            
             # Get Firebase configuration from environment or config file
             firebase_config = self.get_firebase_config()
             
@@ -77,6 +88,23 @@ class Config:
             print(f"Firebase initialization error: {e}")
             raise e
     
+    def init_local_db(self):
+        """Initialize a local database backend in place of Firestore"""
+        if self.db_backend == 'sqlite':
+            from backends.sqlite_backend import SQLiteFirestore
+            
+            self.db = SQLiteFirestore(self.sqlite_path)
+            print(f"SQLite database initialized at {self.sqlite_path} (WAL mode)")
+        else:
+            from backends.memory_backend import MemoryFirestore
+            
+            latency_ms = float(os.environ.get('MEMORY_DB_LATENCY_MS', 0))
+            self.db = MemoryFirestore(latency_ms=latency_ms)
+            print(f"In-memory database initialized (simulated latency: {latency_ms}ms per RPC)")
+        
+        self.initialized = True
+        self.setup_initial_data()
+    
     def get_firebase_config(self):
         """Get Firebase configuration from environment or file"""
         try:
@@ -129,6 +157,7 @@ class Config:
             directories = [
                 'uploads/agreements',
                 'uploads/products', 
+                'uploads/products/variants',
                 'uploads/avatars',
                 'uploads/temp'
             ]
@@ -336,11 +365,41 @@ class Config:
         except Exception as e:
             print(f"Firebase cleanup error: {e}")
 
+# Uploads are copied in fixed-size chunks instead of being read into memory
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+def copy_stream_atomic(file_stream, full_path, temp_dir=None):
+    """Copy a stream to full_path in chunks via a temp file + rename; returns the SHA-256 hex digest"""
+    directory = os.path.dirname(full_path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    temp_dir = temp_dir or directory
+    os.makedirs(temp_dir, exist_ok=True)
+    
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=temp_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if hasattr(file_stream, 'seek'):
+                file_stream.seek(0)
+            for chunk in iter(lambda: file_stream.read(UPLOAD_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, full_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    
+    return digest.hexdigest()
+
 class LocalStorage:
     """Local file storage handler"""
     
     def __init__(self, base_path='uploads'):
         self.base_path = base_path
+        self.temp_path = os.path.join(base_path, 'temp')
     
     def blob(self, file_path):
         """Create a blob-like object for local storage"""
@@ -349,15 +408,8 @@ class LocalStorage:
     def upload_from_file(self, file_stream, path, content_type=None):
         """Upload file to local storage"""
         try:
-            # Ensure directory exists
-            full_dir = os.path.join(self.base_path, os.path.dirname(path))
-            os.makedirs(full_dir, exist_ok=True)
-            
-            # Save file
             full_path = os.path.join(self.base_path, path)
-            with open(full_path, 'wb') as f:
-                file_stream.seek(0)
-                f.write(file_stream.read())
+            copy_stream_atomic(file_stream, full_path, self.temp_path)
             
             return f"/{path}"
             
@@ -365,6 +417,75 @@ class LocalStorage:
             print(f"Error uploading file locally: {e}")
             raise e
     
+    def upload_content_addressed(self, file_stream, folder, extension):
+        """Store a file under a sharded content-hash path, de-duplicating identical content.
+        
+        The stream is hashed while it is copied to a temp file. If the content is
+        already stored, the temp file is discarded and the reference count is
+        incremented; otherwise the temp file is renamed into place.
+        Returns the URL, e.g. /uploads/agreements/3f/a2/3fa2...c1.pdf
+        """
+        try:
+            os.makedirs(self.temp_path, exist_ok=True)
+            staging_path = os.path.join(self.temp_path, f"{uuid.uuid4().hex}.upload")
+            content_hash = copy_stream_atomic(file_stream, staging_path, self.temp_path)
+            
+            extension = (extension or 'bin').lower().lstrip('.')
+            relative_path = f"{folder.strip('/')}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.{extension}"
+            full_path = os.path.join(self.base_path, relative_path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            
+            if os.path.exists(full_path):
+                os.remove(staging_path)
+            else:
+                os.replace(staging_path, full_path)
+            
+            self.add_reference(relative_path, content_hash, os.path.getsize(full_path))
+            return f"/{self.base_path}/{relative_path}"
+            
+        except Exception as e:
+            print(f"Error storing content-addressed file: {e}")
+            raise e
+    
+    def add_reference(self, relative_path, content_hash, size):
+        """Increment the reference count of a stored file"""
+        db = config.get_db()
+        db.collection('file_refs').document(self._ref_id(relative_path)).set({
+            'path': relative_path,
+            'sha256': content_hash,
+            'size': size,
+            'ref_count': firestore.Increment(1),
+            'updated_at': firestore.SERVER_TIMESTAMP
+        }, merge=True)
+    
+    def release(self, file_url):
+        """Drop one reference to an uploaded file and delete it when unreferenced"""
+        try:
+            prefix = f"/{self.base_path}/"
+            if not file_url or not file_url.startswith(prefix):
+                return False
+            
+            relative_path = file_url[len(prefix):]
+            full_path = os.path.join(self.base_path, relative_path)
+            
+            db = config.get_db()
+            ref = db.collection('file_refs').document(self._ref_id(relative_path))
+            if not _drop_file_reference(db.transaction(), ref):
+                return True
+            
+            # Last reference (or a legacy upload without reference tracking)
+            if os.path.exists(full_path):
+                os.remove(full_path)
+            return True
+            
+        except Exception as e:
+            print(f"Error releasing file {file_url}: {e}")
+            return False
+    
+    @staticmethod
+    def _ref_id(relative_path):
+        return relative_path.replace('/', '__')
+    
     def list_blobs(self, max_results=None):
         """List files in local storage"""
         try:
@@ -381,6 +502,23 @@ class LocalStorage:
             print(f"Error listing local files: {e}")
             return []
 
+@firestore.transactional
+def _drop_file_reference(transaction, ref):
+    """Decrement a file's reference count; True if no reference is left.
+    
+    Read and write happen in one transaction, so two concurrent releases of a
+    file shared by two records cannot both see a count of 2 and keep it.
+    """
+    doc = ref.get(transaction=transaction)
+    if not doc.exists:
+        return True
+    
+    if (doc.to_dict().get('ref_count') or 0) > 1:
+        transaction.update(ref, {'ref_count': firestore.Increment(-1)})
+        return False
+    transaction.delete(ref)
+    return True
+
 class LocalBlob:
     """Local blob object that mimics Firebase Storage blob"""
     
@@ -392,13 +530,7 @@ class LocalBlob:
     def upload_from_file(self, file_stream, content_type=None):
         """Upload file stream to local storage"""
         try:
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(self.full_path), exist_ok=True)
-            
-            # Save file
-            with open(self.full_path, 'wb') as f:
-                file_stream.seek(0)
-                f.write(file_stream.read())
+            copy_stream_atomic(file_stream, self.full_path, os.path.join(self.base_path, 'temp'))
             
         except Exception as e:
             print(f"Error uploading blob locally: {e}")
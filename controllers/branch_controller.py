@@ -212,6 +212,9 @@ class BranchController:
                 db = config.get_db()
                 db.collection('branches').document(branch_id).delete()
                 
+                from models import BranchDirectory
+                BranchDirectory.invalidate()
+                
                 return {
                     'success': True,
                     'message': f'Branch deleted successfully. {len(users_in_branch)} users and {len(departments_in_branch)} departments have been unassigned.'
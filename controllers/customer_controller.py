@@ -237,6 +237,8 @@ class CustomerController:
                 else:
                     return {'success': False, 'message': 'Customer created but HR user creation failed'}
             else:
+                if customer.agreement_file_url and config.use_local_storage:
+                    self.cleanup_old_file(customer.agreement_file_url)
                 return {'success': False, 'message': 'Failed to create customer'}
                 
         except Exception as e:
@@ -275,39 +277,36 @@ class CustomerController:
                     else:
                         setattr(customer, field, data[field])
             
-            # Handle agreement file upload
+            # Handle agreement file upload; files are released only once the save has succeeded
+            new_file_url = None
+            replaced_file_url = None
             if 'agreement_file' in request.files:
                 file = request.files['agreement_file']
                 if file and file.filename:
                     # Upload new file
-                    agreement_url = self.upload_agreement_file(file, customer.customer_id)
-                    if agreement_url:
-                        # Store old file URL for cleanup if needed
-                        old_file_url = customer.agreement_file_url
-                        customer.agreement_file_url = agreement_url
-                        
-                        # TODO: Clean up old file if using local storage
-                        # if old_file_url and config.use_local_storage:
-                        #     self.cleanup_old_file(old_file_url)
-                    else:
+                    new_file_url = self.upload_agreement_file(file, customer.customer_id)
+                    if not new_file_url:
                         return {'success': False, 'message': 'Failed to upload agreement file'}
+                    replaced_file_url = customer.agreement_file_url
+                    customer.agreement_file_url = new_file_url
             
-            # Handle file removal
-            if data.get('remove_current_file') == 'true':
-                # Store old file URL for cleanup if needed
-                old_file_url = customer.agreement_file_url
+            # Handle file removal (a new upload already replaces the current file)
+            if data.get('remove_current_file') == 'true' and not new_file_url:
+                replaced_file_url = customer.agreement_file_url
                 customer.agreement_file_url = None
-                
-                # TODO: Clean up old file if using local storage
-                # if old_file_url and config.use_local_storage:
-                #     self.cleanup_old_file(old_file_url)
             
             if customer.save():
+                # Drop our reference to the previous file (deleted once unreferenced)
+                if replaced_file_url and config.use_local_storage:
+                    self.cleanup_old_file(replaced_file_url)
                 return {
                     'success': True,
                     'message': 'Customer updated successfully'
                 }
             else:
+                # The customer still points at its previous file; drop the unused upload
+                if new_file_url and config.use_local_storage:
+                    self.cleanup_old_file(new_file_url)
                 return {'success': False, 'message': 'Failed to update customer'}
                 
         except Exception as e:
@@ -528,37 +527,21 @@ class CustomerController:
                 print("File is empty")
                 return None
             
-            # Generate unique filename with timestamp
-            import time
-            timestamp = int(time.time())
-            filename = f"agreement_{customer_id}_{timestamp}_{uuid.uuid4().hex[:8]}.{file_extension}"
-            
-            print(f"Uploading file: {filename}, Size: {file_size} bytes")
-            
             # Get storage handler
             storage_handler = config.get_storage()
             
             if config.use_local_storage:
-                # Local storage
-                file_path = f"agreements/{filename}"
-                full_path = os.path.join('uploads', file_path)
-                
-                # Ensure directory exists
-                os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                print(f"Saving to: {full_path}")
-                
-                # Save file
-                file.save(full_path)
-                
-                # Verify file was saved
-                if os.path.exists(full_path):
-                    saved_size = os.path.getsize(full_path)
-                    print(f"File saved successfully: {saved_size} bytes")
-                    return f"/uploads/{file_path}"
-                else:
-                    print("File was not saved")
-                    return None
+                # Local storage - content-addressed, so re-uploads of the same document are stored once
+                print(f"Uploading agreement for customer {customer_id}, Size: {file_size} bytes")
+                file_url = storage_handler.upload_content_addressed(file.stream, 'agreements', file_extension)
+                print(f"File saved successfully: {file_url}")
+                return file_url
             else:
+                # Generate unique filename with timestamp
+                import time
+                timestamp = int(time.time())
+                filename = f"agreement_{customer_id}_{timestamp}_{uuid.uuid4().hex[:8]}.{file_extension}"
+                
                 # Firebase Storage
                 try:
                     blob = storage_handler.blob(f"agreements/{filename}")
@@ -583,15 +566,11 @@ class CustomerController:
             if not file_url or not file_url.startswith('/uploads/'):
                 return
             
-            # Convert URL to local file path
-            file_path = file_url[1:]  # Remove leading '/'
-            full_path = os.path.join(file_path)
-            
-            if os.path.exists(full_path):
-                os.remove(full_path)
-                print(f"Cleaned up old file: {full_path}")
+            # Shared content is reference counted - only the last release deletes the file
+            if config.get_storage().release(file_url):
+                print(f"Released old file: {file_url}")
             else:
-                print(f"Old file not found for cleanup: {full_path}")
+                print(f"Old file not found for cleanup: {file_url}")
                 
         except Exception as e:
             print(f"Error cleaning up old file: {e}")
@@ -1,6 +1,6 @@
 # Department Controller - Handle department management operations
 from flask import request, session
-from models import Department, User
+from models import Department, User, DepartmentRoster
 from controllers.auth_controller import auth_controller
 from config import config
 
@@ -24,6 +24,9 @@ class DepartmentController:
             branches = Branch.get_by_customer_id(current_user.customer_id)
             branch_map = {branch.branch_id: branch for branch in branches}
             
+            # Active users grouped by department (one users query, memoized per customer)
+            roster = DepartmentRoster.get(current_user.customer_id)
+            
             dept_list = []
             for dept in departments:
                 dept_dict = dept.to_dict()
@@ -39,18 +42,8 @@ class DepartmentController:
                     dept_dict['branch_address'] = None
                     dept_dict['branch_id'] = None
                 
-                # Add user information
-                users = User.get_by_department_id(dept.department_id)
-                dept_dict['users'] = [
-                    {
-                        'user_id': u.user_id,
-                        'username': u.username,
-                        'full_name': u.full_name,
-                        'email': u.email,
-                        'role': u.role,
-                        'is_active': u.is_active
-                    } for u in users if u.is_active
-                ]
+                # Add user information from the customer's roster
+                dept_dict['users'] = roster.get(dept.department_id, [])
                 
                 dept_dict['user_count'] = len(dept_dict['users'])
                 dept_dict['active_users'] = len([u for u in dept_dict['users'] if u['is_active']])
@@ -238,24 +231,30 @@ class DepartmentController:
             return {'success': False, 'message': 'Failed to update department'}
     
     def update_user_assignments(self, department_id, assigned_user_ids, customer_id):
-        """Update user assignments for a department"""
+        """Update user assignments for a department, writing only users whose department changes"""
         try:
-            # Get all users in the customer organization
-            all_users = User.get_by_customer_id(customer_id)
-            
-            for user in all_users:
-                # Only update employees and department heads
-                if user.role in ['customer_employee', 'customer_dept_head']:
-                    if user.user_id in assigned_user_ids:
-                        # Assign user to this department
-                        user.department_id = department_id
-                    elif user.department_id == department_id:
-                        # Remove user from this department
-                        user.department_id = None
-                    
-                    user.save()
-            
-            return True
+            assigned_user_ids = set(assigned_user_ids or [])
+            changes = {}
+            
+            # Current members that are no longer assigned leave the department
+            for user in User.get_by_department_id(department_id):
+                if user.user_id in assigned_user_ids:
+                    assigned_user_ids.discard(user.user_id)
+                elif user.customer_id == customer_id and user.role in ['customer_employee', 'customer_dept_head']:
+                    changes[user.user_id] = None
+            
+            # Newly assigned employees and department heads join it (one batched read)
+            if assigned_user_ids:
+                db = config.get_db()
+                refs = [db.collection('users').document(user_id) for user_id in sorted(assigned_user_ids)]
+                for doc in db.get_all(refs):
+                    if not doc.exists:
+                        continue
+                    user_data = doc.to_dict()
+                    if user_data.get('customer_id') == customer_id and user_data.get('role') in ['customer_employee', 'customer_dept_head']:
+                        changes[doc.id] = department_id
+            
+            return User.set_departments(customer_id, changes)
             
         except Exception as e:
             print(f"Update user assignments error: {e}")
@@ -287,20 +286,17 @@ class DepartmentController:
                 return {'success': False, 'message': 'User must have Department Head role'}
             
             # Remove current department head from this department
-            current_users = User.get_by_department_id(department_id)
-            for user in current_users:
-                if user.role == 'customer_dept_head':
-                    user.department_id = None
-                    user.save()
+            changes = {
+                user.user_id: None for user in User.get_by_department_id(department_id)
+                if user.role == 'customer_dept_head' and user.user_id != new_head.user_id
+            }
             
-            # Remove new head from any other department
-            if new_head.department_id and new_head.department_id != department_id:
-                new_head.department_id = None
-                new_head.save()
+            # Move the new head here (from any other department)
+            if new_head.department_id != department_id:
+                changes[new_head.user_id] = department_id
             
-            # Assign new head to this department
-            new_head.department_id = department_id
-            new_head.save()
+            if not User.set_departments(current_user.customer_id, changes):
+                return {'success': False, 'message': 'Failed to assign department head'}
             
             return {
                 'success': True,
@@ -335,6 +331,7 @@ class DepartmentController:
                 from config import config
                 db = config.get_db()
                 db.collection('departments').document(department_id).delete()
+                DepartmentRoster.invalidate(current_user.customer_id)
                 
                 return {
                     'success': True,
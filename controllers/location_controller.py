@@ -11,16 +11,7 @@ class LocationController:
         self.auth = auth_controller
         
         # Indian states grouped by pincode zones
-        self.pincode_states = {
-            '1': ['Delhi NCR', 'Haryana', 'Himachal Pradesh', 'Punjab', 'UT/Chandigarh', 'UT/Jammu and Kashmir', 'UT/Ladakh'],
-            '2': ['Uttarakhand', 'Uttar Pradesh'],
-            '3': ['Gujarat', 'Rajasthan', 'UT/Dadra, Nagar Haveli, Daman & Diu'],
-            '4': ['Chhattisgarh', 'Goa', 'Madhya Pradesh', 'Maharashtra'],
-            '5': ['Andhra Pradesh', 'Karnataka', 'Telangana'],
-            '6': ['Kerala', 'Tamil Nadu', 'UT/Puducherry', 'UT/Lakshadweep'],
-            '7': ['Arunachal Pradesh', 'Assam', 'Manipur', 'Meghalaya', 'Mizoram', 'Nagaland', 'Odisha', 'Sikkim', 'Tripura', 'West Bengal', 'UT/Andaman and Nicobar Islands'],
-            '8': ['Bihar', 'Jharkhand']
-        }
+        self.pincode_states = Location.PINCODE_STATES
     
     def get_locations(self):
         """Get locations list (Vendor users only)"""
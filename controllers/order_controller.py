@@ -1,13 +1,21 @@
 # Order Controller - Handle order management and workflow with customer pricing
 from flask import request, session
 from datetime import datetime
-from models import Order, Product, User, Customer, Department, Branch
+from models import Order, Product, User, Customer, Department, Branch, ApprovalQueue, VendorSettings
 from controllers.auth_controller import auth_controller
 from config import config
+from image_variants import get_image_url
+from notifications import notification_worker
 
 class OrderController:
     """Handle order management operations and approval workflow with customer pricing"""
     
+    # Most orders accepted by one bulk approval or batch warehouse request
+    BULK_APPROVAL_LIMIT = 500
+    
+    # Result for an order another request changed between our read and write
+    CONFLICT_MESSAGE = 'Order was changed by another request; reload and try again'
+    
     def __init__(self):
         self.auth = auth_controller
     
@@ -64,20 +72,8 @@ class OrderController:
                 # Add product details for items with pricing information
                 order_dict['items_with_details'] = []
                 for item in order.items:
-                    product = Product.get_by_id(item['product_id'])
-                    if product:
-                        item_detail = item.copy()
-                        item_detail['product_name'] = product.product_name
-                        item_detail['product_make'] = product.product_make
-                        item_detail['category'] = product.category
-                        
-                        # Add pricing information
-                        item_detail['base_price'] = product.price
-                        item_detail['used_price'] = item['price']
-                        item_detail['is_custom_price'] = item['price'] != product.price
-                        item_detail['savings_per_unit'] = product.price - item['price'] if item['price'] != product.price else 0
-                        item_detail['total_savings'] = item_detail['savings_per_unit'] * item['quantity']
-                        
+                    item_detail = self.get_item_details(item, 'thumb')
+                    if item_detail:
                         order_dict['items_with_details'].append(item_detail)
                 
                 # Calculate total savings for the order
@@ -334,27 +330,8 @@ class OrderController:
             # Add detailed product information with pricing details and images
             order_dict['items_with_details'] = []
             for item in order.items:
-                product = Product.get_by_id(item['product_id'])
-                if product:
-                    item_detail = item.copy()
-                    item_detail['product_name'] = product.product_name
-                    item_detail['product_make'] = product.product_make
-                    item_detail['product_model'] = product.product_model
-                    item_detail['category'] = product.category
-                    item_detail['hsn_code'] = product.hsn_code
-                    item_detail['gst_rate'] = product.gst_rate
-                    
-                    # Add product images
-                    item_detail['image_urls'] = getattr(product, 'image_urls', [])
-                    item_detail['primary_image'] = item_detail['image_urls'][0] if item_detail['image_urls'] else None
-                    
-                    # Add pricing information
-                    item_detail['base_price'] = product.price
-                    item_detail['used_price'] = item['price']
-                    item_detail['is_custom_price'] = item['price'] != product.price
-                    item_detail['savings_per_unit'] = product.price - item['price'] if item['price'] != product.price else 0
-                    item_detail['total_savings'] = item_detail['savings_per_unit'] * item['quantity']
-                    
+                item_detail = self.get_item_details(item, 'card')
+                if item_detail:
                     order_dict['items_with_details'].append(item_detail)
             
             # Calculate total savings for the order
@@ -437,24 +414,8 @@ class OrderController:
                 # Add product details for items with pricing information and images
                 order_dict['items_with_details'] = []
                 for item in order.items:
-                    product = Product.get_by_id(item['product_id'])
-                    if product:
-                        item_detail = item.copy()
-                        item_detail['product_name'] = product.product_name
-                        item_detail['product_make'] = product.product_make
-                        item_detail['category'] = product.category
-                        
-                        # Add product images
-                        item_detail['image_urls'] = getattr(product, 'image_urls', [])
-                        item_detail['primary_image'] = item_detail['image_urls'][0] if item_detail['image_urls'] else None
-                        
-                        # Add pricing information
-                        item_detail['base_price'] = product.price
-                        item_detail['used_price'] = item['price']
-                        item_detail['is_custom_price'] = item['price'] != product.price
-                        item_detail['savings_per_unit'] = product.price - item['price'] if item['price'] != product.price else 0
-                        item_detail['total_savings'] = item_detail['savings_per_unit'] * item['quantity']
-                        
+                    item_detail = self.get_item_details(item, 'thumb')
+                    if item_detail:
                         order_dict['items_with_details'].append(item_detail)
                 
                 # Calculate total savings for the order
@@ -542,20 +503,8 @@ class OrderController:
                 # Add product details for items with pricing information
                 order_dict['items_with_details'] = []
                 for item in order.items:
-                    product = Product.get_by_id(item['product_id'])
-                    if product:
-                        item_detail = item.copy()
-                        item_detail['product_name'] = product.product_name
-                        item_detail['product_make'] = product.product_make
-                        item_detail['category'] = product.category
-                        
-                        # Add pricing information
-                        item_detail['base_price'] = product.price
-                        item_detail['used_price'] = item['price']
-                        item_detail['is_custom_price'] = item['price'] != product.price
-                        item_detail['savings_per_unit'] = product.price - item['price'] if item['price'] != product.price else 0
-                        item_detail['total_savings'] = item_detail['savings_per_unit'] * item['quantity']
-                        
+                    item_detail = self.get_item_details(item, 'thumb')
+                    if item_detail:
                         order_dict['items_with_details'].append(item_detail)
                 
                 # Calculate total savings for the order
@@ -586,6 +535,37 @@ class OrderController:
             traceback.print_exc()
             return {'success': False, 'message': 'Failed to retrieve orders'}
         
+    def get_item_snapshot(self, item):
+        """Product snapshot stored on an order item (live product for orders not yet backfilled)"""
+        snapshot = item.get('product_snapshot')
+        if snapshot is None:
+            product = Product.get_by_id(item['product_id'])
+            snapshot = product.snapshot() if product else None
+        return snapshot
+    
+    def get_item_details(self, item, image_size='thumb'):
+        """Order item with product and pricing details taken from its snapshot"""
+        snapshot = self.get_item_snapshot(item)
+        if not snapshot:
+            return None
+        
+        item_detail = {key: value for key, value in item.items() if key != 'product_snapshot'}
+        for field in Product.SNAPSHOT_FIELDS:
+            item_detail[field] = snapshot.get(field)
+        
+        # Add product images
+        item_detail['image_urls'] = snapshot.get('image_urls', [])
+        item_detail['primary_image'] = get_image_url(snapshot, image_size)
+        
+        # Add pricing information
+        base_price = snapshot.get('base_price', item['price'])
+        item_detail['base_price'] = base_price
+        item_detail['used_price'] = item['price']
+        item_detail['is_custom_price'] = item['price'] != base_price
+        item_detail['savings_per_unit'] = base_price - item['price'] if item['price'] != base_price else 0
+        item_detail['total_savings'] = item_detail['savings_per_unit'] * item['quantity']
+        return item_detail
+    
     def get_order_pricing_summary(self, order):
         """Get pricing summary for an order showing base vs custom pricing"""
         try:
@@ -598,15 +578,16 @@ class OrderController:
             }
             
             for item in order.items:
-                product = Product.get_by_id(item['product_id'])
-                if product:
-                    base_total = product.price * item['quantity']
+                snapshot = self.get_item_snapshot(item)
+                if snapshot:
+                    base_price = snapshot.get('base_price', item['price'])
+                    base_total = base_price * item['quantity']
                     custom_total = item['price'] * item['quantity']
                     
                     summary['total_base_price'] += base_total
                     summary['total_custom_price'] += custom_total
                     
-                    if item['price'] != product.price:
+                    if item['price'] != base_price:
                         summary['items_with_custom_pricing'] += 1
             
             summary['total_savings'] = summary['total_base_price'] - summary['total_custom_price']
@@ -678,16 +659,25 @@ class OrderController:
                     f"Order created with comments: {data['comments']}"
                 )
             
-            # Process items and calculate totals
-            total_amount = 0
-            total_gst = 0
-            
-            for item_data in data['items']:
-                product_id = item_data.get('product_id')
+            # Products and customer prices of every line in one batched read each
+            db = config.get_db()
+            product_ids = [item_data.get('product_id') for item_data in data['items']]
+            unique_ids = list(dict.fromkeys(product_id for product_id in product_ids if product_id))
+            products = {}
+            custom_prices = {}
+            if unique_ids:
+                product_refs = [db.collection('products').document(product_id) for product_id in unique_ids]
+                products = {doc.id: Product.from_dict(doc.to_dict()) for doc in db.get_all(product_refs) if doc.exists}
+                pricing_ids = {f"{current_user.customer_id}_{product_id}": product_id for product_id in unique_ids}
+                pricing_refs = [db.collection('customer_pricing').document(doc_id) for doc_id in pricing_ids]
+                custom_prices = {pricing_ids[doc.id]: doc.to_dict().get('custom_price')
+                                 for doc in db.get_all(pricing_refs) if doc.exists}
+            
+            # Process items; add_item keeps the order totals up to date
+            for item_data, product_id in zip(data['items'], product_ids):
                 quantity = int(item_data.get('quantity', 1))
                 
-                # Get product details
-                product = Product.get_by_id(product_id)
+                product = products.get(product_id)
                 if not product:
                     return {'success': False, 'message': f'Product {product_id} not found'}
                 
@@ -697,26 +687,15 @@ class OrderController:
                 if product.quantity < quantity:
                     return {'success': False, 'message': f'Insufficient stock for {product.product_name}. Available: {product.quantity}'}
                 
-                # Get customer-specific price if available
-                custom_price = self.get_customer_pricing(product_id, current_user.customer_id)
+                # Customer-specific price if available
+                custom_price = custom_prices.get(product_id)
                 unit_price = custom_price if custom_price is not None else product.price
                 
                 if unit_price == 0:
                     return {'success': False, 'message': f'Price not available for {product.product_name}'}
                 
-                # Calculate item total
-                item_total = unit_price * quantity
-                item_gst = (item_total * product.gst_rate) / 100
-                
-                # Add item to order
-                order.add_item(product_id, quantity, unit_price)
-                
-                total_amount += item_total
-                total_gst += item_gst
-            
-            # Set order totals
-            order.total_amount = total_amount + total_gst
-            order.total_gst = total_gst
+                # Add item to order with the product details as they are now
+                order.add_item(product_id, quantity, unit_price, product.snapshot(), product.gst_rate)
             
             # Save order
             if order.save():
@@ -941,6 +920,220 @@ class OrderController:
             print(f"Process HR approval error: {e}")
             return {'success': False, 'message': 'Failed to process HR approval'}
     
+    def process_bulk_approval(self):
+        """Approve or reject several orders at once (department heads and HR admins)"""
+        try:
+            current_user = self.auth.get_current_user()
+            if not current_user or current_user.role not in ['customer_dept_head', 'customer_hr_admin']:
+                return {'success': False, 'message': 'Only approvers can process approvals'}
+            
+            data = request.get_json() or {}
+            order_ids = list(dict.fromkeys(data.get('order_ids') or []))
+            action = data.get('action', 'approve')
+            comments = data.get('comments', '')
+            
+            if not order_ids:
+                return {'success': False, 'message': 'No orders selected'}
+            if len(order_ids) > self.BULK_APPROVAL_LIMIT:
+                return {'success': False, 'message': f'At most {self.BULK_APPROVAL_LIMIT} orders can be processed at once'}
+            if action not in ['approve', 'reject']:
+                return {'success': False, 'message': 'Invalid action'}
+            if action == 'reject' and not comments:
+                return {'success': False, 'message': 'Comments are required when rejecting an order'}
+            
+            past_tense = {'approve': 'approved', 'reject': 'rejected'}[action]
+            is_dept_head = current_user.role == 'customer_dept_head'
+            expected_status = 'pending_dept_approval' if is_dept_head else 'pending_hr_approval'
+            approver = 'department head' if is_dept_head else 'HR admin'
+            
+            # Validate every order from one batched read
+            db = config.get_db()
+            refs = [db.collection('orders').document(order_id) for order_id in order_ids]
+            found = {doc.id: Order.from_snapshot(doc) for doc in db.get_all(refs) if doc.exists}
+            
+            results = {}
+            to_save = []
+            for order_id in order_ids:
+                order = found.get(order_id)
+                if not order:
+                    results[order_id] = {'success': False, 'message': 'Order not found'}
+                elif order.customer_id != current_user.customer_id:
+                    results[order_id] = {'success': False, 'message': 'Access denied'}
+                elif is_dept_head and order.department_id != current_user.department_id:
+                    results[order_id] = {'success': False, 'message': 'You can only approve orders from your department'}
+                elif order.status != expected_status:
+                    results[order_id] = {'success': False, 'message': f'Order is in {order.status} status and cannot be processed'}
+                else:
+                    if action == 'approve':
+                        order.status = 'pending_hr_approval' if is_dept_head else 'approved'
+                        note = f"Approved by {approver}. {comments}" if comments else f"Approved by {approver}"
+                        order.add_comment(current_user.user_id, current_user.role, 'approved', note)
+                    else:
+                        order.status = 'rejected'
+                        order.add_comment(current_user.user_id, current_user.role, 'rejected', f"Rejected by {approver}: {comments}")
+                    to_save.append(order)
+            
+            # Status changes, comments and approval queue moves in chunked batches
+            saved, conflicts = Order.save_many(to_save)
+            saved, conflicts = set(saved), set(conflicts)
+            for order in to_save:
+                if order.order_id in saved:
+                    results[order.order_id] = {'success': True, 'message': f'Order {past_tense}', 'new_status': order.status}
+                elif order.order_id in conflicts:
+                    results[order.order_id] = {'success': False, 'message': self.CONFLICT_MESSAGE}
+                else:
+                    results[order.order_id] = {'success': False, 'message': 'Failed to update order'}
+            
+            processed = [order for order in to_save if order.order_id in saved]
+            if processed:
+                # Summary emails go out after the response, like dispatch notifications
+                notification_worker.enqueue(self.send_bulk_notifications, processed, action, current_user)
+            
+            return {
+                'success': True,
+                'message': f"{len(processed)} of {len(order_ids)} orders {past_tense}",
+                'processed': len(processed),
+                'failed': len(order_ids) - len(processed),
+                'results': [{'order_id': order_id, **results[order_id]} for order_id in order_ids]
+            }
+            
+        except Exception as e:
+            print(f"Process bulk approval error: {e}")
+            return {'success': False, 'message': 'Failed to process bulk approval'}
+    
+    def send_bulk_notifications(self, orders, action, current_user):
+        """One summary email per recipient for a bulk approval"""
+        try:
+            if not orders:
+                return
+            
+            recipients = {}
+            if action == 'approve' and current_user.role == 'customer_dept_head':
+                # HR admins get the orders now waiting for them
+                for hr_admin in User.get_by_customer_and_roles(current_user.customer_id, ['customer_hr_admin']):
+                    recipients[hr_admin.email] = list(orders)
+                subject = f"{len(orders)} Orders Require HR Approval"
+            elif action == 'reject':
+                # Each requester gets their own rejected orders (one batched read)
+                db = config.get_db()
+                user_ids = sorted({order.user_id for order in orders if order.user_id})
+                refs = [db.collection('users').document(user_id) for user_id in user_ids]
+                emails = {doc.id: doc.to_dict().get('email') for doc in db.get_all(refs) if doc.exists} if refs else {}
+                for order in orders:
+                    if emails.get(order.user_id):
+                        recipients.setdefault(emails[order.user_id], []).append(order)
+                subject = "Orders Rejected"
+            else:
+                return
+            
+            for email, recipient_orders in recipients.items():
+                if email:
+                    self.send_summary_email(email, subject, recipient_orders)
+                    
+        except Exception as e:
+            print(f"Error sending bulk notifications: {e}")
+    
+    def send_summary_email(self, to_email, subject, orders):
+        """Send one notification email listing several orders"""
+        try:
+            settings = VendorSettings.get_settings()
+            rows = ''.join(
+                f"<tr><td>{order.order_id}</td><td>{order.status.replace('_', ' ').title()}</td>"
+                f"<td>{len(order.items)}</td><td>₹{order.total_amount:,.2f}</td></tr>"
+                for order in orders
+            )
+            html_body = f"""
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <style>
+                    body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }}
+                    .container {{ max-width: 600px; margin: 0 auto; background-color: white; padding: 40px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
+                    table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
+                    th, td {{ text-align: left; padding: 8px; border-bottom: 1px solid #e5e7eb; }}
+                    .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb; color: #6b7280; font-size: 14px; }}
+                </style>
+            </head>
+            <body>
+                <div class="container">
+                    <h2>{subject}</h2>
+                    <table>
+                        <tr><th>Order ID</th><th>Status</th><th>Items</th><th>Total Amount</th></tr>
+                        {rows}
+                    </table>
+                    <p>Please login to the system to view complete order details and take any required actions.</p>
+                    <div class="footer">
+                        <p>Best regards,<br>{settings.company_name} Team</p>
+                    </div>
+                </div>
+            </body>
+            </html>
+            """
+            
+            return self.auth.send_email_notification(to_email, subject, html_body, True)
+            
+        except Exception as e:
+            print(f"Error sending summary email: {e}")
+            return False
+    
+    def get_pending_approvals(self):
+        """Orders waiting for the current approver, read from the approval queues"""
+        try:
+            current_user = self.auth.get_current_user()
+            if not current_user or current_user.role not in ['customer_dept_head', 'customer_hr_admin']:
+                return {'success': False, 'message': 'Only approvers can view pending approvals'}
+            
+            if current_user.role == 'customer_dept_head':
+                stage = 'dept'
+                own_queue = ApprovalQueue.queue_id(current_user.customer_id, stage, current_user.department_id)
+            else:
+                stage = 'hr'
+                own_queue = ApprovalQueue.queue_id(current_user.customer_id, stage)
+            
+            # One query for the customer's queues gives the counts and the caller's order ids
+            counts = {'dept_approval': 0, 'hr_approval': 0}
+            order_ids = []
+            for queue in ApprovalQueue.get_queues(current_user.customer_id):
+                queue_order_ids = queue.get('order_ids') or []
+                queue_id = ApprovalQueue.queue_id(queue['customer_id'], queue['stage'], queue.get('department_id'))
+                if queue_id == own_queue:
+                    order_ids = queue_order_ids
+                if stage == 'hr' or queue_id == own_queue:
+                    counts[f"{queue['stage']}_approval"] += len(queue_order_ids)
+            
+            orders = []
+            if order_ids:
+                db = config.get_db()
+                refs = [db.collection('orders').document(order_id) for order_id in order_ids]
+                orders = [Order.from_dict(doc.to_dict()) for doc in db.get_all(refs) if doc.exists]
+            
+            # Queues may briefly lag a status change made elsewhere; only actionable orders are returned
+            orders = [o for o in orders if self.can_user_approve_order(current_user, o)
+                      and (stage == 'hr' or o.department_id == current_user.department_id)]
+            orders.sort(key=lambda o: o.created_at, reverse=True)
+            
+            order_list = []
+            for order in orders:
+                order_dict = order.to_dict()
+                order_dict['items_count'] = len(order.items)
+                order_dict['can_approve'] = True
+                order_dict['items_with_details'] = [
+                    detail for detail in (self.get_item_details(item, 'thumb') for item in order.items) if detail
+                ]
+                order_dict['total_savings'] = sum(item.get('total_savings', 0) for item in order_dict['items_with_details'])
+                order_list.append(order_dict)
+            
+            return {
+                'success': True,
+                'orders': order_list,
+                'count': len(order_list),
+                'counts': counts
+            }
+            
+        except Exception as e:
+            print(f"Get pending approvals error: {e}")
+            return {'success': False, 'message': 'Failed to retrieve pending approvals'}
+    
     def pack_order(self, order_id):
         """Mark order items as packed (Vendor users)"""
         try:
@@ -969,7 +1162,7 @@ class OrderController:
                     break
             
             if all_packed:
-                order.update_status('packed', current_user.user_id, 'All items packed and ready for dispatch approval')
+                order.update_status('packed', current_user.user_id, 'All items packed and ready for dispatch approval', save=False)
             else:
                 order.add_comment(current_user.user_id, current_user.role, 'packed_partial', 'Some items packed')
             
@@ -1005,14 +1198,16 @@ class OrderController:
             
             if action == 'approve':
                 order.dispatch_approved_by = current_user.user_id
-                order.update_status('ready_for_dispatch', current_user.user_id, f"Dispatch approved. {comments}")
+                if not order.update_status('ready_for_dispatch', current_user.user_id, f"Dispatch approved. {comments}"):
+                    return {'success': False, 'message': 'Order was modified by another user'}
                 
                 return {
                     'success': True,
                     'message': 'Dispatch approved, order ready for shipping'
                 }
             else:
-                order.update_status('approved', current_user.user_id, f"Dispatch approval rejected. {comments}")
+                if not order.update_status('approved', current_user.user_id, f"Dispatch approval rejected. {comments}"):
+                    return {'success': False, 'message': 'Order was modified by another user'}
                 
                 return {
                     'success': True,
@@ -1039,10 +1234,11 @@ class OrderController:
             
             order.dispatched_by = current_user.user_id
             order.dispatch_date = datetime.now()
-            order.update_status('dispatched', current_user.user_id, 'Order dispatched successfully')
+            if not order.update_status('dispatched', current_user.user_id, 'Order dispatched successfully'):
+                return {'success': False, 'message': 'Order was modified by another user'}
             
-            # Send notification to customer
-            self.send_order_notification(order, 'order_dispatched')
+            # Notify the customer in the background
+            notification_worker.enqueue(self.send_order_notification, order, 'order_dispatched')
             
             return {
                 'success': True,
@@ -1053,6 +1249,146 @@ class OrderController:
             print(f"Dispatch order error: {e}")
             return {'success': False, 'message': 'Failed to dispatch order'}
     
+    def batch_pack_orders(self):
+        """Mark every item of several approved orders as packed (Vendor users)"""
+        try:
+            current_user = self.auth.get_current_user()
+            if not current_user or not current_user.role.startswith('vendor_'):
+                return {'success': False, 'message': 'Only vendor users can pack orders'}
+            
+            def pack(order):
+                order.packed_items = {str(i): True for i in range(len(order.items))}
+                order.update_status('packed', current_user.user_id, 'All items packed and ready for dispatch approval', save=False)
+            
+            return self.process_batch_transition('approved', 'packed', pack, 'packed')[0]
+            
+        except Exception as e:
+            print(f"Batch pack orders error: {e}")
+            return {'success': False, 'message': 'Failed to pack orders'}
+    
+    def batch_approve_dispatch(self):
+        """Approve (or send back for re-packing) several packed orders (Vendor admin/superadmin only)"""
+        try:
+            current_user = self.auth.get_current_user()
+            if not current_user or current_user.role not in ['vendor_superadmin', 'vendor_admin']:
+                return {'success': False, 'message': 'Only vendor admins can approve dispatch'}
+            
+            data = request.get_json() or {}
+            comments = data.get('comments', '')
+            
+            if data.get('action', 'approve') == 'approve':
+                def approve(order):
+                    order.dispatch_approved_by = current_user.user_id
+                    order.update_status('ready_for_dispatch', current_user.user_id, f"Dispatch approved. {comments}", save=False)
+                
+                return self.process_batch_transition('packed', 'ready_for_dispatch', approve, 'approved for dispatch')[0]
+            
+            def send_back(order):
+                order.update_status('approved', current_user.user_id, f"Dispatch approval rejected. {comments}", save=False)
+            
+            return self.process_batch_transition('packed', 'approved', send_back, 'sent back for re-packing')[0]
+            
+        except Exception as e:
+            print(f"Batch approve dispatch error: {e}")
+            return {'success': False, 'message': 'Failed to approve dispatch'}
+    
+    def batch_dispatch_orders(self):
+        """Mark several ready orders as dispatched (Vendor users)"""
+        try:
+            current_user = self.auth.get_current_user()
+            if not current_user or not current_user.role.startswith('vendor_'):
+                return {'success': False, 'message': 'Only vendor users can dispatch orders'}
+            
+            dispatch_date = datetime.now()
+            
+            def dispatch(order):
+                order.dispatched_by = current_user.user_id
+                order.dispatch_date = dispatch_date
+                order.update_status('dispatched', current_user.user_id, 'Order dispatched successfully', save=False)
+            
+            result, dispatched = self.process_batch_transition('ready_for_dispatch', 'dispatched', dispatch, 'dispatched')
+            
+            # Notify the customers in the background
+            if dispatched:
+                notification_worker.enqueue(self.send_dispatch_notifications, dispatched)
+            return result
+            
+        except Exception as e:
+            print(f"Batch dispatch orders error: {e}")
+            return {'success': False, 'message': 'Failed to dispatch orders'}
+    
+    def process_batch_transition(self, from_status, to_status, apply, done_label):
+        """Move the requested orders from one status to the next; returns (response, orders written).
+        
+        Orders are read with one get_all and written in chunked batches. Orders
+        already in the target status are reported as done without being written
+        again. Each write is conditional on the order being unchanged since it was
+        read, so when two requests race for an order only the first transitions
+        it (and fires its side effects); the other reports a conflict.
+        """
+        data = request.get_json() or {}
+        order_ids = list(dict.fromkeys(data.get('order_ids') or []))
+        if not order_ids:
+            return {'success': False, 'message': 'No orders selected'}, []
+        if len(order_ids) > self.BULK_APPROVAL_LIMIT:
+            return {'success': False, 'message': f'At most {self.BULK_APPROVAL_LIMIT} orders can be processed at once'}, []
+        
+        db = config.get_db()
+        refs = [db.collection('orders').document(order_id) for order_id in order_ids]
+        found = {doc.id: Order.from_snapshot(doc) for doc in db.get_all(refs) if doc.exists}
+        
+        results = {}
+        to_save = []
+        for order_id in order_ids:
+            order = found.get(order_id)
+            if not order:
+                results[order_id] = {'success': False, 'message': 'Order not found'}
+            elif order.status == to_status:
+                results[order_id] = {'success': True, 'message': f'Order already {done_label}', 'new_status': order.status}
+            elif order.status != from_status:
+                results[order_id] = {'success': False, 'message': f'Order is in {order.status} status and cannot be {done_label}'}
+            else:
+                apply(order)
+                to_save.append(order)
+        
+        saved, conflicts = Order.save_many(to_save)
+        saved, conflicts = set(saved), set(conflicts)
+        for order in to_save:
+            if order.order_id in saved:
+                results[order.order_id] = {'success': True, 'message': f'Order {done_label}', 'new_status': order.status}
+            elif order.order_id in conflicts:
+                results[order.order_id] = {'success': False, 'message': self.CONFLICT_MESSAGE}
+            else:
+                results[order.order_id] = {'success': False, 'message': 'Failed to update order'}
+        
+        processed = [order for order in to_save if order.order_id in saved]
+        succeeded = sum(1 for result in results.values() if result['success'])
+        return {
+            'success': True,
+            'message': f"{len(processed)} orders {done_label}" + (
+                f", {succeeded - len(processed)} already were" if succeeded > len(processed) else ''
+            ),
+            'processed': len(processed),
+            'failed': len(order_ids) - succeeded,
+            'results': [{'order_id': order_id, **results[order_id]} for order_id in order_ids]
+        }, processed
+    
+    def send_dispatch_notifications(self, orders):
+        """Email each requester about their dispatched orders (requesters read in one batch)"""
+        try:
+            db = config.get_db()
+            user_ids = sorted({order.user_id for order in orders if order.user_id})
+            refs = [db.collection('users').document(user_id) for user_id in user_ids]
+            emails = {doc.id: doc.to_dict().get('email') for doc in db.get_all(refs) if doc.exists} if refs else {}
+            
+            for order in orders:
+                recipient = emails.get(order.user_id)
+                if recipient:
+                    self.auth.send_order_notification(order, 'order_dispatched', recipient)
+                    
+        except Exception as e:
+            print(f"Error sending dispatch notifications: {e}")
+    
     # Helper methods
     
     def get_vendor_orders(self, status=None, customer_id=None):
@@ -1,8 +1,10 @@
 # Product Controller - Enhanced with location-based product filtering
 from flask import request, session
-from models import Product, User, Location
+from datetime import datetime
+from models import Product, User, Location, PricingSummary, LowStockIndex
 from controllers.auth_controller import auth_controller
-from config import config
+from config import config, LocalStorage
+from image_variants import image_variant_worker, get_image_url, get_image_urls
 import uuid, random
 
 class ProductController:
@@ -26,6 +28,7 @@ class ProductController:
             category = request.args.get('category', '') if request.args else ''
             location_id = request.args.get('location_id', '') if request.args else ''
             sort_by = request.args.get('sort', 'name_asc') if request.args else 'name_asc'
+            image_size = request.args.get('image_size', 'card') if request.args else 'card'
             
             try:
                 page = int(request.args.get('page', 1)) if request.args else 1
@@ -122,6 +125,11 @@ class ProductController:
                     # Add computed fields
                     product_dict['is_low_stock'] = product.is_low_stock() if hasattr(product, 'is_low_stock') else False
                     
+                    # List views get downscaled renditions instead of the uploaded originals
+                    product_dict['thumbnail_url'] = get_image_url(product_dict, 'thumb')
+                    product_dict['original_image_urls'] = product_dict.get('image_urls', [])
+                    product_dict['image_urls'] = get_image_urls(product_dict, image_size)
+                    
                     # Calculate pricing with GST
                     base_price = product_dict['price']
                     gst_rate = product_dict['gst_rate']
@@ -313,6 +321,10 @@ class ProductController:
             if product.save():
                 print(f"Product created successfully: {product.product_name} (ID: {product.product_id})")
                 
+                # Render downscaled image variants in the background
+                for image_url in image_urls:
+                    image_variant_worker.enqueue(product.product_id, image_url)
+                
                 return {
                     'success': True,
                     'message': 'Product created successfully',
@@ -321,6 +333,8 @@ class ProductController:
                     'product': product.to_dict()
                 }
             else:
+                for image_url in image_urls:
+                    self.image_storage().release(image_url)
                 return {'success': False, 'message': 'Failed to save product to database'}
                 
         except Exception as e:
@@ -369,21 +383,18 @@ class ProductController:
             if not product:
                 return {'success': False, 'message': 'Product not found'}
             
+            image_file = None
+            new_image_urls = []
+            replaced_image_urls = []
+            
             # Handle both form data and JSON
             if request.content_type and request.content_type.startswith('multipart/form-data'):
                 # Handle multipart form data (with file upload)
                 data = request.form.to_dict()
                 
-                # Handle image upload
-                if 'product_image' in request.files:
+                # Replacement image - uploaded once the rest of the update is valid
+                if 'product_image' in request.files and request.files['product_image'].filename:
                     image_file = request.files['product_image']
-                    if image_file and image_file.filename:
-                        # Upload image and get URL
-                        image_url = self.upload_product_image(image_file, product_id)
-                        if image_url:
-                            product.image_urls = [image_url]
-                        else:
-                            return {'success': False, 'message': 'Failed to upload product image'}
                 
                 # Handle location_ids from form data
                 location_ids = request.form.getlist('location_ids')
@@ -451,14 +462,33 @@ class ProductController:
             if not product.location_ids and not product.location_id:
                 return {'success': False, 'message': 'At least one location must be selected'}
             
+            if image_file:
+                image_url = self.upload_product_image(image_file, product_id)
+                if not image_url:
+                    return {'success': False, 'message': 'Failed to upload product image'}
+                replaced_image_urls = list(product.image_urls or [])
+                product.image_urls = [image_url]
+                product.image_variants = {}
+                new_image_urls = [image_url]
+            
             # Save updated product
             if product.save():
+                # Replaced images lose this product's reference and are deleted once unreferenced
+                for image_url in replaced_image_urls:
+                    self.image_storage().release(image_url)
+                
+                # Render downscaled variants for a replaced image
+                for image_url in new_image_urls:
+                    image_variant_worker.enqueue(product_id, image_url)
+                
                 return {
                     'success': True,
                     'message': 'Product updated successfully',
                     'product': product.to_dict()
                 }
             else:
+                for image_url in new_image_urls:
+                    self.image_storage().release(image_url)
                 return {'success': False, 'message': 'Failed to update product'}
                 
         except Exception as e:
@@ -467,12 +497,16 @@ class ProductController:
             traceback.print_exc()
             return {'success': False, 'message': f'Failed to update product: {str(e)}'}
 
+    @staticmethod
+    def image_storage():
+        """Product images stay on local disk (where the variant worker renders them), also with Firebase Storage"""
+        return LocalStorage(config.upload_folder)
+    
     def upload_product_image(self, image_file, product_id):
         """Upload product image and return URL"""
         try:
             import os
             from werkzeug.utils import secure_filename
-            import uuid
             
             # Validate file type
             allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
@@ -493,21 +527,13 @@ class ProductController:
             if file_size > 16 * 1024 * 1024:  # 16MB
                 return None
             
-            # Generate unique filename
-            unique_filename = f"{product_id}_{uuid.uuid4().hex[:8]}.{file_extension}"
+            # Store under a content-hash path (identical images are stored once)
+            image_url = self.image_storage().upload_content_addressed(image_file.stream, 'products', file_extension)
             
-            # Create upload directory if it doesn't exist
-            upload_dir = os.path.join('uploads', 'products')
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            # Save file
-            file_path = os.path.join(upload_dir, unique_filename)
-            image_file.save(file_path)
-            
-            print(f"Product image uploaded successfully: {file_path}")
+            print(f"Product image uploaded successfully: {image_url}")
             
             # Return relative URL
-            return f"/uploads/products/{unique_filename}"
+            return image_url
             
         except Exception as e:
             print(f"Upload product image error: {e}")
@@ -586,6 +612,49 @@ class ProductController:
             print(f"Get customer pricing error: {e}")
             return None
     
+    def set_customer_pricing(self, product_id, customer_id, custom_price, product=None):
+        """Create or update a customer's custom price and its pricing summary"""
+        try:
+            product = product or Product.get_by_id(product_id)
+            if not product:
+                return {'success': False, 'message': 'Product not found'}
+            
+            current_user = self.auth.get_current_user()
+            if not PricingSummary.set_price(customer_id, product_id, product.price, custom_price,
+                                            current_user.user_id if current_user else None):
+                return {'success': False, 'message': 'Failed to update customer pricing'}
+            return {'success': True, 'message': 'Customer pricing updated successfully'}
+            
+        except Exception as e:
+            print(f"Set customer pricing error: {e}")
+            return {'success': False, 'message': 'Failed to update customer pricing'}
+    
+    def delete_customer_pricing(self, product_id, customer_id):
+        """Remove a customer's custom price (revert to base price) and update its pricing summary"""
+        try:
+            product = Product.get_by_id(product_id)
+            if not PricingSummary.set_price(customer_id, product_id, product.price if product else 0, None):
+                return {'success': False, 'message': 'Failed to remove customer pricing'}
+            return {'success': True, 'message': 'Customer pricing removed successfully'}
+            
+        except Exception as e:
+            print(f"Delete customer pricing error: {e}")
+            return {'success': False, 'message': 'Failed to remove customer pricing'}
+    
+    def get_low_stock_products(self, location_id=None, category=None):
+        """Products at or below their low-stock threshold, optionally for one location or category"""
+        try:
+            products = LowStockIndex.get_entries(location_id, category)
+            return {
+                'success': True,
+                'products': products,
+                'total': len(products),
+                'filters': {'location_id': location_id, 'category': category}
+            }
+        except Exception as e:
+            print(f"Get low stock products error: {e}")
+            return {'success': False, 'message': 'Failed to retrieve low stock products'}
+    
     def get_product_categories(self):
         """Get available product categories"""
         try:
@@ -1,7 +1,9 @@
 # Enhanced Vendor Settings Controller - Handle vendor configuration with improved email settings
+from datetime import datetime, timedelta
 from flask import session, request, jsonify
-from models import VendorSettings
+from models import VendorSettings, LowStockIndex
 from controllers.auth_controller import auth_controller
+from sales_analytics import sales_analytics, SALES_STATUSES
 
 class VendorController:
     """Handle vendor settings and configuration"""
@@ -244,17 +246,13 @@ class VendorController:
             # Total products
             total_products = len(list(db.collection('products').where('is_active', '==', True).get()))
             
-            # Low stock products (quantity < 10)
-            low_stock_products = []
-            products = db.collection('products').where('is_active', '==', True).get()
-            for product_doc in products:
-                product_data = product_doc.to_dict()
-                if product_data.get('quantity', 0) < 10:
-                    low_stock_products.append({
-                        'product_id': product_data['product_id'],
-                        'product_name': product_data['product_name'],
-                        'quantity': product_data['quantity']
-                    })
+            # Low stock products (at or below each product's threshold), lowest stock first
+            low_stock_products = [{
+                'product_id': entry['product_id'],
+                'product_name': entry['product_name'],
+                'quantity': entry['quantity'],
+                'low_stock_threshold': entry['low_stock_threshold']
+            } for entry in LowStockIndex.get_entries()]
             
             # Calculate total revenue (completed orders)
             total_revenue = 0
@@ -307,7 +305,151 @@ class VendorController:
         except Exception as e:
             print(f"Get customer dropdown error: {e}")
             return {'success': False, 'message': 'Failed to retrieve customer data'}
-    
+
+    def get_sales_analytics(self, report):
+        """Revenue by customer and month, category mix or department spend (SuperAdmin/Admin only).
+
+        Query parameters: start/end (YYYY-MM-DD or YYYY-MM), status (comma separated)
+        and customer_id.
+        """
+        try:
+            current_user = self.auth.get_current_user()
+            if not current_user or current_user.role not in ['vendor_superadmin', 'vendor_admin']:
+                return {'success': False, 'message': 'Access denied'}
+
+            try:
+                filters = self.parse_analytics_filters(request.args)
+            except ValueError:
+                return {'success': False, 'message': 'Dates must be YYYY-MM-DD or YYYY-MM'}
+
+            from models import BranchDirectory
+
+            if report == 'revenue':
+                result = sales_analytics.revenue_by_customer_month(**filters)
+                names = BranchDirectory.resolve_customer_names({c['customer_id'] for c in result['customers']})
+                for row in result['customers']:
+                    row['customer_name'] = names.get(row['customer_id'])
+            elif report == 'category_mix':
+                result = sales_analytics.category_mix(**filters)
+            elif report == 'department_spend':
+                result = sales_analytics.department_spend(**filters)
+                names = BranchDirectory.resolve_customer_names({d['customer_id'] for d in result['departments']})
+                department_names = self.resolve_department_names({d['department_id'] for d in result['departments']})
+                for row in result['departments']:
+                    row['customer_name'] = names.get(row['customer_id'])
+                    row['department_name'] = department_names.get(row['department_id'], 'Unassigned')
+            else:
+                return {'success': False, 'message': 'Unknown report'}
+
+            return {
+                'success': True,
+                'report': report,
+                'filters': {
+                    'start': filters['start'].isoformat() if filters['start'] else None,
+                    'end': filters['end'].isoformat() if filters['end'] else None,
+                    'statuses': list(filters['statuses']),
+                    'customer_id': filters['customer_id']
+                },
+                **result
+            }
+
+        except Exception as e:
+            print(f"Get sales analytics error: {e}")
+            return {'success': False, 'message': 'Failed to generate sales analytics'}
+
+    def get_gst_summary(self):
+        """HSN-wise and rate-wise monthly GST summary of dispatched orders (SuperAdmin/Admin only).
+
+        Query parameters: start/end (YYYY-MM) and rebuild=1 to backfill the summary first.
+        """
+        try:
+            current_user = self.auth.get_current_user()
+            if not current_user or current_user.role not in ['vendor_superadmin', 'vendor_admin']:
+                return {'success': False, 'message': 'Access denied'}
+
+            start = request.args.get('start') or None
+            end = request.args.get('end') or None
+            try:
+                for month in (start, end):
+                    if month:
+                        datetime.strptime(month, '%Y-%m')
+            except ValueError:
+                return {'success': False, 'message': 'Months must be YYYY-MM'}
+
+            from models import GSTSummary
+
+            if request.args.get('rebuild') == '1':
+                GSTSummary.rebuild()
+
+            rows = []
+            months = {}
+            for entry in GSTSummary.get_summary(start, end):
+                row = {
+                    'month': entry['month'],
+                    'hsn_code': entry.get('hsn_code'),
+                    'gst_rate': entry.get('gst_rate') or 0,
+                    'taxable_value': round(entry.get('taxable_value') or 0, 2),
+                    'tax_amount': round(entry.get('tax_amount') or 0, 2),
+                    'order_count': entry.get('order_count') or 0
+                }
+                row['total_value'] = round(row['taxable_value'] + row['tax_amount'], 2)
+                rows.append(row)
+
+                month_totals = months.setdefault(row['month'], {'month': row['month'], 'taxable_value': 0, 'tax_amount': 0})
+                month_totals['taxable_value'] += row['taxable_value']
+                month_totals['tax_amount'] += row['tax_amount']
+
+            for month_totals in months.values():
+                month_totals['taxable_value'] = round(month_totals['taxable_value'], 2)
+                month_totals['tax_amount'] = round(month_totals['tax_amount'], 2)
+
+            return {
+                'success': True,
+                'start': start,
+                'end': end,
+                'rows': rows,
+                'months': list(months.values()),
+                'totals': {
+                    'taxable_value': round(sum(m['taxable_value'] for m in months.values()), 2),
+                    'tax_amount': round(sum(m['tax_amount'] for m in months.values()), 2)
+                }
+            }
+
+        except Exception as e:
+            print(f"Get GST summary error: {e}")
+            return {'success': False, 'message': 'Failed to generate GST summary'}
+
+    def parse_analytics_filters(self, args):
+        """Report filters from query parameters; raises ValueError on a malformed date"""
+        def parse_date(value, month_end=False):
+            if not value:
+                return None
+            if len(value) == 7:
+                first = datetime.strptime(value, '%Y-%m').date()
+                if not month_end:
+                    return first
+                return (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+            return datetime.strptime(value, '%Y-%m-%d').date()
+
+        statuses = args.get('status')
+        return {
+            'start': parse_date(args.get('start')),
+            'end': parse_date(args.get('end'), month_end=True),
+            'statuses': tuple(s.strip() for s in statuses.split(',') if s.strip()) if statuses else SALES_STATUSES,
+            'customer_id': args.get('customer_id') or None
+        }
+
+    def resolve_department_names(self, department_ids):
+        """Map of department_id -> name (one batched read)"""
+        from config import config
+
+        department_ids = sorted(d for d in department_ids if d)
+        if not department_ids:
+            return {}
+        db = config.get_db()
+        refs = [db.collection('departments').document(department_id) for department_id in department_ids]
+        return {doc.id: doc.to_dict().get('name') for doc in db.get_all(refs) if doc.exists}
+
     def get_system_health(self):
         """Get system health status (SuperAdmin only)"""
         try:
@@ -0,0 +1,108 @@
+# File Serving - Cache-friendly delivery of uploaded files
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from flask import current_app, request
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+# Uploads are written under unique names (random hex or content hash) and never
+# rewritten, so those URLs can be cached forever
+CONTENT_ADDRESSED_PATTERN = re.compile(r'(^|[_/])[0-9a-f]{8,}(_\d+)?\.[A-Za-z0-9]+$')
+SHA256_NAME_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+IMMUTABLE_MAX_AGE = 31536000  # one year
+
+# Private documents must not be stored by shared caches
+PRIVATE_FOLDERS = ('agreements/',)
+
+_etag_cache = {}
+_etag_cache_lock = threading.Lock()
+_ETAG_CACHE_LIMIT = 4096
+
+
+def is_content_addressed(filename):
+    """True if the upload's name is unique to its content and never rewritten"""
+    return bool(CONTENT_ADDRESSED_PATTERN.search(filename))
+
+
+def file_etag(path, stat=None):
+    """Strong ETag (SHA-256 of the file), cached per path/mtime/size"""
+    stat = stat or os.stat(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if SHA256_NAME_PATTERN.match(stem):
+        # Content-hash filenames already are the digest
+        return stem
+
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _etag_cache_lock:
+        etag = _etag_cache.get(key)
+    if etag:
+        return etag
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    etag = digest.hexdigest()
+
+    with _etag_cache_lock:
+        if len(_etag_cache) >= _ETAG_CACHE_LIMIT:
+            _etag_cache.clear()
+        _etag_cache[key] = etag
+    return etag
+
+
+def cache_control_for(filename):
+    """Cache-Control header value for an uploaded file"""
+    visibility = 'private' if filename.startswith(PRIVATE_FOLDERS) else 'public'
+    if is_content_addressed(filename):
+        return f"{visibility}, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    # Mutable names: cache but always revalidate with the ETag
+    return f"{visibility}, no-cache"
+
+
+def send_upload(filename, upload_folder='uploads'):
+    """Serve a file from the upload folder with ETag, Last-Modified and Range support.
+
+    Conditional requests (If-None-Match / If-Modified-Since) get a 304 and byte
+    ranges a 206. With UPLOADS_SENDFILE_MODE set to 'x-sendfile' or
+    'x-accel-redirect' the body is left to the front-end web server.
+    Returns None if the file does not exist.
+    """
+    path = safe_join(os.path.abspath(upload_folder), filename)
+    if path is None or not os.path.isfile(path):
+        return None
+
+    stat = os.stat(path)
+    etag = file_etag(path, stat)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    mode = (current_app.config.get('UPLOADS_SENDFILE_MODE') or '').lower()
+
+    if mode == 'x-accel-redirect':
+        # nginx serves the bytes from an internal location mapped to the upload folder
+        prefix = current_app.config.get('UPLOADS_ACCEL_PREFIX', '/protected-uploads/')
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + filename.lstrip('/')
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        response.make_conditional(request)
+    else:
+        # X-Sendfile only for uploads, not for every send_file in the app
+        response = send_file(
+            path,
+            request.environ,
+            mimetype=mimetype,
+            conditional=True,
+            etag=etag,
+            last_modified=stat.st_mtime,
+            use_x_sendfile=(mode == 'x-sendfile'),
+            response_class=current_app.response_class
+        )
+
+    response.headers['Cache-Control'] = cache_control_for(filename)
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,132 @@
+# Image Variants - Downscaled product image renditions generated in the background
+import os
+
+from PIL import Image, ImageOps
+
+from background import BackgroundWorker
+
+# Longest-edge sizes (px) of the generated renditions
+IMAGE_VARIANT_SIZES = {
+    'thumb': 128,   # order lines, cart, dropdowns
+    'card': 384,    # catalog grid / list views
+    'large': 1024   # product detail and zoom
+}
+
+VARIANT_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}
+}
+
+VARIANT_FOLDER = os.path.join('uploads', 'products', 'variants')
+
+
+def generate_image_variants(source_path, output_dir=VARIANT_FOLDER):
+    """Create WebP/JPEG renditions of an image for every size in IMAGE_VARIANT_SIZES.
+
+    EXIF orientation is applied to the pixels and all metadata (EXIF, GPS, ICC
+    comments) is dropped from the output files. Images are never upscaled.
+    Returns {size_name: {'width', 'height', 'webp', 'jpeg'}} with URL paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = {}
+    for size_name, max_edge in IMAGE_VARIANT_SIZES.items():
+        rendition = image.copy()
+        rendition.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        entry = {'width': rendition.width, 'height': rendition.height}
+        for extension, options in VARIANT_FORMATS.items():
+            output = rendition
+            if options['format'] == 'JPEG' and output.mode == 'RGBA':
+                # JPEG has no alpha channel - flatten onto white
+                background = Image.new('RGB', output.size, (255, 255, 255))
+                background.paste(output, mask=output.split()[-1])
+                output = background
+
+            filename = f"{stem}_{max_edge}.{extension}"
+            file_path = os.path.join(output_dir, filename)
+            temp_path = f"{file_path}.tmp"
+            save_options = {k: v for k, v in options.items() if k != 'format'}
+            output.save(temp_path, options['format'], **save_options)
+            os.replace(temp_path, file_path)
+
+            entry[extension] = '/' + file_path.replace(os.sep, '/')
+        variants[size_name] = entry
+
+    return variants
+
+
+def get_image_url(product_data, size_name='card', image_format='webp', index=0):
+    """URL of the requested rendition of a product image, falling back to the original"""
+    image_urls = product_data.get('image_urls') or []
+    if index >= len(image_urls):
+        return None
+
+    original_url = image_urls[index]
+    variants = (product_data.get('image_variants') or {}).get(original_url) or {}
+    rendition = variants.get(size_name) or {}
+    return rendition.get(image_format) or original_url
+
+
+def get_image_urls(product_data, size_name='card', image_format='webp'):
+    """URLs of the requested rendition for all product images"""
+    return [
+        get_image_url(product_data, size_name, image_format, index)
+        for index in range(len(product_data.get('image_urls') or []))
+    ]
+
+
+class ImageVariantWorker(BackgroundWorker):
+    """Background thread that renders image variants after upload"""
+
+    def __init__(self):
+        super().__init__('image-variant-worker')
+
+    def enqueue(self, product_id, image_url):
+        """Queue variant generation for an uploaded product image"""
+        super().enqueue(self.process, product_id, image_url)
+
+    def process(self, product_id, image_url):
+        """Render variants for one image and record their URLs on the product"""
+        from config import config
+
+        source_path = image_url.lstrip('/').replace('/', os.sep)
+        if not os.path.exists(source_path):
+            print(f"Image variant source not found: {source_path}")
+            return
+
+        variants = generate_image_variants(source_path)
+
+        db = config.get_db()
+        doc_ref = db.collection('products').document(product_id)
+        doc = doc_ref.get()
+        if not doc.exists:
+            return
+
+        product_data = doc.to_dict()
+        if image_url not in (product_data.get('image_urls') or []):
+            # Image was replaced while we were rendering
+            return
+
+        # Keep variants only for images still attached to the product
+        image_variants = {
+            url: value for url, value in (product_data.get('image_variants') or {}).items()
+            if url in product_data.get('image_urls', [])
+        }
+        image_variants[image_url] = variants
+
+        # Partial update so a concurrent product edit is not overwritten
+        doc_ref.update({'image_variants': image_variants})
+        print(f"Generated {len(variants)} image variants for product {product_id}")
+
+
+# Global image variant worker instance
+image_variant_worker = ImageVariantWorker()
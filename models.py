@@ -2,45 +2,240 @@
 from datetime import datetime
 import uuid
 import hashlib
+import operator
+import threading
+import time
+from firebase_admin import firestore
+from google.api_core.exceptions import FailedPrecondition, NotFound
 from config import config
+import pricing_analytics
+from sales_analytics import sales_analytics
 
-class BaseModel:
+# Marks a field absent from a stored document (None is a valid stored value)
+_MISSING = object()
+
+
+def new_uuid():
+    """Random UUID string used as a default document ID"""
+    return str(uuid.uuid4())
+
+
+class ModelMeta(type):
+    """Build __slots__ and the document codec from a model's FIELDS schema.
+
+    FIELDS maps each persisted attribute to its default; a callable default is
+    a factory called per instance. Fields are inherited from base models.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        inherited = {}
+        for base in reversed(bases):
+            inherited.update(getattr(base, '_schema', {}))
+
+        own_fields = namespace.get('FIELDS', {})
+        namespace['__slots__'] = tuple(namespace.get('__slots__', ())) + tuple(
+            field for field in own_fields if field not in inherited
+        )
+
+        cls = super().__new__(mcs, name, bases, namespace)
+        cls._schema = {**inherited, **own_fields}
+        _build_codec(cls)
+        return cls
+
+
+def _build_codec(cls):
+    """Generate straight-line _init_defaults, to_document and from_document for cls"""
+    schema = cls._schema
+    ignored = frozenset(getattr(cls, 'DERIVED_FIELDS', ()))
+    env = {
+        'cls': cls, 'new': object.__new__, 'MISSING': _MISSING,
+        'FIELD_NAMES': frozenset(schema), 'IGNORED': ignored
+    }
+
+    init_lines = [
+        'def _init_defaults(self):', '    self._extra = None', '    self._loaded = None', '    self._pending = None',
+        '    self._update_time = None'
+    ]
+    decode_lines = ['def from_document(data):', '    obj = new(cls)', '    get = data.get']
+    for index, (field, default) in enumerate(schema.items()):
+        if callable(default):
+            factory = f'default_{index}'
+            env[factory] = default
+            init_lines.append(f'    self.{field} = {factory}()')
+            decode_lines.append(f'    v{index} = get({field!r}, MISSING)')
+            decode_lines.append(f'    if v{index} is MISSING:')
+            decode_lines.append(f'        v{index} = {factory}()')
+        else:
+            if default is not None and not isinstance(default, (bool, int, float, str)):
+                raise TypeError(f"{cls.__name__}.{field}: mutable defaults must be factories")
+            init_lines.append(f'    self.{field} = {default!r}')
+            decode_lines.append(f'    v{index} = get({field!r}, {default!r})')
+        decode_lines.append(f'    obj.{field} = v{index}')
+
+    # The loaded values (a tuple, 8 bytes per field) are what save() diffs against
+    values = ', '.join(f'v{index}' for index in range(len(schema)))
+    decode_lines += [f'    obj._loaded = ({values},)', '    obj._pending = None', '    obj._update_time = None']
+
+    # Keep stored keys the schema does not know about so saves never drop them.
+    # They are not exposed as attributes: a __getattr__ hook would disable the
+    # interpreter's fast attribute access for every model.
+    decode_lines += [
+        '    if FIELD_NAMES.issuperset(data):',
+        '        obj._extra = None',
+        '    else:',
+        '        obj._extra = {k: v for k, v in data.items() if k not in FIELD_NAMES and k not in IGNORED} or None',
+        '    return obj'
+    ]
+
+    encode_lines = ['def to_document(self):', '    data = {']
+    encode_lines += [f'        {field!r}: self.{field},' for field in schema]
+    encode_lines += ['    }', '    if self._extra:', '        data.update(self._extra)', '    return data']
+
+    source = '\n'.join(init_lines + [''] + decode_lines + [''] + encode_lines) + '\n'
+    exec(compile(source, f'<codec {cls.__name__}>', 'exec'), env)
+
+    cls._init_defaults = env['_init_defaults']
+    cls.to_document = env['to_document']
+    cls.from_document = staticmethod(env['from_document'])
+    cls._field_values = operator.attrgetter(*schema)
+    cls._field_index = {field: index for index, field in enumerate(schema)}
+
+
+class BaseModel(metaclass=ModelMeta):
     """Base model with common functionality"""
-    
+
+    # _loaded: field values as last read or written (None until the document exists)
+    # _pending: fields flagged by mark_changed() / append_to() -> appended values or None
+    # _update_time: stored update time when read with from_snapshot() (write precondition)
+    __slots__ = ('_extra', '_loaded', '_pending', '_update_time')
+
+    FIELDS = {
+        'created_at': datetime.now,
+        'updated_at': datetime.now,
+        'is_deleted': False,
+        'deleted_at': None,
+        'deleted_by': None
+    }
+
+    # Keys written by older versions or computed for API responses; never decoded
+    DERIVED_FIELDS = ()
+
     def __init__(self):
-        self.created_at = datetime.now()
-        self.updated_at = datetime.now()
-    
+        self._init_defaults()
+
     def to_dict(self):
         """Convert model to dictionary"""
-        result = {}
-        for key, value in self.__dict__.items():
-            if isinstance(value, datetime):
-                result[key] = value
-            else:
-                result[key] = value
-        return result
-    
-    @classmethod
-    # Replace the from_dict method in User class in models.py
+        return self.to_document()
 
     @classmethod
     def from_dict(cls, data):
-        """Create instance from dictionary - Enhanced with deletion support"""
-        instance = cls()
-        for key, value in data.items():
-            setattr(instance, key, value)
-        
-        # Ensure deletion fields have default values if missing
-        if not hasattr(instance, 'is_deleted'):
-            instance.is_deleted = False
-        if not hasattr(instance, 'deleted_at'):
-            instance.deleted_at = None
-        if not hasattr(instance, 'deleted_by'):
-            instance.deleted_by = None
-            
-        return instance
-    
+        """Create instance from dictionary"""
+        return cls.from_document(data)
+
+    @classmethod
+    def from_snapshot(cls, doc):
+        """Create instance from a document snapshot, keeping its update time for write_option()"""
+        obj = cls.from_document(doc.to_dict())
+        obj._update_time = doc.update_time
+        return obj
+
+    def write_option(self, db):
+        """Precondition that the document is unchanged since it was read, if that is known"""
+        if self._update_time is None:
+            return None
+        return db.write_option(last_update_time=self._update_time)
+
+    def loaded_value(self, field, default=None):
+        """Value of a field as last read from or written to the database"""
+        if self._loaded is None:
+            return default
+        return self._loaded[self._field_index[field]]
+
+    def mark_changed(self, *fields):
+        """Flag fields that were mutated in place (list.append, dict item assignment).
+
+        Reassigned fields are detected automatically when saving; in-place
+        mutations of a loaded list or dict are not.
+        """
+        if self._pending is None:
+            self._pending = {}
+        for field in fields:
+            self._pending[field] = None
+
+    def append_to(self, field, value):
+        """Append to a list field; the save sends just the new entries with ArrayUnion"""
+        getattr(self, field).append(value)
+        if self._pending is None:
+            self._pending = {}
+        if field in self._pending and self._pending[field] is None:
+            return
+        self._pending.setdefault(field, []).append(value)
+
+    def get_changes(self, current=None):
+        """Fields modified since the document was loaded or last saved"""
+        if current is None:
+            current = self.to_document()
+        if self._loaded is None:
+            return current
+
+        pending = self._pending or {}
+        changes = {}
+        for field, previous in zip(self._schema, self._loaded):
+            value = current[field]
+            if value is previous and field not in pending:
+                continue
+            if value is previous or value != previous:
+                appended = pending.get(field)
+                changes[field] = firestore.ArrayUnion(appended) if appended else value
+        return changes
+
+    def write_to(self, doc_ref, batch=None, option=None):
+        """Persist the model: a full set() for new documents, otherwise an update()
+        of the changed fields only. Returns the written field names.
+
+        ``option`` (see write_option()) makes the update conditional; if the
+        document changed since it was read the write raises FailedPrecondition.
+
+        With a write batch the write is only queued: the model stays dirty until
+        the caller commits the batch and calls mark_saved(), so a failed commit
+        leaves the changes to be written again by the next save.
+        """
+        current = self.to_document()
+        update_time = self._update_time
+        if self._loaded is None:
+            if batch is not None:
+                batch.set(doc_ref, current)
+            else:
+                update_time = doc_ref.set(current).update_time
+            written = list(current)
+        else:
+            changes = self.get_changes(current)
+            written = list(changes)
+            if changes and batch is not None:
+                batch.update(doc_ref, changes, option=option)
+            elif changes:
+                try:
+                    update_time = doc_ref.update(changes, option=option).update_time
+                except (KeyError, NotFound):
+                    if option is not None:
+                        raise
+                    # The stored document is gone - recreate it
+                    update_time = doc_ref.set(current).update_time
+                    written = list(current)
+
+        if batch is None:
+            self.mark_saved(update_time)
+        return written
+
+    def mark_saved(self, update_time=None):
+        """Record the current field values as stored (after a batch carrying the write commits).
+
+        ``update_time`` is the write's update time, the precondition for the next conditional save.
+        """
+        self._loaded = self._field_values(self)
+        self._pending = None
+        self._update_time = update_time
+
     def save(self):
         """Save model to database - to be implemented by subclasses"""
         raise NotImplementedError
@@ -53,31 +248,34 @@ class BaseModel:
 class Location(BaseModel):
     """Enhanced Location model with state-based delivery zones"""
     
-    def __init__(self):
-        super().__init__()
-        self.location_id = str(uuid.uuid4())
-        self.name = None
-        self.address = None
-        self.pincode = None  # Location's own pincode
-        self.phone = None
-        self.manager_name = None
-        self.description = None
-        self.is_active = True
-        self.serviceable_states = []  # List of states this location can service
-        self.serviceable_pincodes = []  # Auto-generated from states
-        
-        
-        # Indian states grouped by pincode zones
-        self.pincode_states = {
-            '1': ['Delhi NCR', 'Haryana', 'Himachal Pradesh', 'Punjab', 'UT/Chandigarh', 'UT/Jammu and Kashmir', 'UT/Ladakh'],
-            '2': ['Uttarakhand', 'Uttar Pradesh'],
-            '3': ['Gujarat', 'Rajasthan', 'UT/Dadra, Nagar Haveli, Daman & Diu'],
-            '4': ['Chhattisgarh', 'Goa', 'Madhya Pradesh', 'Maharashtra'],
-            '5': ['Andhra Pradesh', 'Karnataka', 'Telangana'],
-            '6': ['Kerala', 'Tamil Nadu', 'UT/Puducherry', 'UT/Lakshadweep'],
-            '7': ['Arunachal Pradesh', 'Assam', 'Manipur', 'Meghalaya', 'Mizoram', 'Nagaland', 'Odisha', 'Sikkim', 'Tripura', 'West Bengal', 'UT/Andaman and Nicobar Islands'],
-            '8': ['Bihar', 'Jharkhand']
-        }
+    # Indian states grouped by pincode zones
+    PINCODE_STATES = {
+        '1': ['Delhi NCR', 'Haryana', 'Himachal Pradesh', 'Punjab', 'UT/Chandigarh', 'UT/Jammu and Kashmir', 'UT/Ladakh'],
+        '2': ['Uttarakhand', 'Uttar Pradesh'],
+        '3': ['Gujarat', 'Rajasthan', 'UT/Dadra, Nagar Haveli, Daman & Diu'],
+        '4': ['Chhattisgarh', 'Goa', 'Madhya Pradesh', 'Maharashtra'],
+        '5': ['Andhra Pradesh', 'Karnataka', 'Telangana'],
+        '6': ['Kerala', 'Tamil Nadu', 'UT/Puducherry', 'UT/Lakshadweep'],
+        '7': ['Arunachal Pradesh', 'Assam', 'Manipur', 'Meghalaya', 'Mizoram', 'Nagaland', 'Odisha', 'Sikkim', 'Tripura', 'West Bengal', 'UT/Andaman and Nicobar Islands'],
+        '8': ['Bihar', 'Jharkhand']
+    }
+    pincode_states = PINCODE_STATES  # Backward-compatible alias
+
+    FIELDS = {
+        'location_id': new_uuid,
+        'name': None,
+        'address': None,
+        'pincode': None,  # Location's own pincode
+        'phone': None,
+        'manager_name': None,
+        'description': None,
+        'is_active': True,
+        'serviceable_states': list,  # List of states this location can service
+        'serviceable_pincodes': list  # Auto-generated from states
+    }
+
+    # Older documents stored the zone table and the computed API fields
+    DERIVED_FIELDS = ('pincode_states', 'delivery_coverage', 'serviceable_states_count', 'serviceable_zones_count')
     
     def save(self):
         """Save location to Firebase with auto-generated serviceable pincodes"""
@@ -89,7 +287,7 @@ class Location(BaseModel):
             self.updated_at = datetime.now()
             db = config.get_db()
             doc_ref = db.collection('locations').document(self.location_id)
-            doc_ref.set(self.to_dict())
+            self.write_to(doc_ref)
             return True
         except Exception as e:
             print(f"Error saving location: {e}")
@@ -100,7 +298,7 @@ class Location(BaseModel):
         try:
             serviceable_zones = []
             
-            for zone, states in self.pincode_states.items():
+            for zone, states in self.PINCODE_STATES.items():
                 if any(state in selected_states for state in states):
                     serviceable_zones.append(zone)
             
@@ -115,19 +313,21 @@ class Location(BaseModel):
         if not pincode or len(pincode) != 6 or not pincode.isdigit():
             return False
         
-        # Get the first digit (zone) from the pincode
-        pincode_zone = pincode[0]
-        
+        # The first digit of the pincode is its zone
+        return self.serves_zone(pincode[0])
+
+    def serves_zone(self, zone):
+        """Check if this location delivers to a pincode zone (first pincode digit)"""
         # Check if this zone is in our serviceable zones
-        if pincode_zone in self.serviceable_pincodes:
+        if zone in self.serviceable_pincodes:
             return True
-        
+
         # Alternative check: see if any state in the pincode zone is serviceable
-        states_in_zone = self.pincode_states.get(pincode_zone, [])
+        states_in_zone = self.PINCODE_STATES.get(zone, [])
         for state in states_in_zone:
             if state in self.serviceable_states:
                 return True
-        
+
         return False
     
     def can_deliver_to_state(self, state_name):
@@ -153,7 +353,7 @@ class Location(BaseModel):
             
             # Add zone details
             for zone in self.serviceable_pincodes:
-                states_in_zone = self.pincode_states.get(zone, [])
+                states_in_zone = self.PINCODE_STATES.get(zone, [])
                 serviceable_states_in_zone = [state for state in states_in_zone if state in self.serviceable_states]
                 
                 coverage_info['zone_details'][zone] = {
@@ -246,7 +446,7 @@ class Location(BaseModel):
         """Add a single state to serviceable states"""
         try:
             if state_name not in self.serviceable_states:
-                self.serviceable_states.append(state_name)
+                self.append_to('serviceable_states', state_name)
                 self.serviceable_pincodes = self.generate_pincodes_from_states(self.serviceable_states)
                 return self.save()
             return True
@@ -260,6 +460,7 @@ class Location(BaseModel):
         try:
             if state_name in self.serviceable_states:
                 self.serviceable_states.remove(state_name)
+                self.mark_changed('serviceable_states')
                 self.serviceable_pincodes = self.generate_pincodes_from_states(self.serviceable_states)
                 return self.save()
             return True
@@ -337,17 +538,7 @@ class Location(BaseModel):
                 'locations_without_coverage': []
             }
             
-            # Pincode states mapping
-            pincode_states = {
-                '1': ['Delhi NCR', 'Haryana', 'Himachal Pradesh', 'Punjab', 'UT/Chandigarh', 'UT/Jammu and Kashmir', 'UT/Ladakh'],
-                '2': ['Uttarakhand', 'Uttar Pradesh'],
-                '3': ['Gujarat', 'Rajasthan', 'UT/Dadra, Nagar Haveli, Daman & Diu'],
-                '4': ['Chhattisgarh', 'Goa', 'Madhya Pradesh', 'Maharashtra'],
-                '5': ['Andhra Pradesh', 'Karnataka', 'Telangana'],
-                '6': ['Kerala', 'Tamil Nadu', 'UT/Puducherry', 'UT/Lakshadweep'],
-                '7': ['Arunachal Pradesh', 'Assam', 'Manipur', 'Meghalaya', 'Mizoram', 'Nagaland', 'Odisha', 'Sikkim', 'Tripura', 'West Bengal', 'UT/Andaman and Nicobar Islands'],
-                '8': ['Bihar', 'Jharkhand']
-            }
+            pincode_states = cls.PINCODE_STATES
             
             # Initialize zone and state coverage
             for zone in pincode_states.keys():
@@ -412,60 +603,43 @@ class Location(BaseModel):
     @classmethod
     def from_dict(cls, data):
         """Create location instance from dictionary"""
-        try:
-            location = cls()
-            for key, value in data.items():
-                if key == 'pincode_states':
-                    # Don't set pincode_states from data as it's a class constant
-                    continue
-                setattr(location, key, value)
-            
-            # Ensure required fields have default values
-            if not hasattr(location, 'serviceable_states') or location.serviceable_states is None:
-                location.serviceable_states = []
-            
-            if not hasattr(location, 'serviceable_pincodes') or location.serviceable_pincodes is None:
-                location.serviceable_pincodes = []
-            
-            if not hasattr(location, 'is_active'):
-                location.is_active = True
-            
-            return location
-            
-        except Exception as e:
-            print(f"Error creating location from dict: {e}")
-            # Return a basic location instance
-            location = cls()
-            location.location_id = data.get('location_id', str(uuid.uuid4()))
-            location.name = data.get('name', 'Unknown Location')
-            location.serviceable_states = data.get('serviceable_states', [])
-            location.serviceable_pincodes = data.get('serviceable_pincodes', [])
-            return location
+        location = cls.from_document(data)
+
+        # Ensure required fields have list values
+        if location.serviceable_states is None:
+            location.serviceable_states = []
+        if location.serviceable_pincodes is None:
+            location.serviceable_pincodes = []
+
+        return location
 
 class User(BaseModel):
     """User model for authentication and user management"""
     
+    FIELDS = {
+        'user_id': new_uuid,
+        'username': None,
+        'email': None,
+        'password_hash': None,
+        'role': None,  # vendor_superadmin, vendor_admin, vendor_normal, customer_hr_admin, customer_dept_head, customer_employee
+        'first_name': None,
+        'last_name': None,
+        'full_name': None,
+        'is_active': True,
+        'last_login': None,
+        'customer_id': None,  # For customer users
+        'department_id': None,  # For customer employees
+        'is_first_login': True,
+        'password_reset_required': False,
+        'branch_id': None
+    }
+
     def __init__(self, username=None, email=None, password_hash=None, role=None):
         super().__init__()
-        self.user_id = str(uuid.uuid4())
         self.username = username
         self.email = email
         self.password_hash = password_hash
-        self.role = role  # vendor_superadmin, vendor_admin, vendor_normal, customer_hr_admin, customer_dept_head, customer_employee
-        self.first_name = None  # NEW FIELD
-        self.last_name = None   # NEW FIELD
-        self.full_name = None
-        self.is_active = True
-        self.last_login = None
-        self.customer_id = None  # For customer users
-        self.department_id = None  # For customer employees
-        self.is_first_login = True
-        self.password_reset_required = False
-        self.branch_id = None
-        # NEW DELETION FIELDS
-        self.is_deleted = False
-        self.deleted_at = None
-        self.deleted_by = None   
+        self.role = role
 
     @classmethod
     def get_by_branch_id(cls, branch_id):
@@ -495,18 +669,11 @@ class User(BaseModel):
         try:
             self.updated_at = datetime.now()
             
-            # Debug logging
-            print(f"DEBUG: Saving user {self.username}")
-            print(f"DEBUG: User data being saved:")
-            user_data = self.to_dict()
-            for key, value in user_data.items():
-                print(f"  {key}: {value}")
-            
             db = config.get_db()
             doc_ref = db.collection('users').document(self.user_id)
-            doc_ref.set(user_data)
-            
-            print(f"DEBUG: User {self.username} saved to database successfully")
+            self.write_to(doc_ref)
+            if self.customer_id:
+                DepartmentRoster.invalidate(self.customer_id)
             return True
         except Exception as e:
             print(f"Error saving user {getattr(self, 'username', 'unknown')}: {e}")
@@ -554,6 +721,33 @@ class User(BaseModel):
             print(f"Error getting users by department ID: {e}")
             return []
 
+    @classmethod
+    def set_departments(cls, customer_id, assignments):
+        """Write department_id for several users of a customer (user_id -> department_id) in one batch.
+
+        Only department_id and updated_at are sent. Batches hold up to 400 users,
+        so larger reassignments are committed in several batches.
+        """
+        try:
+            if not assignments:
+                return True
+            db = config.get_db()
+            now = datetime.now()
+            user_ids = list(assignments)
+            for start in range(0, len(user_ids), 400):
+                batch = db.batch()
+                for user_id in user_ids[start:start + 400]:
+                    batch.update(db.collection('users').document(user_id), {
+                        'department_id': assignments[user_id],
+                        'updated_at': now
+                    })
+                batch.commit()
+            DepartmentRoster.invalidate(customer_id)
+            return True
+        except Exception as e:
+            print(f"Error updating department assignments: {e}")
+            return False
+    
     @classmethod
     def get_by_customer_and_roles(cls, customer_id, roles):
         """Get users by customer ID and specific roles"""
@@ -649,51 +843,28 @@ class User(BaseModel):
         self.is_first_login = False
         self.password_reset_required = False
         return self.save()
-    
-    def to_dict(self):
-        """Convert user to dictionary - ENHANCED VERSION"""
-        try:
-            result = {}
-            for key, value in self.__dict__.items():
-                if isinstance(value, datetime):
-                    result[key] = value
-                else:
-                    result[key] = value
-            
-            # Ensure branch_id is included even if None
-            if not hasattr(self, 'branch_id'):
-                result['branch_id'] = None
-            
-            # Ensure department_id is included even if None  
-            if not hasattr(self, 'department_id'):
-                result['department_id'] = None
-                
-            return result
-        except Exception as e:
-            print(f"Error converting user to dict: {e}")
-            return super().to_dict()
 
 class Customer(BaseModel):
     """Customer model for company information"""
     
+    FIELDS = {
+        'customer_id': None,
+        'company_name': None,
+        'email': None,
+        'postal_address': None,
+        'primary_phone': None,
+        'alternate_phone': None,
+        'agreement_file_url': None,
+        'is_active': True,
+        'hr_admin_created': False,
+        'company_alias': None,
+        'restored_at': None,
+        'restored_by': None
+    }
+
     def __init__(self):
         super().__init__()
         self.customer_id = self.generate_customer_id()
-        self.company_name = None
-        self.email = None
-        self.postal_address = None
-        self.primary_phone = None
-        self.alternate_phone = None
-        self.agreement_file_url = None
-        self.is_active = True
-        self.hr_admin_created = False
-        self.company_alias = None
-        # NEW DELETION FIELDS
-        self.is_deleted = False
-        self.deleted_at = None
-        self.deleted_by = None
-        self.restored_at = None
-        self.restored_by = None
     
     @staticmethod
     def generate_customer_id():
@@ -707,7 +878,8 @@ class Customer(BaseModel):
             self.updated_at = datetime.now()
             db = config.get_db()
             doc_ref = db.collection('customers').document(self.customer_id)
-            doc_ref.set(self.to_dict())
+            self.write_to(doc_ref)
+            BranchDirectory.invalidate(customers=True)
             return True
         except Exception as e:
             print(f"Error saving customer: {e}")
@@ -840,21 +1012,17 @@ class Customer(BaseModel):
 class Branch(BaseModel):
     """Branch model for customer organization locations"""
     
-    def __init__(self):
-        super().__init__()
-        self.branch_id = str(uuid.uuid4())
-        self.customer_id = None
-        self.name = None
-        self.address = None
-        self.pincode = None  # NEW FIELD: 6-digit pincode
-        self.phone = None
-        self.email = None
-        self.manager_name = None
-        self.is_active = True
-        # NEW DELETION FIELDS
-        self.is_deleted = False
-        self.deleted_at = None
-        self.deleted_by = None
+    FIELDS = {
+        'branch_id': new_uuid,
+        'customer_id': None,
+        'name': None,
+        'address': None,
+        'pincode': None,  # 6-digit pincode
+        'phone': None,
+        'email': None,
+        'manager_name': None,
+        'is_active': True
+    }
     
     def save(self):
         """Save branch to Firebase"""
@@ -862,7 +1030,8 @@ class Branch(BaseModel):
             self.updated_at = datetime.now()
             db = config.get_db()
             doc_ref = db.collection('branches').document(self.branch_id)
-            doc_ref.set(self.to_dict())
+            self.write_to(doc_ref)
+            BranchDirectory.invalidate()
             return True
         except Exception as e:
             print(f"Error saving branch: {e}")
@@ -895,37 +1064,887 @@ class Branch(BaseModel):
             print(f"Error getting branches by customer ID: {e}")
             return []
 
+class BranchDirectory:
+    """Vendor-wide branch directory: active branches joined with customer names.
+    
+    Built from a single branches query plus a cached customer-name map, and kept
+    in process memory until Branch.save()/Customer.save() (or a branch delete)
+    invalidates it. The TTL bounds staleness across multiple worker processes.
+    """
+    
+    TTL_SECONDS = 300
+    
+    _lock = threading.Lock()
+    _entries = None
+    _entries_loaded_at = 0
+    _customer_names = None
+    _customer_names_loaded_at = 0
+    
+    @classmethod
+    def invalidate(cls, customers=False):
+        """Drop the cached directory (and the customer-name map if customers changed)"""
+        with cls._lock:
+            cls._entries = None
+            if customers:
+                cls._customer_names = None
+    
+    @classmethod
+    def get_customer_names(cls):
+        """Map of active customer_id -> company_name"""
+        with cls._lock:
+            if cls._customer_names is not None and time.time() - cls._customer_names_loaded_at < cls.TTL_SECONDS:
+                return cls._customer_names
+        
+        db = config.get_db()
+        names = {}
+        for doc in db.collection('customers').where('is_active', '==', True).get():
+            data = doc.to_dict()
+            names[data.get('customer_id', doc.id)] = data.get('company_name') or ''
+        
+        with cls._lock:
+            cls._customer_names = names
+            cls._customer_names_loaded_at = time.time()
+        return names
+    
+    @classmethod
+    def resolve_customer_names(cls, customer_ids):
+        """Map of customer_id -> company_name for existing customers (inactive ones in one batched read)"""
+        customer_names = cls.get_customer_names()
+        names = {}
+        missing = set()
+        for customer_id in customer_ids:
+            if customer_id in customer_names:
+                names[customer_id] = customer_names[customer_id]
+            else:
+                missing.add(customer_id)
+        
+        if missing:
+            db = config.get_db()
+            refs = [db.collection('customers').document(customer_id) for customer_id in sorted(missing)]
+            for doc in db.get_all(refs):
+                if doc.exists:
+                    names[doc.id] = doc.to_dict().get('company_name') or ''
+        return names
+    
+    @classmethod
+    def get_entries(cls, search=None):
+        """Dropdown entries for all active branches of active customers, optionally filtered"""
+        with cls._lock:
+            entries = cls._entries
+            if entries is not None and time.time() - cls._entries_loaded_at >= cls.TTL_SECONDS:
+                entries = None
+        
+        if entries is None:
+            customer_names = cls.get_customer_names()
+            db = config.get_db()
+            entries = []
+            for doc in db.collection('branches').where('is_active', '==', True).get():
+                data = doc.to_dict()
+                customer_id = data.get('customer_id')
+                if customer_id not in customer_names:
+                    continue
+                customer_name = customer_names[customer_id]
+                entries.append({
+                    'branch_id': data.get('branch_id', doc.id),
+                    'name': data.get('name'),
+                    'address': data.get('address'),
+                    'display_name': f"{data.get('name')} ({customer_name})",
+                    'customer_id': customer_id,
+                    'customer_name': customer_name
+                })
+            entries.sort(key=lambda e: ((e['customer_name'] or '').lower(), (e['name'] or '').lower()))
+            
+            with cls._lock:
+                cls._entries = entries
+                cls._entries_loaded_at = time.time()
+        
+        return filter_branch_entries(entries, search)
+
+
+def filter_branch_entries(entries, search=None):
+    """Case-insensitive match of branch name, address or customer name"""
+    if not search:
+        return list(entries)
+    search = search.lower()
+    return [
+        e for e in entries
+        if search in (e.get('name') or '').lower()
+        or search in (e.get('address') or '').lower()
+        or search in (e.get('customer_name') or '').lower()
+    ]
+
+@firestore.transactional
+def _write_customer_price(transaction, ref, customer_id, product_id, base_price, custom_price, user_id):
+    """Set (or, with custom_price None, remove) one customer price and queue the
+    summary increment; the previous price is read in the same transaction"""
+    existing = ref.get(transaction=transaction)
+    existing_data = existing.to_dict() if existing.exists else {}
+
+    if custom_price is None:
+        if not existing.exists:
+            return
+        transaction.delete(ref)
+    else:
+        now = datetime.now()
+        transaction.set(ref, {
+            'customer_id': customer_id,
+            'product_id': product_id,
+            'custom_price': custom_price,
+            'created_by': user_id or existing_data.get('created_by'),
+            'created_at': existing_data.get('created_at', now),
+            'updated_at': now
+        })
+    PricingSummary.stage_price_change(
+        transaction, customer_id, base_price, existing_data.get('custom_price'), custom_price
+    )
+
+class PricingSummary:
+    """Per-customer custom pricing totals, maintained on every pricing write.
+
+    One small document per customer in ``customer_pricing_summary`` holds the
+    number of custom-priced products and the potential savings against base
+    prices, so the pricing summary report does not scan ``customer_pricing``.
+    set_price() writes the price and the summary increment in one transaction,
+    so concurrent writers of the same price cannot both apply the same change;
+    rebuild() recomputes everything from scratch and records it in ``index_metadata``.
+    """
+
+    COLLECTION = 'customer_pricing_summary'
+    METADATA_DOC = 'index_metadata/customer_pricing_summary'
+
+    _built = False
+
+    @staticmethod
+    def savings(base_price, custom_price):
+        """Potential saving of one custom price (only positive savings count)"""
+        if not base_price or base_price <= 0 or custom_price is None:
+            return 0
+        return max(0, base_price - custom_price)
+
+    @classmethod
+    def set_price(cls, customer_id, product_id, base_price, custom_price, user_id=None):
+        """Create, change or (custom_price None) remove a customer price together with its summary"""
+        try:
+            db = config.get_db()
+            ref = db.collection('customer_pricing').document(f"{customer_id}_{product_id}")
+            _write_customer_price(db.transaction(), ref, customer_id, product_id, base_price, custom_price, user_id)
+            pricing_analytics.invalidate(customer_id)
+            return True
+        except Exception as e:
+            print(f"Error setting price of product {product_id} for customer {customer_id}: {e}")
+            return False
+
+    @classmethod
+    def stage_price_change(cls, batch, customer_id, base_price, old_custom_price, new_custom_price):
+        """Queue the summary increment of a custom price being created, changed or removed (new is None)"""
+        count_delta = (new_custom_price is not None) - (old_custom_price is not None)
+        savings_delta = cls.savings(base_price, new_custom_price) - cls.savings(base_price, old_custom_price)
+        if count_delta or savings_delta:
+            db = config.get_db()
+            batch.set(
+                db.collection(cls.COLLECTION).document(customer_id),
+                cls._increment(customer_id, count_delta, savings_delta), merge=True
+            )
+
+    @classmethod
+    def record_base_price_change(cls, product_id, old_price, new_price):
+        """Re-rate the savings of every customer with a custom price for the product"""
+        try:
+            db = config.get_db()
+            pricing_docs = db.collection('customer_pricing').where('product_id', '==', product_id).get()
+
+            deltas = {}
+            for doc in pricing_docs:
+                pricing_data = doc.to_dict()
+                custom_price = pricing_data.get('custom_price', 0)
+                delta = cls.savings(new_price, custom_price) - cls.savings(old_price, custom_price)
+                if delta:
+                    customer_id = pricing_data['customer_id']
+                    deltas[customer_id] = deltas.get(customer_id, 0) + delta
+
+            customer_ids = list(deltas)
+            for start in range(0, len(customer_ids), 400):
+                batch = db.batch()
+                for customer_id in customer_ids[start:start + 400]:
+                    batch.set(
+                        db.collection(cls.COLLECTION).document(customer_id),
+                        cls._increment(customer_id, 0, deltas[customer_id]), merge=True
+                    )
+                batch.commit()
+
+            # Orders without snapshots are valued at the current price, so any customer may be affected
+            pricing_analytics.invalidate()
+            return True
+        except Exception as e:
+            print(f"Error updating pricing summary for product {product_id}: {e}")
+            return False
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every customer's summary from customer_pricing and the product prices"""
+        try:
+            db = config.get_db()
+            totals = {}
+            product_ids = set()
+            pricing = []
+            for doc in db.collection('customer_pricing').stream():
+                pricing_data = doc.to_dict()
+                if not pricing_data.get('customer_id') or not pricing_data.get('product_id'):
+                    continue
+                pricing.append(pricing_data)
+                product_ids.add(pricing_data['product_id'])
+
+            refs = [db.collection('products').document(product_id) for product_id in sorted(product_ids)]
+            base_prices = {doc.id: doc.to_dict().get('price', 0) for doc in db.get_all(refs) if doc.exists} if refs else {}
+
+            for pricing_data in pricing:
+                entry = totals.setdefault(pricing_data['customer_id'], {
+                    'total_custom_products': 0,
+                    'total_potential_savings': 0
+                })
+                entry['total_custom_products'] += 1
+                entry['total_potential_savings'] += cls.savings(
+                    base_prices.get(pricing_data['product_id']), pricing_data.get('custom_price', 0)
+                )
+
+            stale = [doc.reference for doc in db.collection(cls.COLLECTION).stream() if doc.id not in totals]
+            writes = [('set', db.collection(cls.COLLECTION).document(customer_id), {
+                'customer_id': customer_id,
+                'total_custom_products': entry['total_custom_products'],
+                'total_potential_savings': entry['total_potential_savings'],
+                'updated_at': datetime.now()
+            }) for customer_id, entry in totals.items()] + [('delete', ref, None) for ref in stale]
+            writes.append(('set', db.document(cls.METADATA_DOC), {'built_at': datetime.now(), 'count': len(totals)}))
+
+            for start in range(0, len(writes), 400):
+                batch = db.batch()
+                for action, ref, data in writes[start:start + 400]:
+                    if action == 'set':
+                        batch.set(ref, data)
+                    else:
+                        batch.delete(ref)
+                batch.commit()
+            return True
+        except Exception as e:
+            print(f"Error rebuilding pricing summary: {e}")
+            return False
+
+    @classmethod
+    def get_all(cls, rebuild=False):
+        """All customer summaries; backfills on first use, or always with rebuild"""
+        try:
+            db = config.get_db()
+            if rebuild or not cls._built:
+                # Only a successful backfill counts; otherwise the next request retries it
+                if (not rebuild and db.document(cls.METADATA_DOC).get().exists) or cls.rebuild():
+                    cls._built = True
+            return [doc.to_dict() for doc in db.collection(cls.COLLECTION).stream()]
+        except Exception as e:
+            print(f"Error getting pricing summaries: {e}")
+            return []
+
+    @staticmethod
+    def _increment(customer_id, count_delta, savings_delta):
+        return {
+            'customer_id': customer_id,
+            'total_custom_products': firestore.Increment(count_delta),
+            'total_potential_savings': firestore.Increment(savings_delta),
+            'updated_at': datetime.now()
+        }
+
+class PurchaseHistory:
+    """Per-customer, per-product purchase aggregates of dispatched orders.
+
+    ``customer_product_purchases`` holds one document per customer and product
+    (order count, quantity, value, last ordered and the latest item snapshot) and
+    ``customer_purchase_totals`` one per customer with its dispatched order count.
+    Both are incremented in the batch that dispatches an order, so frequently
+    ordered products are a top-k query instead of a scan of the order history.
+    rebuild() backfills them from the dispatched orders and records the backfill
+    in ``index_metadata``.
+    """
+
+    COLLECTION = 'customer_product_purchases'
+    TOTALS_COLLECTION = 'customer_purchase_totals'
+    METADATA_DOC = 'index_metadata/customer_product_purchases'
+
+    _built = False
+
+    @staticmethod
+    def doc_id(customer_id, product_id):
+        return f"{customer_id}_{product_id}"
+
+    @staticmethod
+    def max_writes(order):
+        """Most writes stage_dispatches() queues for one order"""
+        return len(order.items) + 1
+
+    @classmethod
+    def stage_dispatches(cls, batch, orders):
+        """Queue the aggregate increments of newly dispatched orders in ``batch``.
+
+        The batch is the one writing the orders' status change, so the increments
+        are applied exactly once, together with the dispatch.
+        """
+        db = config.get_db()
+        orders_by_customer = {}
+        for order in orders:
+            orders_by_customer.setdefault(order.customer_id, []).append(order)
+
+        for customer_id, customer_orders in orders_by_customer.items():
+            for product_id, entry in cls._aggregate(customer_orders).items():
+                data = {
+                    'customer_id': customer_id,
+                    'product_id': product_id,
+                    'order_count': firestore.Increment(entry['order_count']),
+                    'total_quantity': firestore.Increment(entry['total_quantity']),
+                    'total_value': firestore.Increment(entry['total_value']),
+                    'last_ordered_at': entry['last_ordered_at'],
+                    'updated_at': datetime.now()
+                }
+                if entry['product_snapshot']:
+                    data['product_snapshot'] = entry['product_snapshot']
+                batch.set(db.collection(cls.COLLECTION).document(cls.doc_id(customer_id, product_id)), data, merge=True)
+
+            batch.set(db.collection(cls.TOTALS_COLLECTION).document(customer_id), {
+                'customer_id': customer_id,
+                'dispatched_orders': firestore.Increment(len(customer_orders)),
+                'updated_at': datetime.now()
+            }, merge=True)
+
+    @classmethod
+    def rebuild(cls, customer_id=None):
+        """Recompute the aggregates of one customer (or all customers) from the dispatched orders"""
+        try:
+            db = config.get_db()
+            orders_query = db.collection('orders').where('status', '==', 'dispatched')
+            purchases_query = db.collection(cls.COLLECTION)
+            totals_query = db.collection(cls.TOTALS_COLLECTION)
+            if customer_id:
+                orders_query = orders_query.where('customer_id', '==', customer_id)
+                purchases_query = purchases_query.where('customer_id', '==', customer_id)
+                totals_query = totals_query.where('customer_id', '==', customer_id)
+
+            orders_by_customer = {customer_id: []} if customer_id else {}
+            for doc in orders_query.stream():
+                order = Order.from_dict(doc.to_dict())
+                orders_by_customer.setdefault(order.customer_id, []).append(order)
+
+            writes = []
+            for order_customer_id, orders in orders_by_customer.items():
+                for product_id, entry in cls._aggregate(orders).items():
+                    writes.append(('set', db.collection(cls.COLLECTION).document(
+                        cls.doc_id(order_customer_id, product_id)
+                    ), {'customer_id': order_customer_id, 'product_id': product_id, **entry, 'updated_at': datetime.now()}))
+                writes.append(('set', db.collection(cls.TOTALS_COLLECTION).document(order_customer_id), {
+                    'customer_id': order_customer_id,
+                    'dispatched_orders': len(orders),
+                    'updated_at': datetime.now()
+                }))
+
+            current = {ref.path for _, ref, _ in writes}
+            writes += [('delete', doc.reference, None) for query in (purchases_query, totals_query)
+                       for doc in query.stream() if doc.reference.path not in current]
+            if not customer_id:
+                writes.append(('set', db.document(cls.METADATA_DOC), {'built_at': datetime.now(), 'count': len(orders_by_customer)}))
+
+            for start in range(0, len(writes), 400):
+                batch = db.batch()
+                for action, ref, data in writes[start:start + 400]:
+                    if action == 'set':
+                        batch.set(ref, data)
+                    else:
+                        batch.delete(ref)
+                batch.commit()
+            return True
+        except Exception as e:
+            print(f"Error rebuilding purchase history: {e}")
+            return False
+
+    @classmethod
+    def get_totals(cls, customer_id):
+        """Dispatched order totals of a customer (None if it has none); backfills on first use"""
+        try:
+            db = config.get_db()
+            if not cls._built:
+                # Only a successful backfill counts; otherwise the next request retries it
+                if db.document(cls.METADATA_DOC).get().exists or cls.rebuild():
+                    cls._built = True
+            doc = db.collection(cls.TOTALS_COLLECTION).document(customer_id).get()
+            return doc.to_dict() if doc.exists else None
+        except Exception as e:
+            print(f"Error getting purchase totals: {e}")
+            return None
+
+    @classmethod
+    def get_frequent_products(cls, customer_id, min_count=1, limit=10):
+        """A customer's most frequently ordered products, highest order count first"""
+        try:
+            db = config.get_db()
+            query = (db.collection(cls.COLLECTION)
+                     .where('customer_id', '==', customer_id)
+                     .where('order_count', '>=', min_count)
+                     .order_by('order_count', direction=firestore.Query.DESCENDING)
+                     .limit(limit))
+            return [doc.to_dict() for doc in query.stream()]
+        except Exception as e:
+            print(f"Error getting frequently ordered products: {e}")
+            return []
+
+    @staticmethod
+    def _aggregate(orders):
+        """Per-product totals of the given orders; the newest order's snapshot wins"""
+        totals = {}
+        for order in sorted(orders, key=lambda o: o.created_at):
+            for item in order.items:
+                entry = totals.setdefault(item['product_id'], {
+                    'order_count': 0,
+                    'total_quantity': 0,
+                    'total_value': 0,
+                    'last_ordered_at': None,
+                    'product_snapshot': None
+                })
+                entry['order_count'] += 1
+                entry['total_quantity'] += item['quantity']
+                entry['total_value'] += item['total']
+                entry['last_ordered_at'] = order.created_at
+                entry['product_snapshot'] = item.get('product_snapshot') or entry['product_snapshot']
+        return totals
+
+class GSTSummary:
+    """Monthly GST totals of dispatched orders by HSN code and GST rate.
+
+    ``gst_monthly_summary`` holds one document per month, HSN code and rate with
+    the taxable value, tax amount and order count. The batch that dispatches an
+    order also increments the documents of its dispatch month, so the month-end
+    tax report reads a few summary documents instead of the order history and
+    each order is counted exactly once. rebuild() backfills them from
+    the dispatched orders and records the backfill in ``index_metadata``.
+    """
+
+    COLLECTION = 'gst_monthly_summary'
+    METADATA_DOC = 'index_metadata/gst_monthly_summary'
+
+    _built = False
+
+    @staticmethod
+    def month_of(order):
+        """Tax period (YYYY-MM) of a dispatched order: the month of its dispatch date"""
+        dispatched_at = order.dispatch_date or order.updated_at or datetime.now()
+        if isinstance(dispatched_at, str):
+            return dispatched_at[:7]
+        return dispatched_at.strftime('%Y-%m')
+
+    @staticmethod
+    def doc_id(month, hsn_code, gst_rate):
+        hsn = str(hsn_code or 'NA').replace('/', '-')
+        return f"{month}_{hsn}_{float(gst_rate):g}"
+
+    @staticmethod
+    def max_writes(order):
+        """Most writes stage_dispatches() queues for one order"""
+        return len(order.items)
+
+    @classmethod
+    def stage_dispatches(cls, batch, orders):
+        """Queue the month total increments of newly dispatched orders in the
+        batch that writes their status change"""
+        db = config.get_db()
+        for key, entry in cls._aggregate(orders).items():
+            month, hsn_code, gst_rate = key
+            batch.set(db.collection(cls.COLLECTION).document(cls.doc_id(*key)), {
+                'month': month,
+                'hsn_code': hsn_code,
+                'gst_rate': gst_rate,
+                'taxable_value': firestore.Increment(entry['taxable_value']),
+                'tax_amount': firestore.Increment(entry['tax_amount']),
+                'order_count': firestore.Increment(entry['order_count']),
+                'updated_at': datetime.now()
+            }, merge=True)
+
+    @classmethod
+    def rebuild(cls, month=None):
+        """Recompute the totals of one month (or all months) from the dispatched orders; returns the document count"""
+        try:
+            db = config.get_db()
+            orders = [Order.from_dict(doc.to_dict())
+                      for doc in db.collection('orders').where('status', '==', 'dispatched').stream()]
+            if month:
+                orders = [order for order in orders if cls.month_of(order) == month]
+
+            writes = [('set', db.collection(cls.COLLECTION).document(cls.doc_id(*key)), {
+                'month': key[0],
+                'hsn_code': key[1],
+                'gst_rate': key[2],
+                **entry,
+                'updated_at': datetime.now()
+            }) for key, entry in cls._aggregate(orders).items()]
+
+            summary_query = db.collection(cls.COLLECTION)
+            if month:
+                summary_query = summary_query.where('month', '==', month)
+            current = {ref.path for _, ref, _ in writes}
+            writes += [('delete', doc.reference, None) for doc in summary_query.stream()
+                       if doc.reference.path not in current]
+            if not month:
+                writes.append(('set', db.document(cls.METADATA_DOC), {'built_at': datetime.now(), 'count': len(current)}))
+
+            for start in range(0, len(writes), 400):
+                batch = db.batch()
+                for action, ref, data in writes[start:start + 400]:
+                    if action == 'set':
+                        batch.set(ref, data)
+                    else:
+                        batch.delete(ref)
+                batch.commit()
+            return len(current)
+        except Exception as e:
+            print(f"Error rebuilding GST summary: {e}")
+            return None
+
+    @classmethod
+    def get_summary(cls, start_month=None, end_month=None):
+        """Summary rows between two months (inclusive), by month, HSN code and rate; backfills on first use"""
+        try:
+            db = config.get_db()
+            if not cls._built:
+                # Only a successful backfill counts; otherwise the next request retries it
+                if db.document(cls.METADATA_DOC).get().exists or cls.rebuild() is not None:
+                    cls._built = True
+
+            query = db.collection(cls.COLLECTION)
+            if start_month:
+                query = query.where('month', '>=', start_month)
+            if end_month:
+                query = query.where('month', '<=', end_month)
+            rows = [doc.to_dict() for doc in query.stream()]
+            rows.sort(key=lambda r: (r['month'], r.get('hsn_code') or '', r.get('gst_rate') or 0))
+            return rows
+        except Exception as e:
+            print(f"Error getting GST summary: {e}")
+            return []
+
+    @staticmethod
+    def _aggregate(orders):
+        """Taxable value, tax and order count per (month, HSN code, GST rate).
+
+        Items use the HSN code and rate frozen in their snapshot; older items
+        without one fall back to the current product (read in one batch).
+        """
+        missing = {
+            item['product_id'] for order in orders for item in order.items
+            if not {'hsn_code', 'gst_rate'} <= (item.get('product_snapshot') or {}).keys()
+        }
+        products = {}
+        if missing:
+            db = config.get_db()
+            for doc in db.get_all([db.collection('products').document(pid) for pid in sorted(missing)]):
+                if doc.exists:
+                    products[doc.id] = doc.to_dict()
+
+        totals = {}
+        for order in orders:
+            month = GSTSummary.month_of(order)
+            order_keys = set()
+            for item in order.items:
+                snapshot = item.get('product_snapshot') or {}
+                product = products.get(item['product_id'], {})
+                hsn_code = snapshot['hsn_code'] if 'hsn_code' in snapshot else product.get('hsn_code')
+                gst_rate = float(snapshot['gst_rate'] if 'gst_rate' in snapshot else product.get('gst_rate') or 0)
+                taxable = item.get('total', item['quantity'] * item['price'])
+
+                key = (month, hsn_code or None, gst_rate)
+                entry = totals.setdefault(key, {'taxable_value': 0, 'tax_amount': 0, 'order_count': 0})
+                entry['taxable_value'] += taxable
+                entry['tax_amount'] += taxable * gst_rate / 100
+                if key not in order_keys:
+                    order_keys.add(key)
+                    entry['order_count'] += 1
+        return totals
+
+class LowStockIndex:
+    """Active products at or below their low-stock threshold.
+
+    ``low_stock_products`` holds one small document per low-stock product (name,
+    category, locations, quantity and threshold). Product.save() adds, refreshes
+    or removes the entry whenever stock, threshold or status changes, so low-stock
+    lists read only the low items instead of scanning the catalog. rebuild()
+    recreates the index from the products and records it in ``index_metadata``.
+    """
+
+    COLLECTION = 'low_stock_products'
+    METADATA_DOC = 'index_metadata/low_stock_products'
+
+    _built = False
+
+    # Product fields copied into the index or deciding membership
+    WATCHED_FIELDS = frozenset((
+        'product_name', 'item_no', 'category', 'location_ids', 'location_id',
+        'quantity', 'low_stock_threshold', 'is_active', 'is_deleted'
+    ))
+
+    @staticmethod
+    def is_low(is_active, is_deleted, quantity, threshold):
+        return bool(is_active) and not is_deleted and (quantity or 0) <= (threshold or 0)
+
+    @classmethod
+    def was_low(cls, product):
+        """Whether the product's stored state (before an unsaved change) is in the index"""
+        if product.loaded_value('product_id') is None:
+            return False
+        return cls.is_low(product.loaded_value('is_active'), product.loaded_value('is_deleted'),
+                          product.loaded_value('quantity'), product.loaded_value('low_stock_threshold'))
+
+    @classmethod
+    def entry(cls, product):
+        """Index document for a product"""
+        location_ids = list(product.location_ids or [])
+        if not location_ids and product.location_id:
+            # Backward compatibility
+            location_ids = [product.location_id]
+        return {
+            'product_id': product.product_id,
+            'product_name': product.product_name,
+            'item_no': product.item_no,
+            'category': product.category,
+            'location_ids': location_ids,
+            'quantity': product.quantity,
+            'low_stock_threshold': product.low_stock_threshold,
+            'updated_at': datetime.now()
+        }
+
+    @classmethod
+    def record_save(cls, product, was_low, written_fields):
+        """Bring a product's entry up to date after it was saved"""
+        try:
+            if not cls.WATCHED_FIELDS.intersection(written_fields):
+                return True
+            is_low = cls.is_low(product.is_active, product.is_deleted, product.quantity, product.low_stock_threshold)
+            if not is_low and not was_low:
+                return True
+
+            db = config.get_db()
+            doc_ref = db.collection(cls.COLLECTION).document(product.product_id)
+            if is_low:
+                doc_ref.set(cls.entry(product))
+            else:
+                doc_ref.delete()
+            return True
+        except Exception as e:
+            print(f"Error updating low stock index for product {product.product_id}: {e}")
+            return False
+
+    @classmethod
+    def rebuild(cls):
+        """Recreate the index from every product (one catalog scan)"""
+        try:
+            db = config.get_db()
+            entries = {}
+            for doc in db.collection('products').where('is_active', '==', True).stream():
+                product = Product.from_dict(doc.to_dict())
+                if cls.is_low(product.is_active, product.is_deleted, product.quantity, product.low_stock_threshold):
+                    entries[product.product_id] = cls.entry(product)
+
+            writes = [('set', db.collection(cls.COLLECTION).document(product_id), entry)
+                      for product_id, entry in entries.items()]
+            writes += [('delete', doc.reference, None) for doc in db.collection(cls.COLLECTION).stream()
+                       if doc.id not in entries]
+            writes.append(('set', db.document(cls.METADATA_DOC), {'built_at': datetime.now(), 'count': len(entries)}))
+
+            for start in range(0, len(writes), 400):
+                batch = db.batch()
+                for action, ref, data in writes[start:start + 400]:
+                    if action == 'set':
+                        batch.set(ref, data)
+                    else:
+                        batch.delete(ref)
+                batch.commit()
+            return True
+        except Exception as e:
+            print(f"Error rebuilding low stock index: {e}")
+            return False
+
+    @classmethod
+    def get_entries(cls, location_id=None, category=None):
+        """Low-stock entries, lowest quantity first; builds the index on first use"""
+        try:
+            db = config.get_db()
+            if not cls._built:
+                # Only a successful build counts; otherwise the next request retries it
+                if db.document(cls.METADATA_DOC).get().exists or cls.rebuild():
+                    cls._built = True
+
+            query = db.collection(cls.COLLECTION)
+            if location_id:
+                query = query.where('location_ids', 'array_contains', location_id)
+            if category:
+                query = query.where('category', '==', category)
+            entries = [doc.to_dict() for doc in query.stream()]
+            entries.sort(key=lambda e: (e.get('quantity') or 0, (e.get('product_name') or '').lower()))
+            return entries
+        except Exception as e:
+            print(f"Error getting low stock entries: {e}")
+            return []
+
+class ApprovalQueue:
+    """Pending-approval order ids, one queue document per approver scope.
+
+    ``approval_queues/<customer>_dept_<department>`` lists the orders waiting for
+    that department head and ``approval_queues/<customer>_hr`` those waiting for
+    HR. Order.save() moves an order between queues in the same write batch as the
+    status change, so approvers read their inbox without scanning the orders.
+    rebuild() recreates every queue and records it in ``index_metadata``.
+    """
+
+    COLLECTION = 'approval_queues'
+    METADATA_DOC = 'index_metadata/approval_queues'
+
+    STAGES = {'pending_dept_approval': 'dept', 'pending_hr_approval': 'hr'}
+
+    _built = False
+
+    @classmethod
+    def queue_id(cls, customer_id, stage, department_id=None):
+        if stage == 'dept':
+            return f"{customer_id}_dept_{department_id or 'unassigned'}"
+        return f"{customer_id}_hr"
+
+    @classmethod
+    def queue_for(cls, order, status):
+        """Queue document ID holding an order in the given status, or None"""
+        stage = cls.STAGES.get(status)
+        return cls.queue_id(order.customer_id, stage, order.department_id) if stage else None
+
+    @classmethod
+    def stage_transition(cls, batch, order, old_status):
+        """Queue the moves for an order's status change in ``batch``; True if anything was queued"""
+        old_queue = cls.queue_for(order, old_status)
+        new_queue = cls.queue_for(order, order.status)
+        if old_queue == new_queue:
+            return False
+
+        db = config.get_db()
+        if old_queue:
+            batch.set(db.collection(cls.COLLECTION).document(old_queue), {
+                'order_ids': firestore.ArrayRemove([order.order_id]),
+                'updated_at': datetime.now()
+            }, merge=True)
+        if new_queue:
+            stage = cls.STAGES[order.status]
+            batch.set(db.collection(cls.COLLECTION).document(new_queue), {
+                'customer_id': order.customer_id,
+                'stage': stage,
+                'department_id': order.department_id if stage == 'dept' else None,
+                'order_ids': firestore.ArrayUnion([order.order_id]),
+                'updated_at': datetime.now()
+            }, merge=True)
+        return True
+
+    @classmethod
+    def rebuild(cls):
+        """Recreate every queue from the pending orders"""
+        try:
+            db = config.get_db()
+            queues = {}
+            for status, stage in cls.STAGES.items():
+                for doc in db.collection('orders').where('status', '==', status).stream():
+                    order = Order.from_dict(doc.to_dict())
+                    queue = queues.setdefault(cls.queue_for(order, status), {
+                        'customer_id': order.customer_id,
+                        'stage': stage,
+                        'department_id': order.department_id if stage == 'dept' else None,
+                        'order_ids': []
+                    })
+                    queue['order_ids'].append(order.order_id)
+
+            writes = [('set', db.collection(cls.COLLECTION).document(queue_id), {**queue, 'updated_at': datetime.now()})
+                      for queue_id, queue in queues.items()]
+            writes += [('delete', doc.reference, None) for doc in db.collection(cls.COLLECTION).stream()
+                       if doc.id not in queues]
+            writes.append(('set', db.document(cls.METADATA_DOC), {'built_at': datetime.now()}))
+
+            for start in range(0, len(writes), 400):
+                batch = db.batch()
+                for action, ref, data in writes[start:start + 400]:
+                    if action == 'set':
+                        batch.set(ref, data)
+                    else:
+                        batch.delete(ref)
+                batch.commit()
+            cls._built = True
+            return True
+        except Exception as e:
+            print(f"Error rebuilding approval queues: {e}")
+            return False
+
+    @classmethod
+    def get_queues(cls, customer_id):
+        """All queue documents of a customer; builds the queues on first use"""
+        try:
+            db = config.get_db()
+            if not cls._built:
+                # Only a successful build counts; otherwise the next request retries it
+                if db.document(cls.METADATA_DOC).get().exists or cls.rebuild():
+                    cls._built = True
+            return [doc.to_dict() for doc in db.collection(cls.COLLECTION).where('customer_id', '==', customer_id).stream()]
+        except Exception as e:
+            print(f"Error getting approval queues: {e}")
+            return []
+
 class Product(BaseModel):
     """Product model for inventory management"""
     
-    def __init__(self):
-        super().__init__()
-        self.product_id = str(uuid.uuid4())
-        self.item_no = None  # Item number/SKU
-        self.category = None
-        self.product_name = None
-        self.product_make = None
-        self.product_model = None
-        self.description = None
-        self.price = 0.0
-        self.quantity = 0
-        self.gst_rate = 18.0  # Default GST rate
-        self.hsn_code = None
-        self.is_active = True
-        self.low_stock_threshold = 10
-        self.image_urls = []
-        self.product_specifications = {}
-        self.location_ids = []  # CHANGED: Now supports multiple locations
-        # Keep location_id for backward compatibility
-        self.location_id = None  # Will be deprecated but kept for existing data
+    FIELDS = {
+        'product_id': new_uuid,
+        'item_no': None,  # Item number/SKU
+        'category': None,
+        'product_name': None,
+        'product_make': None,
+        'product_model': None,
+        'description': None,
+        'price': 0.0,
+        'quantity': 0,
+        'gst_rate': 18.0,  # Default GST rate
+        'hsn_code': None,
+        'is_active': True,
+        'low_stock_threshold': 10,
+        'image_urls': list,
+        'image_variants': dict,  # original image URL -> {size: {'webp', 'jpeg', 'width', 'height'}}
+        'product_specifications': dict,
+        'location_ids': list,  # Supports multiple locations
+        'location_id': None  # Deprecated, kept for existing data
+    }
+
+    # Product fields copied onto order items
+    SNAPSHOT_FIELDS = ('product_name', 'product_make', 'product_model', 'category', 'hsn_code', 'gst_rate')
+    
+    def snapshot(self):
+        """Copy of the product details shown on order lines, frozen when the order is placed.
+
+        Carries the primary image with its variants so get_image_url() works on it.
+        """
+        snapshot = {field: getattr(self, field) for field in self.SNAPSHOT_FIELDS}
+        snapshot['base_price'] = self.price
+        primary_image = self.image_urls[0] if self.image_urls else None
+        snapshot['image_urls'] = [primary_image] if primary_image else []
+        snapshot['image_variants'] = (
+            {primary_image: self.image_variants[primary_image]}
+            if primary_image in (self.image_variants or {}) else {}
+        )
+        return snapshot
     
     def save(self):
         """Save product to Firebase"""
         try:
+            previous_price = self.loaded_value('price')
+            was_low_stock = LowStockIndex.was_low(self)
             self.updated_at = datetime.now()
             db = config.get_db()
             doc_ref = db.collection('products').document(self.product_id)
-            doc_ref.set(self.to_dict())
+            written = self.write_to(doc_ref)
+            if previous_price is not None and previous_price != self.price:
+                PricingSummary.record_base_price_change(self.product_id, previous_price, self.price)
+            LowStockIndex.record_save(self, was_low_stock, written)
             return True
         except Exception as e:
             print(f"Error saving product: {e}")
@@ -1101,15 +2120,15 @@ class Product(BaseModel):
             return []
     
     @classmethod
-    def get_low_stock_products(cls):
-        """Get products with low stock"""
+    def get_low_stock_products(cls, location_id=None, category=None):
+        """Get products with low stock (read through the low-stock index)"""
         try:
-            products = cls.get_all_active()
-            low_stock = []
-            for product in products:
-                if product.quantity <= product.low_stock_threshold:
-                    low_stock.append(product)
-            return low_stock
+            entries = LowStockIndex.get_entries(location_id, category)
+            if not entries:
+                return []
+            db = config.get_db()
+            refs = [db.collection('products').document(entry['product_id']) for entry in entries]
+            return [cls.from_dict(doc.to_dict()) for doc in db.get_all(refs) if doc.exists]
         except Exception as e:
             print(f"Error getting low stock products: {e}")
             return []
@@ -1209,21 +2228,25 @@ class Product(BaseModel):
 class Order(BaseModel):
     """Order model for order management"""
     
+    FIELDS = {
+        'order_id': None,
+        'customer_id': None,
+        'user_id': None,  # Employee who created the order
+        'department_id': None,
+        'status': 'draft',  # draft, pending_dept_approval, pending_hr_approval, approved, packed, ready_for_dispatch, dispatched, cancelled
+        'items': list,  # List of order items
+        'total_amount': 0.0,
+        'total_gst': 0.0,
+        'comments': list,  # List of comments/approvals
+        'packed_items': dict,  # Track which items are packed
+        'dispatch_approved_by': None,
+        'dispatched_by': None,
+        'dispatch_date': None
+    }
+
     def __init__(self):
         super().__init__()
         self.order_id = self.generate_order_id()
-        self.customer_id = None
-        self.user_id = None  # Employee who created the order
-        self.department_id = None
-        self.status = 'draft'  # draft, pending_dept_approval, pending_hr_approval, approved, packed, ready_for_dispatch, dispatched, cancelled
-        self.items = []  # List of order items
-        self.total_amount = 0.0
-        self.total_gst = 0.0
-        self.comments = []  # List of comments/approvals
-        self.packed_items = {}  # Track which items are packed
-        self.dispatch_approved_by = None
-        self.dispatched_by = None
-        self.dispatch_date = None
     
     @staticmethod
     def generate_order_id():
@@ -1232,28 +2255,53 @@ class Order(BaseModel):
         random_part = uuid.uuid4().hex[:6].upper()
         return f"ORD{timestamp}{random_part}"
     
-    def add_item(self, product_id, quantity, price):
-        """Add item to order"""
+    def add_item(self, product_id, quantity, price, product_snapshot=None, gst_rate=None):
+        """Add item to order and update the running totals.
+
+        The GST rate comes from ``gst_rate`` or the snapshot; only when neither is
+        known are the totals recomputed from the products.
+        """
         item = {
             'product_id': product_id,
             'quantity': quantity,
             'price': price,
             'total': quantity * price
         }
+        if product_snapshot is not None:
+            item['product_snapshot'] = product_snapshot
+            if gst_rate is None:
+                gst_rate = product_snapshot.get('gst_rate')
         self.items.append(item)
-        self.calculate_totals()
+        self.mark_changed('items')
+
+        if gst_rate is None:
+            self.calculate_totals()
+            return
+
+        item_gst = (item['total'] * gst_rate) / 100
+        self.total_gst += item_gst
+        self.total_amount += item['total'] + item_gst
     
     def calculate_totals(self):
-        """Calculate order totals"""
+        """Recalculate order totals from all items (GST rates of unsnapshotted items read in one batch)"""
         subtotal = sum(item['total'] for item in self.items)
+        rates = [(item.get('product_snapshot') or {}).get('gst_rate') for item in self.items]
         
-        # Calculate GST (fetch GST rates from products)
+        missing = sorted({item['product_id'] for item, rate in zip(self.items, rates) if rate is None})
+        product_rates = {}
+        if missing:
+            db = config.get_db()
+            refs = [db.collection('products').document(product_id) for product_id in missing]
+            for doc in db.get_all(refs):
+                if doc.exists:
+                    product_rates[doc.id] = doc.to_dict().get('gst_rate') or 0
+        
+        # Items whose product no longer exists carry no GST
         total_gst = 0
-        for item in self.items:
-            product = Product.get_by_id(item['product_id'])
-            if product:
-                gst_amount = (item['total'] * product.gst_rate) / 100
-                total_gst += gst_amount
+        for item, rate in zip(self.items, rates):
+            if rate is None:
+                rate = product_rates.get(item['product_id'], 0)
+            total_gst += (item['total'] * rate) / 100
         
         self.total_gst = total_gst
         self.total_amount = subtotal + total_gst
@@ -1267,20 +2315,119 @@ class Order(BaseModel):
             'message': message,
             'timestamp': datetime.now()
         }
-        self.comments.append(comment)
+        self.append_to('comments', comment)
     
     def save(self):
-        """Save order to Firebase"""
+        """Save order to Firebase.
+
+        A status change is conditional on the order being unchanged since it was
+        read; if another request changed it first, nothing is written.
+        """
         try:
-            self.updated_at = datetime.now()
             db = config.get_db()
-            doc_ref = db.collection('orders').document(self.order_id)
-            doc_ref.set(self.to_dict())
+            if self.status == self.loaded_value('status'):
+                self.updated_at = datetime.now()
+                self.write_to(db.collection('orders').document(self.order_id))
+                sales_analytics.mark_stale()
+            else:
+                Order._commit_batch(db, [self])
             return True
+        except FailedPrecondition:
+            print(f"Order {self.order_id} was changed by another request; not saved")
+            return False
         except Exception as e:
             print(f"Error saving order: {e}")
             return False
     
+    @classmethod
+    def save_many(cls, orders, max_writes=400):
+        """Save several orders in chunked write batches; returns (IDs written, IDs in conflict).
+
+        Chunks hold as many orders as fit in ``max_writes`` writes (see
+        _max_writes()); an order that needs more is written in a batch of its own.
+        Status changes are conditional on each order being unchanged since it was
+        read (see from_snapshot()). A conflict rejects its whole chunk, which is
+        then written order by order so that only the orders another request
+        changed first are left unwritten and reported as conflicts.
+        """
+        db = config.get_db()
+        chunks = []
+        chunk_writes = 0
+        for order in orders:
+            writes = cls._max_writes(order)
+            if not chunks or chunk_writes + writes > max_writes:
+                chunks.append([])
+                chunk_writes = 0
+            chunks[-1].append(order)
+            chunk_writes += writes
+
+        saved = []
+        conflicts = []
+        for chunk in chunks:
+            try:
+                cls._commit_batch(db, chunk)
+                saved.extend(order.order_id for order in chunk)
+                continue
+            except FailedPrecondition:
+                pass
+            except Exception as e:
+                # The chunk's orders stay dirty, so saving them again rewrites their changes
+                print(f"Error saving orders: {e}")
+                continue
+            
+            for order in chunk:
+                try:
+                    cls._commit_batch(db, [order])
+                    saved.append(order.order_id)
+                except FailedPrecondition:
+                    conflicts.append(order.order_id)
+                except Exception as e:
+                    print(f"Error saving order {order.order_id}: {e}")
+        return saved, conflicts
+    
+    @staticmethod
+    def _max_writes(order):
+        """Most writes _commit_batch() queues for one order"""
+        writes = 3  # The order and its approval queue moves
+        if order.status == 'dispatched' and order.loaded_value('status') != 'dispatched':
+            writes += PurchaseHistory.max_writes(order) + GSTSummary.max_writes(order)
+        return writes
+
+    @classmethod
+    def _commit_batch(cls, db, orders):
+        """Write orders with their approval queue moves and, for newly dispatched
+        orders, the purchase history and GST summary increments in one batch.
+
+        Status changes carry a write option on the order's update time, so the
+        commit raises FailedPrecondition if any of them was changed meanwhile
+        and none of the writes is applied.
+        """
+        batch = db.batch()
+        positions = []
+        dispatched = []
+        for order in orders:
+            order.updated_at = datetime.now()
+            old_status = order.loaded_value('status')
+            ApprovalQueue.stage_transition(batch, order, old_status)
+            option = order.write_option(db) if order.status != old_status else None
+            position = len(batch)
+            order.write_to(db.collection('orders').document(order.order_id), batch, option)
+            positions.append(position if len(batch) > position else None)
+            if order.status == 'dispatched' and old_status != 'dispatched':
+                dispatched.append(order)
+        if dispatched:
+            PurchaseHistory.stage_dispatches(batch, dispatched)
+            GSTSummary.stage_dispatches(batch, dispatched)
+        results = batch.commit()
+        
+        for order, position in zip(orders, positions):
+            order.mark_saved(order._update_time if position is None else results[position].update_time)
+        sales_analytics.mark_stale()
+        if dispatched:
+            # Realized savings change with every dispatched order
+            for customer_id in {order.customer_id for order in dispatched}:
+                pricing_analytics.invalidate(customer_id)
+    
     @classmethod
     def get_by_id(cls, order_id):
         """Get order by ID"""
@@ -1288,7 +2435,7 @@ class Order(BaseModel):
             db = config.get_db()
             doc = db.collection('orders').document(order_id).get()
             if doc.exists:
-                return cls.from_dict(doc.to_dict())
+                return cls.from_snapshot(doc)
             return None
         except Exception as e:
             print(f"Error getting order by ID: {e}")
@@ -1350,15 +2497,15 @@ class Order(BaseModel):
             print(f"Error getting orders by status: {e}")
             return []
     
-    def update_status(self, new_status, user_id=None, comments=None):
-        """Update order status"""
+    def update_status(self, new_status, user_id=None, comments=None, save=True):
+        """Update order status (pass save=False to save it together with other changes)"""
         old_status = self.status
         self.status = new_status
         
         if comments and user_id:
             self.add_comment(user_id, 'system', 'status_change', f"Status changed from {old_status} to {new_status}. {comments}")
         
-        return self.save()
+        return self.save() if save else True
     
     def can_be_approved_by_dept_head(self, user):
         """Check if order can be approved by department head"""
@@ -1375,19 +2522,15 @@ class Order(BaseModel):
 class Department(BaseModel):
     """Department model for customer organization"""
     
-    def __init__(self):
-        super().__init__()
-        self.department_id = str(uuid.uuid4())
-        self.customer_id = None
-        self.name = None
-        self.description = None
-        self.department_head_id = None
-        self.is_active = True
-        self.branch_id = None
-        # NEW DELETION FIELDS
-        self.is_deleted = False
-        self.deleted_at = None
-        self.deleted_by = None
+    FIELDS = {
+        'department_id': new_uuid,
+        'customer_id': None,
+        'name': None,
+        'description': None,
+        'department_head_id': None,
+        'is_active': True,
+        'branch_id': None
+    }
     
     def save(self):
         """Save department to Firebase"""
@@ -1395,7 +2538,8 @@ class Department(BaseModel):
             self.updated_at = datetime.now()
             db = config.get_db()
             doc_ref = db.collection('departments').document(self.department_id)
-            doc_ref.set(self.to_dict())
+            self.write_to(doc_ref)
+            DepartmentRoster.invalidate(self.customer_id)
             return True
         except Exception as e:
             print(f"Error saving department: {e}")
@@ -1489,29 +2633,75 @@ class Department(BaseModel):
             print(f"Error getting users by department ID: {e}")
             return []
 
+class DepartmentRoster:
+    """Active users of each customer grouped by department.
+    
+    Built from a single users query per customer and kept in process memory
+    until User.save()/Department.save() (or a department delete) invalidates
+    that customer. The TTL bounds staleness across multiple worker processes.
+    """
+    
+    TTL_SECONDS = 300
+    
+    _lock = threading.Lock()
+    _rosters = {}  # customer_id -> (loaded_at, {department_id: [user summary]})
+    
+    @classmethod
+    def invalidate(cls, customer_id):
+        """Drop the cached roster of a customer"""
+        with cls._lock:
+            cls._rosters.pop(customer_id, None)
+    
+    @classmethod
+    def get(cls, customer_id):
+        """Map of department_id -> active users of the customer"""
+        with cls._lock:
+            cached = cls._rosters.get(customer_id)
+        if cached and time.time() - cached[0] < cls.TTL_SECONDS:
+            return cached[1]
+        
+        db = config.get_db()
+        roster = {}
+        for doc in db.collection('users').where('customer_id', '==', customer_id).get():
+            data = doc.to_dict()
+            if not data.get('department_id') or not data.get('is_active', True):
+                continue
+            roster.setdefault(data['department_id'], []).append({
+                'user_id': data.get('user_id', doc.id),
+                'username': data.get('username'),
+                'full_name': data.get('full_name'),
+                'email': data.get('email'),
+                'role': data.get('role'),
+                'is_active': data.get('is_active', True)
+            })
+        
+        with cls._lock:
+            cls._rosters[customer_id] = (time.time(), roster)
+        return roster
+
 class VendorSettings(BaseModel):
     """Vendor settings model for system configuration with enhanced email settings"""
     
-    def __init__(self):
-        super().__init__()
-        self.settings_id = 'vendor_settings'  # Singleton
-        self.company_name = None
-        self.postal_address = None
-        self.primary_contact_name = None
-        self.primary_contact_phone = None
-        self.alternate_contact_name = None
-        self.alternate_contact_phone = None
-        
+    FIELDS = {
+        'settings_id': 'vendor_settings',  # Singleton
+        'company_name': None,
+        'postal_address': None,
+        'primary_contact_name': None,
+        'primary_contact_phone': None,
+        'alternate_contact_name': None,
+        'alternate_contact_phone': None,
+
         # Email Configuration Fields
-        self.email_address = None
-        self.email_username = None
-        self.email_password = None
-        self.email_server_url = None
-        self.email_port = 587
-        self.email_use_tls = True
-        self.email_use_ssl = False
-        self.email_timeout = 30
-        self.email_from_name = None  # Display name for "From" field
+        'email_address': None,
+        'email_username': None,
+        'email_password': None,
+        'email_server_url': None,
+        'email_port': 587,
+        'email_use_tls': True,
+        'email_use_ssl': False,
+        'email_timeout': 30,
+        'email_from_name': None  # Display name for "From" field
+    }
     
     def save(self):
         """Save vendor settings to Firebase"""
@@ -1519,7 +2709,7 @@ class VendorSettings(BaseModel):
             self.updated_at = datetime.now()
             db = config.get_db()
             doc_ref = db.collection('vendor_settings').document(self.settings_id)
-            doc_ref.set(self.to_dict())
+            self.write_to(doc_ref)
             return True
         except Exception as e:
             print(f"Error saving vendor settings: {e}")
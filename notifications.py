@@ -0,0 +1,5 @@
+# Notifications - Send order emails from a background thread
+from background import BackgroundWorker
+
+# Global notification worker instance: enqueue(send, *args) calls send(*args) off the request thread
+notification_worker = BackgroundWorker('notification-worker')
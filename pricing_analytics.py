@@ -0,0 +1,155 @@
+# Pricing Analytics - Batched savings computation for a customer's price book
+import itertools
+import os
+import threading
+import time
+
+import numpy as np
+
+from config import config
+
+# Dispatched orders are consumed from the query stream in pages of this size
+ORDER_PAGE_SIZE = 200
+
+# Results are cached per customer until the next dispatch or price change.
+# The TTL bounds staleness when several worker processes serve requests; 0 disables the cache.
+CACHE_TTL_SECONDS = float(os.environ.get('PRICING_ANALYTICS_CACHE_TTL', 300))
+
+TOP_SAVINGS_LIMIT = 10
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def invalidate(customer_id=None):
+    """Drop cached analytics for one customer (or all customers)"""
+    with _cache_lock:
+        if customer_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(customer_id, None)
+
+
+def get_pricing_analytics(customer_id, use_cache=True):
+    """Potential and realized savings of a customer's custom prices (cached)"""
+    if use_cache and CACHE_TTL_SECONDS > 0:
+        with _cache_lock:
+            entry = _cache.get(customer_id)
+        if entry and time.time() - entry[0] < CACHE_TTL_SECONDS:
+            return entry[1]
+
+    analytics = compute_pricing_analytics(customer_id)
+
+    if CACHE_TTL_SECONDS > 0:
+        with _cache_lock:
+            _cache[customer_id] = (time.time(), analytics)
+    return analytics
+
+
+def compute_pricing_analytics(customer_id, db=None, page_size=ORDER_PAGE_SIZE):
+    """Run the pipeline: price book and products in one read each, then dispatched orders page by page"""
+    db = db or config.get_db()
+
+    price_book = load_price_book(db, customer_id)
+    products = load_products(db, price_book.keys())
+
+    potential = potential_savings(price_book, products)
+    realized = realized_savings(db, customer_id, products, page_size)
+
+    return {
+        'total_products_with_custom_pricing': len(price_book),
+        'potential_total_savings': potential['total'],
+        'realized_savings': realized,
+        'top_savings_products': potential['top']
+    }
+
+
+def load_price_book(db, customer_id):
+    """Custom prices of a customer keyed by product ID (one query)"""
+    docs = db.collection('customer_pricing').where('customer_id', '==', customer_id).get()
+    price_book = {}
+    for doc in docs:
+        data = doc.to_dict()
+        if data.get('product_id') is not None:
+            price_book[data['product_id']] = float(data.get('custom_price') or 0)
+    return price_book
+
+
+def load_products(db, product_ids):
+    """Product name and base price keyed by product ID (one batched read)"""
+    refs = [db.collection('products').document(product_id) for product_id in sorted(product_ids)]
+    if not refs:
+        return {}
+    products = {}
+    for doc in db.get_all(refs):
+        if doc.exists:
+            data = doc.to_dict()
+            products[doc.id] = {'product_name': data.get('product_name'), 'price': float(data.get('price') or 0)}
+    return products
+
+
+def potential_savings(price_book, products):
+    """Sum of (base - custom) over the price book and the products with the largest positive saving"""
+    product_ids = [product_id for product_id in price_book if product_id in products]
+    if not product_ids:
+        return {'total': 0.0, 'top': []}
+
+    base = np.fromiter((products[pid]['price'] for pid in product_ids), dtype=np.float64, count=len(product_ids))
+    custom = np.fromiter((price_book[pid] for pid in product_ids), dtype=np.float64, count=len(product_ids))
+    savings = base - custom
+
+    # Largest positive savings first
+    positive = np.flatnonzero(savings > 0)
+    order = positive[np.argsort(-savings[positive], kind='stable')][:TOP_SAVINGS_LIMIT]
+    top = [{
+        'product_name': products[product_ids[i]]['product_name'],
+        'base_price': float(base[i]),
+        'custom_price': float(custom[i]),
+        'savings': float(savings[i])
+    } for i in order]
+
+    return {'total': float(savings.sum()), 'top': top}
+
+
+def realized_savings(db, customer_id, products, page_size=ORDER_PAGE_SIZE):
+    """Savings against base price on dispatched orders, computed a page of orders at a time.
+
+    Base prices come from the item snapshots; items without one use the current
+    product price (read in one batch per page for products not already loaded).
+    """
+    query = (db.collection('orders')
+             .where('customer_id', '==', customer_id)
+             .where('status', '==', 'dispatched'))
+    stream = query.stream()
+
+    total = 0.0
+    while True:
+        page = list(itertools.islice(stream, page_size))
+        if not page:
+            break
+
+        items = [item for doc in page for item in (doc.to_dict().get('items') or [])]
+        missing = {
+            item['product_id'] for item in items
+            if 'base_price' not in (item.get('product_snapshot') or {}) and item['product_id'] not in products
+        }
+        if missing:
+            products = {**products, **load_products(db, missing)}
+
+        # Items whose product no longer exists (and have no snapshot) are left out, as before
+        base = np.full(len(items), np.nan)
+        price = np.empty(len(items))
+        quantity = np.empty(len(items))
+        for i, item in enumerate(items):
+            snapshot = item.get('product_snapshot') or {}
+            if 'base_price' in snapshot:
+                base[i] = snapshot['base_price']
+            elif item['product_id'] in products:
+                base[i] = products[item['product_id']]['price']
+            price[i] = item['price']
+            quantity[i] = item['quantity']
+
+        known = ~np.isnan(base)
+        total += float(np.dot(base[known] - price[known], quantity[known]))
+
+    return total
@@ -0,0 +1,469 @@
+# Sales Analytics - Columnar store of order lines for vendor reporting
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from background import BackgroundWorker
+from config import config
+
+# Seconds between incremental refreshes (one query for the orders changed since the watermark)
+REFRESH_SECONDS = float(os.environ.get('SALES_ANALYTICS_REFRESH_SECONDS', 30))
+
+# Orders saved around a refresh can commit with an older updated_at than one already
+# read; re-reading this window behind the watermark picks them up (reloads are idempotent)
+WATERMARK_OVERLAP = timedelta(seconds=60)
+
+# Orders counted as sales unless a report asks for other statuses
+SALES_STATUSES = ('approved', 'packed', 'ready_for_dispatch', 'dispatched')
+
+# Drop replaced lines from the in-memory arrays once they make up this share of them
+COMPACT_RATIO = 0.25
+
+# Directory of the memory-mapped snapshot (see write_analytics_snapshot.py); empty disables snapshots
+SNAPSHOT_DIR = os.environ.get('SALES_ANALYTICS_SNAPSHOT_DIR', '')
+SNAPSHOT_FORMAT = 1
+MANIFEST_FILE = 'manifest.json'
+
+# One entry per order line; string attributes are stored as dictionary codes
+LINE_COLUMNS = {
+    'order': np.int32,
+    'day': 'datetime64[D]',
+    'month': np.int32,  # months since 1970-01, -1 when the order has no date
+    'customer': np.int32,
+    'department': np.int32,
+    'product': np.int32,
+    'category': np.int32,
+    'status': np.int32,
+    'quantity': np.float64,
+    'unit_price': np.float64,
+    'amount': np.float64,
+    'gst': np.float64,
+    'live': np.bool_
+}
+# Departments are keyed by (customer_id, department_id) so unassigned lines stay per customer
+DIMENSIONS = ('order', 'customer', 'department', 'product', 'category', 'status')
+
+
+class Dictionary:
+    """Dictionary encoding of a string column: value <-> integer code"""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, value):
+        """Code of a value, adding it if new"""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value):
+        """Code of a value, or -1 if it has never been seen"""
+        return self.codes.get(value, -1)
+
+
+class SalesAnalytics:
+    """Order lines held as NumPy columns and grouped on demand.
+
+    The first query maps the snapshot in SNAPSHOT_DIR (or loads every order when
+    there is none); later queries first apply the orders whose updated_at is at or
+    after the watermark (at most once per REFRESH_SECONDS, or right away after
+    mark_stale()). A changed order's old lines are masked out and its current
+    lines appended, so each order's lines stay adjacent.
+
+    Lines live in segments: the read-only snapshot, shared between worker
+    processes through the page cache, and one in-memory segment for the delta.
+    Every string attribute is a dense dictionary code, so reports group with
+    np.bincount in a single pass instead of sorting the lines.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.segments = None
+        self.dimensions = {name: Dictionary() for name in DIMENSIONS}
+        self.products = {}
+        self.watermark = None
+        self.refreshed_at = 0
+        self.stale = False
+
+    def mark_stale(self):
+        """Apply changed orders on the next query instead of waiting for the refresh interval"""
+        self.stale = True
+
+    def reset(self):
+        """Forget all loaded lines (the next query reloads every order)"""
+        with self._lock:
+            self.segments = None
+            self.dimensions = {name: Dictionary() for name in DIMENSIONS}
+            self.products = {}
+            self.watermark = None
+
+    def refresh(self, force=False, snapshot=True):
+        """Load all orders on first use, then only those changed since the watermark.
+
+        After a full load a snapshot is written in the background unless ``snapshot`` is False.
+        """
+        with self._lock:
+            if (self.segments is not None and not force and not self.stale
+                    and time.time() - self.refreshed_at < REFRESH_SECONDS):
+                return
+            self.stale = False
+
+            full_load = self.segments is None and not (SNAPSHOT_DIR and self.load_snapshot(SNAPSHOT_DIR))
+            db = config.get_db()
+            query = db.collection('orders')
+            if not full_load and self.watermark is not None:
+                query = query.where('updated_at', '>=', self.watermark - WATERMARK_OVERLAP)
+            self.apply_orders(db, [doc.to_dict() for doc in query.stream()])
+            self.refreshed_at = time.time()
+
+        # The first worker to load everything leaves a snapshot for the others,
+        # written off the request thread
+        if full_load and snapshot and SNAPSHOT_DIR:
+            snapshot_worker.enqueue(self.write_snapshot, SNAPSHOT_DIR)
+
+    def apply_orders(self, db, orders):
+        """Replace the lines of the given orders with their current items"""
+        if self.segments is None:
+            self.segments = []
+        if not orders:
+            return
+
+        self.load_missing_products(db, orders)
+
+        dims = self.dimensions
+        lines = {name: [] for name in LINE_COLUMNS if name not in ('month', 'live')}
+        for order in orders:
+            if order.get('is_deleted'):
+                continue
+            day = to_date(order.get('created_at'))
+            order_code = dims['order'].encode(order.get('order_id'))
+            customer = dims['customer'].encode(order.get('customer_id'))
+            department = dims['department'].encode((order.get('customer_id'), order.get('department_id')))
+            status = dims['status'].encode(order.get('status'))
+            for item in order.get('items') or []:
+                snapshot = item.get('product_snapshot') or {}
+                product = self.products.get(item['product_id'], {})
+                category = snapshot.get('category') or product.get('category')
+                gst_rate = snapshot.get('gst_rate', product.get('gst_rate')) or 0
+                quantity = item.get('quantity') or 0
+                price = item.get('price') or 0
+
+                lines['order'].append(order_code)
+                lines['day'].append(day)
+                lines['customer'].append(customer)
+                lines['department'].append(department)
+                lines['product'].append(dims['product'].encode(item['product_id']))
+                lines['category'].append(dims['category'].encode(category))
+                lines['status'].append(status)
+                lines['quantity'].append(quantity)
+                lines['unit_price'].append(price)
+                lines['amount'].append(quantity * price)
+                lines['gst'].append(quantity * price * gst_rate / 100)
+
+        # Mask out the previous lines of every order in this delta
+        changed = np.fromiter(
+            (code for code in (dims['order'].lookup(o.get('order_id')) for o in orders) if code >= 0),
+            dtype=np.int32
+        )
+        segments = [
+            {**segment, 'live': segment['live'] & ~np.isin(segment['order'], changed)}
+            for segment in self.segments
+        ]
+
+        added = {name: np.asarray(values, dtype=LINE_COLUMNS[name]) for name, values in lines.items()}
+        added['month'] = np.where(np.isnat(added['day']), -1,
+                                  added['day'].astype('datetime64[M]').astype(np.int64)).astype(np.int32)
+        added['live'] = np.ones(len(added['order']), dtype=np.bool_)
+
+        # New lines join the in-memory segment; a mapped snapshot is never copied
+        if segments and not isinstance(segments[-1]['order'], np.memmap):
+            last = segments.pop()
+            added = {name: np.concatenate((last[name], added[name])) for name in LINE_COLUMNS}
+        if len(added['live']) and 1 - added['live'].mean() > COMPACT_RATIO:
+            added = {name: column[added['live']] for name, column in added.items()}
+        if len(added['live']):
+            segments.append(added)
+
+        # Swap all segments at once so queries see a consistent set of lines
+        self.segments = segments
+
+        stamps = [o['updated_at'] for o in orders if isinstance(o.get('updated_at'), datetime)]
+        if stamps:
+            latest = max(stamps)
+            # A timestamp ahead of this clock must not push the watermark past later saves
+            latest = min(latest, datetime.now(latest.tzinfo))
+            if self.watermark is None or latest > self.watermark:
+                self.watermark = latest
+
+    def load_missing_products(self, db, orders):
+        """Category and GST rate of products on lines without a snapshot (one batched read)"""
+        missing = {
+            item['product_id'] for order in orders for item in order.get('items') or []
+            if not {'category', 'gst_rate'} <= (item.get('product_snapshot') or {}).keys()
+            and item['product_id'] not in self.products
+        }
+        if not missing:
+            return
+        refs = [db.collection('products').document(product_id) for product_id in sorted(missing)]
+        for doc in db.get_all(refs):
+            if doc.exists:
+                data = doc.to_dict()
+                self.products[doc.id] = {'category': data.get('category'), 'gst_rate': data.get('gst_rate')}
+
+    @property
+    def line_count(self):
+        """Number of current order lines"""
+        return sum(int(segment['live'].sum()) for segment in self.segments or [])
+
+    # ---- Snapshots ----
+
+    def write_snapshot(self, directory):
+        """Save the current lines as .npy column files plus dimensions and a manifest.
+
+        Each snapshot goes to a new subdirectory and the manifest is replaced
+        atomically, so workers mapping the previous snapshot are unaffected.
+        Returns the manifest, or None if the snapshot could not be written.
+        """
+        with self._lock:
+            segments = list(self.segments or [])
+            dimensions = {name: list(dictionary.values) for name, dictionary in self.dimensions.items()}
+            products = dict(self.products)
+            watermark = self.watermark
+
+        # Versions sort by creation time, which prune_snapshots() relies on
+        version = f"{datetime.now():%Y%m%d%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        target = os.path.join(directory, version)
+        try:
+            os.makedirs(target)
+
+            line_count = 0
+            for name in LINE_COLUMNS:
+                if name == 'live':
+                    continue
+                column = np.concatenate([segment[name][segment['live']] for segment in segments]
+                                        or [np.empty(0, dtype=LINE_COLUMNS[name])])
+                np.save(os.path.join(target, f"{name}.npy"), column)
+                line_count = len(column)
+
+            with open(os.path.join(target, 'dimensions.json'), 'w') as f:
+                json.dump({'dimensions': dimensions, 'products': products}, f)
+
+            manifest = {
+                'format': SNAPSHOT_FORMAT,
+                'version': version,
+                'watermark': watermark.isoformat() if watermark else None,
+                'line_count': line_count,
+                'columns': [name for name in LINE_COLUMNS if name != 'live'],
+                'created_at': datetime.now().isoformat()
+            }
+            manifest_tmp = os.path.join(directory, f"{MANIFEST_FILE}.{version}")
+            with open(manifest_tmp, 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(manifest_tmp, os.path.join(directory, MANIFEST_FILE))
+        except Exception as e:
+            print(f"Error writing sales analytics snapshot: {e}")
+            shutil.rmtree(target, ignore_errors=True)
+            return None
+
+        self.prune_snapshots(directory)
+        return manifest
+
+    @staticmethod
+    def prune_snapshots(directory):
+        """Remove the snapshot versions older than the one the manifest points to.
+
+        Newer versions may still be being written by another process, and the
+        current one is what workers map on start, so both are kept.
+        """
+        try:
+            with open(os.path.join(directory, MANIFEST_FILE)) as f:
+                current = json.load(f)['version']
+            for entry in os.listdir(directory):
+                path = os.path.join(directory, entry)
+                if entry < current and os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+        except Exception as e:
+            print(f"Error pruning sales analytics snapshots: {e}")
+
+    def load_snapshot(self, directory):
+        """Map the latest snapshot read-only; returns False when there is no usable snapshot"""
+        try:
+            with open(os.path.join(directory, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+            if manifest.get('format') != SNAPSHOT_FORMAT or manifest.get('columns') != [
+                    name for name in LINE_COLUMNS if name != 'live']:
+                return False
+
+            target = os.path.join(directory, manifest['version'])
+            with open(os.path.join(target, 'dimensions.json')) as f:
+                stored = json.load(f)
+
+            segments = []
+            if manifest['line_count']:
+                segment = {name: np.load(os.path.join(target, f"{name}.npy"), mmap_mode='r')
+                           for name in manifest['columns']}
+                segment['live'] = np.ones(manifest['line_count'], dtype=np.bool_)
+                segments.append(segment)
+
+            # JSON turns the (customer_id, department_id) keys into lists
+            dimensions = {
+                name: Dictionary(tuple(value) if isinstance(value, list) else value
+                                 for value in stored['dimensions'].get(name, ()))
+                for name in DIMENSIONS
+            }
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Sales analytics snapshot error: {e}")
+            return False
+
+        self.segments = segments
+        self.dimensions = dimensions
+        self.products = stored.get('products', {})
+        self.watermark = datetime.fromisoformat(manifest['watermark']) if manifest.get('watermark') else None
+        return True
+
+    # ---- Reports ----
+
+    def select(self, fields, start=None, end=None, statuses=SALES_STATUSES, customer_id=None, dated=False):
+        """The given columns of the current lines matching the filters (only dated lines if ``dated``)"""
+        self.refresh()
+        segments = self.segments
+        dims = self.dimensions
+
+        allowed = None
+        if statuses:
+            allowed = np.zeros(len(dims['status'].values), dtype=np.bool_)
+            allowed[[code for code in map(dims['status'].lookup, statuses) if code >= 0]] = True
+        customer = dims['customer'].lookup(customer_id) if customer_id else None
+
+        parts = {name: [] for name in fields}
+        for segment in segments:
+            mask = segment['live'].copy()
+            if allowed is not None:
+                mask &= allowed[segment['status']]
+            if start is not None:
+                mask &= segment['day'] >= np.datetime64(start, 'D')
+            if end is not None:
+                mask &= segment['day'] <= np.datetime64(end, 'D')
+            if customer is not None:
+                mask &= segment['customer'] == customer
+            if dated:
+                mask &= segment['month'] >= 0
+            for name in fields:
+                parts[name].append(segment[name][mask])
+
+        return {
+            name: np.concatenate(columns) if columns else np.empty(0, dtype=LINE_COLUMNS[name])
+            for name, columns in parts.items()
+        }
+
+    def revenue_by_customer_month(self, **filters):
+        """Pre-tax revenue per customer per calendar month (customers by total, highest first)"""
+        lines = self.select(('customer', 'month', 'amount', 'gst'), dated=True, **filters)
+        if not len(lines['month']):
+            return {'months': [], 'customers': []}
+
+        first_month = int(lines['month'].min())
+        month_index = lines['month'] - first_month
+        month_count = int(month_index.max()) + 1
+        customers = lines['customer'].astype(np.int64)
+        customer_count = len(self.dimensions['customer'].values)
+
+        grid = np.bincount(customers * month_count + month_index, weights=lines['amount'],
+                           minlength=customer_count * month_count).reshape(customer_count, month_count)
+        gst = np.bincount(customers, weights=lines['gst'], minlength=customer_count)
+        present = np.flatnonzero(np.bincount(customers, minlength=customer_count))
+        totals = grid.sum(axis=1)
+
+        customer_ids = self.dimensions['customer'].values
+        return {
+            'months': [str(np.datetime64(first_month + i, 'M')) for i in range(month_count)],
+            'customers': [{
+                'customer_id': customer_ids[code],
+                'monthly_revenue': grid[code].round(2).tolist(),
+                'total_revenue': round(float(totals[code]), 2),
+                'total_gst': round(float(gst[code]), 2)
+            } for code in present[np.argsort(-totals[present], kind='stable')]]
+        }
+
+    def category_mix(self, **filters):
+        """Quantity, revenue and revenue share per product category"""
+        lines = self.select(('category', 'quantity', 'amount'), **filters)
+        category_count = len(self.dimensions['category'].values)
+        revenue = np.bincount(lines['category'], weights=lines['amount'], minlength=category_count)
+        quantity = np.bincount(lines['category'], weights=lines['quantity'], minlength=category_count)
+        line_counts = np.bincount(lines['category'], minlength=category_count)
+        present = np.flatnonzero(line_counts)
+        total = revenue.sum()
+
+        category_names = self.dimensions['category'].values
+        return {
+            'total_revenue': round(float(total), 2),
+            'categories': [{
+                'category': category_names[code] or 'Uncategorized',
+                'quantity': int(quantity[code]),
+                'revenue': round(float(revenue[code]), 2),
+                'share': round(float(revenue[code] / total * 100), 2) if total else 0.0,
+                'line_count': int(line_counts[code])
+            } for code in present[np.argsort(-revenue[present], kind='stable')]]
+        }
+
+    def department_spend(self, **filters):
+        """Spend (revenue plus GST) per customer department, highest first"""
+        lines = self.select(('order', 'department', 'amount', 'gst'), **filters)
+        department_count = len(self.dimensions['department'].values)
+        revenue = np.bincount(lines['department'], weights=lines['amount'], minlength=department_count)
+        gst = np.bincount(lines['department'], weights=lines['gst'], minlength=department_count)
+        orders = np.bincount(lines['department'][first_lines(lines['order'])], minlength=department_count)
+        present = np.flatnonzero(np.bincount(lines['department'], minlength=department_count))
+        spend = revenue + gst
+
+        departments = self.dimensions['department'].values
+        return {
+            'departments': [{
+                'customer_id': departments[code][0],
+                'department_id': departments[code][1],
+                'revenue': round(float(revenue[code]), 2),
+                'gst': round(float(gst[code]), 2),
+                'total_spend': round(float(spend[code]), 2),
+                'order_count': int(orders[code])
+            } for code in present[np.argsort(-spend[present], kind='stable')]]
+        }
+
+
+def first_lines(order_codes):
+    """Mask of the first line of each order (an order's lines are always adjacent)"""
+    first = np.ones(len(order_codes), dtype=np.bool_)
+    first[1:] = order_codes[1:] != order_codes[:-1]
+    return first
+
+
+def to_date(value):
+    """Calendar date of a stored timestamp (datetime, date or ISO string)"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value).date()
+        except ValueError:
+            pass
+    return None
+
+
+# Global sales analytics instance
+sales_analytics = SalesAnalytics()
+
+# Writes snapshots after a full load without holding up the request that triggered it
+snapshot_worker = BackgroundWorker('analytics-snapshot-worker')
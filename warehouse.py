@@ -0,0 +1,363 @@
+# Warehouse - Pick lists and dispatch waves planned from open orders in one pass
+import csv
+from datetime import datetime
+
+import numpy as np
+
+from config import config
+from models import BranchDirectory, Location
+
+UNASSIGNED_LOCATION = {'location_id': None, 'name': 'Unassigned'}
+
+PICK_LIST_CSV_HEADER = ['Location', 'Item No', 'Product Name', 'Category', 'Make', 'Model', 'Quantity', 'Orders']
+
+# Default capacity of one dispatch wave (one vehicle run from a location to a zone)
+WAVE_MAX_ORDERS = 20
+WAVE_MAX_UNITS = 400
+
+# Zone distance used for locations without a valid pincode of their own
+UNKNOWN_ZONE_DISTANCE = 10
+
+
+def build_pick_list(location_id=None, db=None):
+    """Quantities to pull per serving location and product across all approved orders.
+
+    Orders are streamed once into flat line arrays; users, branches and products are
+    each read in one batch, and lines are grouped by (location, product) with NumPy.
+    """
+    db = db or config.get_db()
+
+    order_ids = []
+    order_users = []
+    line_orders = []
+    line_products = []
+    line_quantities = []
+    snapshots = {}
+    for doc in db.collection('orders').where('status', '==', 'approved').stream():
+        data = doc.to_dict()
+        order_index = len(order_ids)
+        order_ids.append(data.get('order_id', doc.id))
+        order_users.append(data.get('user_id'))
+        for item in data.get('items') or []:
+            line_orders.append(order_index)
+            line_products.append(item['product_id'])
+            line_quantities.append(item.get('quantity') or 0)
+            snapshots.setdefault(item['product_id'], item.get('product_snapshot') or {})
+
+    locations = {location.location_id: location for location in Location.get_all_active()}
+    zone_index = build_zone_index(locations.values())
+    pincodes = {user_id: branch['pincode'] for user_id, branch in load_user_branches(db, order_users).items()}
+    products = load_products(db, set(line_products))
+
+    # Serving location of every line: the first stocking location that delivers to the ordering branch
+    location_ids = sorted(locations)
+    location_positions = {loc_id: i for i, loc_id in enumerate(location_ids)}
+    unassigned = len(location_ids)
+    product_ids = sorted(set(line_products))
+    product_positions = {product_id: i for i, product_id in enumerate(product_ids)}
+
+    line_locations = np.empty(len(line_products), dtype=np.int64)
+    for i, (order_index, product_id) in enumerate(zip(line_orders, line_products)):
+        serving = serving_location(
+            products.get(product_id, {}).get('location_ids', []),
+            zone_index,
+            pincodes.get(order_users[order_index])
+        )
+        line_locations[i] = location_positions[serving] if serving is not None else unassigned
+
+    groups = group_lines(
+        line_locations,
+        np.fromiter((product_positions[p] for p in line_products), dtype=np.int64, count=len(line_products)),
+        np.asarray(line_orders, dtype=np.int64),
+        np.asarray(line_quantities, dtype=np.float64),
+        len(product_ids),
+        len(order_ids)
+    )
+
+    by_location = {}
+    for location_index, product_index, quantity, order_count in groups:
+        if location_index == unassigned:
+            location = UNASSIGNED_LOCATION
+        else:
+            location = {'location_id': location_ids[location_index], 'name': locations[location_ids[location_index]].name}
+        if location_id and location['location_id'] != location_id:
+            continue
+
+        product_id = product_ids[product_index]
+        details = products.get(product_id) or snapshots.get(product_id) or {}
+        entry = by_location.setdefault(location['location_id'], {
+            'location_id': location['location_id'],
+            'location_name': location['name'],
+            'total_quantity': 0,
+            'items': []
+        })
+        entry['total_quantity'] += quantity
+        entry['items'].append({
+            'product_id': product_id,
+            'item_no': details.get('item_no'),
+            'product_name': details.get('product_name'),
+            'category': details.get('category'),
+            'product_make': details.get('product_make'),
+            'product_model': details.get('product_model'),
+            'quantity': quantity,
+            'order_count': order_count
+        })
+
+    # Pick route: location by name (unassigned last), then shelf order by category and item number
+    pick_locations = sorted(
+        by_location.values(),
+        key=lambda e: (e['location_id'] is None, (e['location_name'] or '').lower())
+    )
+    for entry in pick_locations:
+        entry['items'].sort(key=lambda i: (
+            (i['category'] or '').lower(), i['item_no'] or '', (i['product_name'] or '').lower()
+        ))
+
+    return {
+        'locations': pick_locations,
+        'total_orders': len(order_ids),
+        'total_lines': len(line_products),
+        'generated_at': datetime.now().isoformat()
+    }
+
+
+def group_lines(line_locations, line_products, line_orders, line_quantities, product_count, order_count):
+    """Sum quantities and count distinct orders per (location, product) key.
+
+    Returns (location_index, product_index, quantity, order_count) tuples.
+    """
+    if not len(line_locations):
+        return []
+
+    keys = line_locations * product_count + line_products
+    group_keys, inverse = np.unique(keys, return_inverse=True)
+    quantities = np.bincount(inverse, weights=line_quantities, minlength=len(group_keys))
+
+    # An order listing the same product twice still counts once
+    order_pairs = np.unique(inverse * order_count + line_orders)
+    orders = np.bincount(order_pairs // order_count, minlength=len(group_keys))
+
+    return [
+        (int(key // product_count), int(key % product_count), int(quantity), int(count))
+        for key, quantity, count in zip(group_keys, quantities, orders)
+    ]
+
+
+def plan_dispatch_waves(max_orders=WAVE_MAX_ORDERS, max_units=WAVE_MAX_UNITS, db=None):
+    """Group ready_for_dispatch orders into capacity-limited waves per serving location and pincode zone.
+
+    Each order goes to the nearest location that delivers to its branch's zone and
+    stocks every item; orders within a (location, zone) are filled into waves oldest first.
+    """
+    db = db or config.get_db()
+
+    orders = []
+    for doc in db.collection('orders').where('status', '==', 'ready_for_dispatch').stream():
+        data = doc.to_dict()
+        items = data.get('items') or []
+        orders.append({
+            'order_id': data.get('order_id', doc.id),
+            'customer_id': data.get('customer_id'),
+            'user_id': data.get('user_id'),
+            'product_ids': {item['product_id'] for item in items},
+            'units': sum(item.get('quantity') or 0 for item in items),
+            'total_amount': data.get('total_amount') or 0,
+            'created_at': str(data.get('created_at') or '')
+        })
+
+    locations = {location.location_id: location for location in Location.get_all_active()}
+    zone_rankings = rank_locations_by_zone(locations.values(), build_zone_index(locations.values()))
+    branches = load_user_branches(db, [order['user_id'] for order in orders])
+    product_locations = {
+        product_id: set(product['location_ids'])
+        for product_id, product in load_products(db, {pid for order in orders for pid in order['product_ids']}).items()
+    }
+    customer_names = BranchDirectory.resolve_customer_names({order['customer_id'] for order in orders if order['customer_id']})
+
+    groups = {}
+    unplanned = []
+    for order in sorted(orders, key=lambda o: (o['created_at'], o['order_id'])):
+        branch = branches.get(order['user_id']) or {}
+        pincode = branch.get('pincode') or ''
+        summary = {
+            'order_id': order['order_id'],
+            'customer_id': order['customer_id'],
+            'customer_name': customer_names.get(order['customer_id']),
+            'branch_id': branch.get('branch_id'),
+            'branch_name': branch.get('name'),
+            'pincode': pincode,
+            'units': order['units'],
+            'total_amount': order['total_amount']
+        }
+
+        if len(pincode) != 6 or not pincode.isdigit():
+            unplanned.append({**summary, 'reason': 'Branch pincode missing or invalid'})
+            continue
+
+        zone = pincode[0]
+        location_id = nearest_stocking_location(
+            zone_rankings.get(zone, ()),
+            [product_locations.get(product_id, ()) for product_id in order['product_ids']]
+        )
+        if location_id is None:
+            unplanned.append({**summary, 'reason': 'No location serving this zone stocks every item'})
+            continue
+
+        groups.setdefault((location_id, zone), []).append(summary)
+
+    waves = []
+    for (location_id, zone), group in sorted(groups.items(), key=lambda g: ((locations[g[0][0]].name or '').lower(), g[0][1])):
+        for wave_orders in split_into_waves(group, max_orders, max_units):
+            waves.append({
+                'wave_id': f"W{len(waves) + 1:03d}",
+                'location_id': location_id,
+                'location_name': locations[location_id].name,
+                'zone': zone,
+                'order_count': len(wave_orders),
+                'total_units': sum(o['units'] for o in wave_orders),
+                'total_amount': sum(o['total_amount'] for o in wave_orders),
+                'orders': wave_orders
+            })
+
+    return {
+        'waves': waves,
+        'unplanned': unplanned,
+        'total_orders': len(orders),
+        'max_orders': max_orders,
+        'max_units': max_units,
+        'generated_at': datetime.now().isoformat()
+    }
+
+
+def rank_locations_by_zone(locations, zone_index):
+    """Map of pincode zone -> serving location IDs, nearest first (by distance between pincode zones)"""
+    rankings = {}
+    for zone, location_ids in zone_index.items():
+        serving = [location for location in locations if location.location_id in location_ids]
+        serving.sort(key=lambda location: (
+            zone_distance(location.pincode, zone), (location.name or '').lower(), location.location_id
+        ))
+        rankings[zone] = [location.location_id for location in serving]
+    return rankings
+
+
+def zone_distance(pincode, zone):
+    """How many pincode zones apart a location's own pincode is from a destination zone"""
+    pincode = str(pincode or '')
+    if len(pincode) != 6 or not pincode.isdigit():
+        return UNKNOWN_ZONE_DISTANCE
+    return abs(int(pincode[0]) - int(zone))
+
+
+def nearest_stocking_location(ranked_location_ids, item_locations):
+    """First ranked location that stocks every item, or None"""
+    for location_id in ranked_location_ids:
+        if all(location_id in stocked for stocked in item_locations):
+            return location_id
+    return None
+
+
+def split_into_waves(orders, max_orders, max_units):
+    """Fill orders into waves in sequence, starting a new wave when either limit would be exceeded.
+
+    An order larger than max_units on its own still ships, in a wave by itself.
+    """
+    waves = []
+    wave = []
+    units = 0
+    for order in orders:
+        if wave and (len(wave) >= max_orders or units + order['units'] > max_units):
+            waves.append(wave)
+            wave = []
+            units = 0
+        wave.append(order)
+        units += order['units']
+    if wave:
+        waves.append(wave)
+    return waves
+
+
+def build_zone_index(locations):
+    """Map of pincode zone -> IDs of the locations delivering there"""
+    return {
+        zone: {location.location_id for location in locations if location.serves_zone(zone)}
+        for zone in Location.PINCODE_STATES
+    }
+
+
+def serving_location(product_location_ids, zone_index, pincode):
+    """First of the product's locations that delivers to the pincode, or None"""
+    if not pincode or len(pincode) != 6 or not pincode.isdigit():
+        return None
+    serving = zone_index.get(pincode[0], ())
+    for location_id in product_location_ids:
+        if location_id in serving:
+            return location_id
+    return None
+
+
+def load_user_branches(db, user_ids):
+    """Map of user_id -> {'branch_id', 'name', 'pincode'} of the user's branch (users and branches read in one batch each)"""
+    user_refs = [db.collection('users').document(user_id) for user_id in sorted(set(filter(None, user_ids)))]
+    if not user_refs:
+        return {}
+    user_branches = {}
+    for doc in db.get_all(user_refs):
+        if doc.exists and doc.to_dict().get('branch_id'):
+            user_branches[doc.id] = doc.to_dict()['branch_id']
+
+    branch_refs = [db.collection('branches').document(branch_id) for branch_id in sorted(set(user_branches.values()))]
+    branches = {}
+    if branch_refs:
+        for doc in db.get_all(branch_refs):
+            if doc.exists:
+                data = doc.to_dict()
+                branches[doc.id] = {
+                    'branch_id': doc.id,
+                    'name': data.get('name'),
+                    'pincode': str(data.get('pincode') or '')
+                }
+
+    return {user_id: branches[branch_id] for user_id, branch_id in user_branches.items() if branch_id in branches}
+
+
+def load_products(db, product_ids):
+    """Pick details and stocking locations keyed by product ID (one batched read)"""
+    refs = [db.collection('products').document(product_id) for product_id in sorted(product_ids)]
+    if not refs:
+        return {}
+    products = {}
+    for doc in db.get_all(refs):
+        if doc.exists:
+            data = doc.to_dict()
+            location_ids = data.get('location_ids') or []
+            if not location_ids and data.get('location_id'):
+                # Backward compatibility
+                location_ids = [data['location_id']]
+            products[doc.id] = {
+                'item_no': data.get('item_no'),
+                'product_name': data.get('product_name'),
+                'category': data.get('category'),
+                'product_make': data.get('product_make'),
+                'product_model': data.get('product_model'),
+                'location_ids': location_ids
+            }
+    return products
+
+
+def write_pick_list_csv(pick_list, f):
+    """Write the pick list as CSV rows in pick-route order"""
+    writer = csv.writer(f)
+    writer.writerow(PICK_LIST_CSV_HEADER)
+    for location in pick_list['locations']:
+        for item in location['items']:
+            writer.writerow([
+                location['location_name'],
+                item['item_no'] or '',
+                item['product_name'] or '',
+                item['category'] or '',
+                item['product_make'] or '',
+                item['product_model'] or '',
+                item['quantity'],
+                item['order_count']
+            ])